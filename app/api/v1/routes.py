@@ -1,25 +1,39 @@
 import http
-from typing import List
-from fastapi import APIRouter, UploadFile, File, Depends, Query
+from datetime import date
+from typing import List, Optional
+from fastapi import APIRouter, UploadFile, File, Depends, Query, Header, Request, Response, WebSocket, HTTPException, status
+from fastapi.responses import JSONResponse
 from sqlalchemy.ext.asyncio import AsyncSession
 
-from app.database.db import get_async_session
+from app.database.db import get_async_session, get_async_read_session, get_read_session_maker
 from app.database.models import User
-from app.core.security import get_current_user
+from app.core.security import get_current_user, get_current_user_for_write, get_user_from_token
+from app.core.scheduler import get_tenant_key
+from app.core.deadline import run_with_deadline
 from app.services.transcription_service import handle_transcription_flow, handle_transcription_with_patient
 from app.services.auth_service import login_user, create_user
 from app.services.patient_service import (
     create_patient, get_patients, get_patient_by_id, 
-    get_patient_by_cpf, update_patient, delete_patient
+    get_patient_by_cpf, update_patient, delete_patient, get_patient_version
 )
 from app.services.record_service import (
     create_medical_record, get_patient_records, get_medical_record,
-    update_medical_record, delete_medical_record
+    update_medical_record, delete_medical_record, get_medical_record_version
 )
+from app.services.segment_service import get_record_segments
+from app.services.realtime_service import handle_realtime_transcription
+from app.services.idempotency_service import run_idempotent, build_request_hash, hash_upload
+from app.services.usage_service import get_usage_summary
+from app.services.upload_service import (
+    create_upload_session, get_upload_session, append_upload_chunk,
+    finalize_upload, delete_upload_session, parse_upload_checksum
+)
+from app.utils.http_cache import build_etag, conditional_response
 from app.models.schemas import (
     TranscriptionResponse, UserLogin, UserCreate, UserResponse, Token,
-    PatientCreate, PatientUpdate, PatientResponse, PatientWithRecords,
-    MedicalRecordCreate, MedicalRecordUpdate, MedicalRecordResponse
+    PatientCreate, PatientUpdate, PatientResponse, PatientListItem, PatientWithRecords,
+    MedicalRecordCreate, MedicalRecordUpdate, MedicalRecordResponse,
+    TranscriptionSegmentResponse, UploadSessionCreate, UploadSessionResponse, UsageSummary
 )
 
 router = APIRouter()
@@ -28,6 +42,15 @@ router = APIRouter()
 async def health_check():
     return {"status": http.HTTPStatus.OK, "msg": "Health Checked!"}
 
+@router.get("/ready")
+async def readiness_check(request: Request):
+    if not getattr(request.app.state, "ready", False):
+        return JSONResponse(
+            status_code=http.HTTPStatus.SERVICE_UNAVAILABLE,
+            content={"status": http.HTTPStatus.SERVICE_UNAVAILABLE, "msg": "Warming up"}
+        )
+    return {"status": http.HTTPStatus.OK, "msg": "Ready"}
+
 # Authentication routes
 @router.post("/auth/login", response_model=Token)
 async def login(
@@ -55,37 +78,151 @@ async def get_current_user_info(
 # Transcription routes (protected)
 @router.post("/transcribe", response_model=TranscriptionResponse)
 async def transcribe(
+    request: Request,
     file: UploadFile = File(...),
+    idempotency_key: Optional[str] = Header(None),
     current_user: User = Depends(get_current_user)
 ):
 
-    return await handle_transcription_flow(file)
+    request_hash = build_request_hash("transcribe", await hash_upload(file)) if idempotency_key else ""
+    return await run_with_deadline(request, run_idempotent(
+        idempotency_key, current_user.id, "transcribe", request_hash,
+        lambda: handle_transcription_flow(file, get_tenant_key(current_user.username))
+    ))
 
 @router.post("/transcribe/patient/{patient_id}", response_model=TranscriptionResponse)
 async def transcribe_for_patient(
+    request: Request,
     patient_id: int,
     file: UploadFile = File(...),
+    idempotency_key: Optional[str] = Header(None),
+    session: AsyncSession = Depends(get_async_session),
+    current_user: User = Depends(get_current_user_for_write)
+):
+
+    scope = f"transcribe_patient:{patient_id}"
+    request_hash = build_request_hash(scope, await hash_upload(file)) if idempotency_key else ""
+    return await run_with_deadline(request, run_idempotent(
+        idempotency_key, current_user.id, scope, request_hash,
+        lambda: handle_transcription_with_patient(session, file, patient_id, get_tenant_key(current_user.username)),
+        session=session
+    ))
+
+# Resumable uploads (protected)
+def _upload_headers(upload: UploadSessionResponse) -> dict:
+    return {
+        "Upload-Offset": str(upload.offset),
+        "Upload-Length": str(upload.total_size),
+        "Cache-Control": "no-store",
+    }
+
+@router.post("/uploads", response_model=UploadSessionResponse, status_code=status.HTTP_201_CREATED)
+async def create_upload(
+    data: UploadSessionCreate,
+    response: Response,
+    current_user: User = Depends(get_current_user)
+):
+
+    upload = await create_upload_session(current_user.id, data)
+    response.headers.update(_upload_headers(upload))
+    response.headers["Location"] = f"/api/v1/uploads/{upload.id}"
+    return upload
+
+@router.head("/uploads/{upload_id}")
+async def get_upload_offset(
+    upload_id: str,
+    current_user: User = Depends(get_current_user)
+):
+
+    upload = await get_upload_session(upload_id, current_user.id)
+    return Response(status_code=status.HTTP_200_OK, headers=_upload_headers(upload))
+
+@router.get("/uploads/{upload_id}", response_model=UploadSessionResponse)
+async def get_upload(
+    upload_id: str,
+    response: Response,
+    current_user: User = Depends(get_current_user)
+):
+
+    upload = await get_upload_session(upload_id, current_user.id)
+    response.headers.update(_upload_headers(upload))
+    return upload
+
+@router.patch("/uploads/{upload_id}")
+async def upload_chunk(
+    request: Request,
+    upload_id: str,
+    upload_offset: int = Header(...),
+    upload_checksum: Optional[str] = Header(None),
+    current_user: User = Depends(get_current_user)
+):
+
+    checksum = parse_upload_checksum(upload_checksum)
+    upload = await append_upload_chunk(upload_id, current_user.id, upload_offset, request.stream(), checksum)
+    return Response(status_code=status.HTTP_204_NO_CONTENT, headers=_upload_headers(upload))
+
+@router.post("/uploads/{upload_id}/finalize", response_model=TranscriptionResponse)
+async def finalize_upload_session(
+    request: Request,
+    upload_id: str,
     session: AsyncSession = Depends(get_async_session),
+    current_user: User = Depends(get_current_user_for_write)
+):
+
+    tenant = get_tenant_key(current_user.username)
+
+    async def pipeline(file: UploadFile, patient_id: Optional[int]) -> TranscriptionResponse:
+        if patient_id is None:
+            return await handle_transcription_flow(file, tenant)
+        return await handle_transcription_with_patient(session, file, patient_id, tenant)
+
+    return await run_with_deadline(request, finalize_upload(upload_id, current_user.id, pipeline, session))
+
+@router.delete("/uploads/{upload_id}", status_code=status.HTTP_204_NO_CONTENT)
+async def delete_upload(
+    upload_id: str,
     current_user: User = Depends(get_current_user)
 ):
 
-    return await handle_transcription_with_patient(session, file, patient_id)
+    await delete_upload_session(upload_id, current_user.id)
+    return Response(status_code=status.HTTP_204_NO_CONTENT)
+
+@router.websocket("/ws/transcribe/patient/{patient_id}")
+async def realtime_transcribe_for_patient(
+    websocket: WebSocket,
+    patient_id: int,
+    token: str = Query(...)
+):
+    # Navegadores não enviam Authorization no handshake: o token vem na query string
+    async with get_read_session_maker()() as session:
+        try:
+            user = await get_user_from_token(session, token)
+        except HTTPException:
+            await websocket.close(code=status.WS_1008_POLICY_VIOLATION)
+            return
+
+    await websocket.accept()
+    try:
+        await handle_realtime_transcription(websocket, patient_id, tenant=get_tenant_key(user.username))
+    except HTTPException as error:
+        await websocket.send_json({"type": "error", "detail": error.detail})
+        await websocket.close(code=status.WS_1008_POLICY_VIOLATION)
 
 # Patient routes (protected)
 @router.post("/patients", response_model=PatientResponse)
 async def create_new_patient(
     patient_data: PatientCreate,
     session: AsyncSession = Depends(get_async_session),
-    current_user: User = Depends(get_current_user)
+    current_user: User = Depends(get_current_user_for_write)
 ):
 
     return await create_patient(session, patient_data)
 
-@router.get("/patients", response_model=List[PatientResponse])
+@router.get("/patients", response_model=List[PatientListItem])
 async def list_patients(
     skip: int = Query(0, ge=0),
     limit: int = Query(100, ge=1, le=1000),
-    session: AsyncSession = Depends(get_async_session),
+    session: AsyncSession = Depends(get_async_read_session),
     current_user: User = Depends(get_current_user)
 ):
 
@@ -94,16 +231,32 @@ async def list_patients(
 @router.get("/patients/{patient_id}", response_model=PatientWithRecords)
 async def get_patient(
     patient_id: int,
-    session: AsyncSession = Depends(get_async_session),
+    response: Response,
+    if_none_match: Optional[str] = Header(None),
+    session: AsyncSession = Depends(get_async_read_session),
     current_user: User = Depends(get_current_user)
 ):
 
+    version = await get_patient_version(session, patient_id)
+    etag = build_etag(
+        "patient", patient_id, version["patient_modified_at"], version["patient_version"],
+        version["record_count"], version["records_modified_at"], version["last_record_id"],
+        version["records_version"]
+    )
+    last_modified = max(
+        (value for value in (version["patient_modified_at"], version["records_modified_at"]) if value),
+        default=None
+    )
+    not_modified = conditional_response(if_none_match, response, etag, last_modified)
+    if not_modified:
+        return not_modified
+
     return await get_patient_by_id(session, patient_id)
 
 @router.get("/patients/cpf/{cpf}", response_model=PatientWithRecords)
 async def get_patient_by_document(
     cpf: str,
-    session: AsyncSession = Depends(get_async_session),
+    session: AsyncSession = Depends(get_async_read_session),
     current_user: User = Depends(get_current_user)
 ):
 
@@ -114,7 +267,7 @@ async def update_existing_patient(
     patient_id: int,
     patient_data: PatientUpdate,
     session: AsyncSession = Depends(get_async_session),
-    current_user: User = Depends(get_current_user)
+    current_user: User = Depends(get_current_user_for_write)
 ):
 
     return await update_patient(session, patient_id, patient_data)
@@ -123,7 +276,7 @@ async def update_existing_patient(
 async def delete_existing_patient(
     patient_id: int,
     session: AsyncSession = Depends(get_async_session),
-    current_user: User = Depends(get_current_user)
+    current_user: User = Depends(get_current_user_for_write)
 ):
 
     await delete_patient(session, patient_id)
@@ -133,35 +286,77 @@ async def delete_existing_patient(
 @router.post("/records", response_model=MedicalRecordResponse)
 async def create_new_medical_record(
     record_data: MedicalRecordCreate,
+    idempotency_key: Optional[str] = Header(None),
     session: AsyncSession = Depends(get_async_session),
-    current_user: User = Depends(get_current_user)
+    current_user: User = Depends(get_current_user_for_write)
 ):
-    return await create_medical_record(session, record_data)
+    request_hash = build_request_hash("records", record_data.model_dump_json()) if idempotency_key else ""
+    return await run_idempotent(
+        idempotency_key, current_user.id, "records", request_hash,
+        lambda: create_medical_record(session, record_data),
+        session=session
+    )
 
 @router.get("/patients/{patient_id}/records", response_model=List[MedicalRecordResponse])
 async def get_patient_medical_records(
     patient_id: int,
-    session: AsyncSession = Depends(get_async_session),
+    response: Response,
+    limit: Optional[int] = Query(None, ge=1, le=500),
+    cursor: Optional[str] = Query(None),
+    if_none_match: Optional[str] = Header(None),
+    session: AsyncSession = Depends(get_async_read_session),
     current_user: User = Depends(get_current_user)
 ):
 
-    return await get_patient_records(session, patient_id)
+    version = await get_patient_version(session, patient_id)
+    etag = build_etag(
+        "records", patient_id, version["record_count"],
+        version["records_modified_at"], version["last_record_id"], version["records_version"], limit, cursor
+    )
+    not_modified = conditional_response(if_none_match, response, etag, version["records_modified_at"])
+    if not_modified:
+        return not_modified
+
+    records, next_cursor = await get_patient_records(session, patient_id, limit, cursor)
+    if next_cursor:
+        response.headers["X-Next-Cursor"] = next_cursor
+    return records
 
 @router.get("/records/{record_id}", response_model=MedicalRecordResponse)
 async def get_single_medical_record(
     record_id: int,
-    session: AsyncSession = Depends(get_async_session),
+    response: Response,
+    if_none_match: Optional[str] = Header(None),
+    session: AsyncSession = Depends(get_async_read_session),
     current_user: User = Depends(get_current_user)
 ):
 
+    version = await get_medical_record_version(session, record_id)
+    etag = build_etag("record", record_id, version["modified_at"], version["version"])
+    not_modified = conditional_response(if_none_match, response, etag, version["modified_at"])
+    if not_modified:
+        return not_modified
+
     return await get_medical_record(session, record_id)
 
+@router.get("/records/{record_id}/segments", response_model=List[TranscriptionSegmentResponse])
+async def get_medical_record_segments(
+    record_id: int,
+    start: Optional[float] = Query(None, ge=0),
+    end: Optional[float] = Query(None, ge=0),
+    q: Optional[str] = Query(None, min_length=2),
+    session: AsyncSession = Depends(get_async_read_session),
+    current_user: User = Depends(get_current_user)
+):
+
+    return await get_record_segments(session, record_id, start, end, q)
+
 @router.put("/records/{record_id}", response_model=MedicalRecordResponse)
 async def update_existing_medical_record(
     record_id: int,
     record_data: MedicalRecordUpdate,
     session: AsyncSession = Depends(get_async_session),
-    current_user: User = Depends(get_current_user)
+    current_user: User = Depends(get_current_user_for_write)
 ):
 
     return await update_medical_record(session, record_id, record_data)
@@ -170,8 +365,21 @@ async def update_existing_medical_record(
 async def delete_existing_medical_record(
     record_id: int,
     session: AsyncSession = Depends(get_async_session),
-    current_user: User = Depends(get_current_user)
+    current_user: User = Depends(get_current_user_for_write)
 ):
 
     await delete_medical_record(session, record_id)
-    return {"message": "Medical record deleted successfully"}
\ No newline at end of file
+    return {"message": "Medical record deleted successfully"}
+
+# Usage ledger (protected)
+@router.get("/usage", response_model=List[UsageSummary])
+async def get_usage(
+    group_by: List[str] = Query(["user", "model", "day"]),
+    start: Optional[date] = Query(None),
+    end: Optional[date] = Query(None),
+    user_id: Optional[int] = Query(None),
+    session: AsyncSession = Depends(get_async_read_session),
+    current_user: User = Depends(get_current_user)
+):
+
+    return await get_usage_summary(session, current_user, group_by, start, end, user_id)
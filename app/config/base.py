@@ -1,3 +1,4 @@
+from typing import Dict, List, Optional
 from pydantic_settings import BaseSettings
 from os import getenv
 from dotenv import load_dotenv
@@ -15,16 +16,103 @@ class GlobalConfig(BaseSettings):
     OPENROUTER_API_KEY: str = str(getenv("OPENROUTER_API_KEY"))
     OPENROUTER_TEMPERATURE: float = 0.3
     OPENROUTER_MODEL_ID: str = 'openai/gpt-4o'
+    OPENROUTER_BASE_URL: str = 'https://openrouter.ai/api/v1'
+    # json_schema | json_object | text
+    OPENROUTER_RESPONSE_FORMAT: str = 'json_schema'
     
     GROQ_API_KEY: str = str(getenv("GROQ_API_KEY"))
     GROQ_TEMPERATURE: float = 0.3
     GROQ_MODEL_ID: str = 'meta-llama/llama-4-scout-17b-16e-instruct'
+    GROQ_BASE_URL: Optional[str] = getenv("GROQ_BASE_URL")
+    # json_schema | json_object | text
+    GROQ_RESPONSE_FORMAT: str = 'json_object'
     GROQ_MODEL_TRANSCRIPTION_ID: str = 'whisper-large-v3-turbo'
     GROQ_MODEL_TRANSCRIPTION_LANGUAGE: str = 'pt'
     GROQ_MODEL_TRANSCRIPTION_TEMPERATURE: float = 0.0
     
     PROVIDER_DEFAULT: AIProvider = AIProvider.GROQ
     
+    # Timeouts explícitos dos clientes HTTP dos provedores (por tentativa)
+    GROQ_TIMEOUT_SECONDS: float = 120.0
+    OPENROUTER_TIMEOUT_SECONDS: float = 60.0
+    PROVIDER_CONNECT_TIMEOUT_SECONDS: float = 5.0
+    # Prazo total das rotas de transcrição; deve ficar abaixo do timeout do proxy
+    REQUEST_DEADLINE_SECONDS: float = 170.0
+    # Orçamento máximo de cada etapa, limitado pelo que resta do prazo da requisição
+    STAGE_TIMEOUT_SECONDS: Dict[str, float] = {"transcription": 120.0, "llm_completion": 60.0}
+    # Intervalo entre verificações de desconexão do cliente
+    DISCONNECT_POLL_SECONDS: float = 0.5
+    
+    DATABASE_URL: Optional[str] = getenv("DATABASE_URL")
+    DATABASE_REPLICA_URL: Optional[str] = getenv("DATABASE_REPLICA_URL")
+    DATABASE_ECHO: bool = False
+    # Conexões abertas em cada pool durante o startup, antes de sinalizar prontidão
+    DATABASE_POOL_WARM_CONNECTIONS: int = 2
+    
+    # Reserva do paciente enquanto o pipeline de transcrição roda
+    PATIENT_RESERVATION_SECONDS: int = 10 * 60
+    
+    UPLOAD_MAX_BYTES: int = 25 * 1024 * 1024
+    UPLOAD_ALLOWED_EXTENSIONS: List[str] = ['flac', 'm4a', 'mp3', 'mp4', 'mpeg', 'mpga', 'ogg', 'opus', 'wav', 'webm']
+    
+    # Modo pipelined: áudio MP3 cortado em pedaços, cada trecho transcrito vai para a
+    # extração assim que chega, sobrepondo LLM e transcrição. Outros formatos seguem o fluxo sequencial.
+    AIFLOW_PIPELINED: bool = False
+    AIFLOW_CHUNK_BYTES: int = 4 * 1024 * 1024
+    AIFLOW_MAX_PARALLEL_CHUNKS: int = 3
+    # Pedaço cuja transcrição falha em todas as tentativas faz a consulta cair no fluxo sequencial
+    AIFLOW_CHUNK_MAX_ATTEMPTS: int = 2
+    AIFLOW_CHUNK_RETRY_BACKOFF_SECONDS: float = 0.5
+    
+    # Arquivo de áudio opcional, deduplicado por sha256, para reprocessar consultas
+    AUDIO_ARCHIVE_ENABLED: bool = False
+    AUDIO_ARCHIVE_DIR: str = getenv("AUDIO_ARCHIVE_DIR", "data/audio")
+    # A coleta de lixo só remove áudio sem prontuário e sem uso há mais que isso
+    AUDIO_ARCHIVE_GC_GRACE_SECONDS: int = 24 * 60 * 60
+    
+    # Uploads retomáveis (create / PATCH de chunks / finalize)
+    UPLOAD_SESSION_DIR: str = getenv("UPLOAD_SESSION_DIR", "data/uploads")
+    UPLOAD_SESSION_TTL_SECONDS: int = 24 * 60 * 60
+    UPLOAD_CHUNK_SIZE_HINT: int = 5 * 1024 * 1024
+    
+    # Ledger de consumo dos provedores: linhas acumuladas em memória e gravadas em lote
+    USAGE_LEDGER_ENABLED: bool = True
+    USAGE_LEDGER_FLUSH_SECONDS: float = 5.0
+    USAGE_LEDGER_BATCH_SIZE: int = 500
+    # Acima disso (banco fora do ar) as linhas mais antigas são descartadas
+    USAGE_LEDGER_MAX_BUFFER: int = 20000
+    # Usuários que consultam o consumo de todos; os demais veem só o próprio
+    USAGE_ADMIN_USERNAMES: List[str] = []
+    # Preço por modelo para estimar custo: {"whisper-large-v3-turbo": {"audio_hour": 0.04},
+    # "meta-llama/...": {"prompt_million": 0.11, "completion_million": 0.34}}
+    PROVIDER_PRICING: Dict[str, Dict[str, float]] = {}
+    
+    # Fila justa do pipeline de IA (por worker)
+    SCHEDULER_MAX_CONCURRENCY: int = 16
+    SCHEDULER_TENANT_MAX_CONCURRENCY: int = 4
+    SCHEDULER_TENANT_MAX_QUEUE: int = 8
+    SCHEDULER_QUEUE_TIMEOUT_SECONDS: float = 120.0
+    # Agrupamento opcional de usuários por clínica: {"clinica-a": ["dr.joao", "dra.maria"]}
+    SCHEDULER_TENANT_GROUPS: Dict[str, List[str]] = {}
+    # Peso de cada tenant ("user:<username>" ou "clinic:<nome>"); padrão 1.0
+    SCHEDULER_TENANT_WEIGHTS: Dict[str, float] = {}
+    
+    # Transcrição em tempo real (WebSocket)
+    REALTIME_MAX_SESSION_SECONDS: int = 2 * 60 * 60
+    REALTIME_MAX_WINDOW_BYTES: int = 5 * 1024 * 1024
+    REALTIME_MAX_PARALLEL_WINDOWS: int = 2
+    # Tentativas por janela antes de dá-la como perdida (erro do provedor ou 429 da fila)
+    REALTIME_WINDOW_MAX_ATTEMPTS: int = 3
+    REALTIME_WINDOW_RETRY_BACKOFF_SECONDS: float = 0.5
+    
+    IDEMPOTENCY_TTL_SECONDS: int = 24 * 60 * 60
+    # Tempo máximo que uma requisição em andamento segura a chave antes de ser considerada abandonada
+    IDEMPOTENCY_LOCK_SECONDS: int = 15 * 60
+    IDEMPOTENCY_WAIT_SECONDS: float = 120.0
+    IDEMPOTENCY_POLL_SECONDS: float = 0.5
+    # Janela (s) em que um usuário que escreveu continua lendo do primário
+    DATABASE_PRIMARY_PIN_SECONDS: float = 5.0
+    
     class Config:
         case_sensitive = True
     
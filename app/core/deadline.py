@@ -0,0 +1,119 @@
+import asyncio
+import time
+from contextvars import ContextVar
+from typing import Awaitable, Optional, TypeVar
+
+from fastapi import HTTPException, Request, status
+
+from app.config.base import global_config
+from app.core.metrics import PIPELINE_CANCELLED
+
+T = TypeVar("T")
+
+# Status não padronizado (nginx) para "cliente fechou a conexão"; ninguém chega a recebê-lo
+CLIENT_CLOSED_REQUEST = 499
+
+REASON_CLIENT_DISCONNECT = "client_disconnect"
+REASON_DEADLINE = "deadline"
+
+
+class Deadline:
+    """
+    Prazo da requisição, propagado por contextvar até as chamadas aos provedores.
+    Guarda a etapa em andamento para atribuir cancelamentos nas métricas.
+    """
+    __slots__ = ("expires_at", "stage")
+
+    def __init__(self, seconds: float):
+        self.expires_at = time.monotonic() + seconds
+        self.stage = "queued"
+
+    def remaining(self) -> float:
+        return self.expires_at - time.monotonic()
+
+
+_deadline: ContextVar[Optional[Deadline]] = ContextVar("request_deadline", default=None)
+
+
+def get_deadline() -> Optional[Deadline]:
+    return _deadline.get()
+
+
+def _deadline_exceeded(stage: str) -> HTTPException:
+    PIPELINE_CANCELLED.labels(stage, REASON_DEADLINE).inc()
+    return HTTPException(
+        status_code=status.HTTP_504_GATEWAY_TIMEOUT,
+        detail=f"Processing exceeded its time budget during {stage}"
+    )
+
+
+def stage_timeout(stage: str) -> float:
+    """Orçamento da etapa: o menor entre o configurado e o que resta do prazo."""
+    budget = global_config.STAGE_TIMEOUT_SECONDS.get(stage, global_config.REQUEST_DEADLINE_SECONDS)
+    deadline = _deadline.get()
+    if deadline is None:
+        return budget
+
+    remaining = deadline.remaining()
+    if remaining <= 0:
+        raise _deadline_exceeded(stage)
+    return min(budget, remaining)
+
+
+async def within_budget(stage: str, awaitable: Awaitable[T]) -> T:
+    try:
+        timeout = stage_timeout(stage)
+    except HTTPException:
+        if asyncio.iscoroutine(awaitable):
+            awaitable.close()
+        raise
+    deadline = _deadline.get()
+    if deadline is not None:
+        deadline.stage = stage
+    try:
+        return await asyncio.wait_for(awaitable, timeout=timeout)
+    except asyncio.TimeoutError:
+        raise _deadline_exceeded(stage)
+
+
+async def run_with_deadline(request: Request, awaitable: Awaitable[T], seconds: Optional[float] = None) -> T:
+    """
+    Executa o trabalho da rota com prazo total e o cancela se o cliente
+    desconectar. O cancelamento percorre o pipeline (CancelledError), então
+    reservas, chaves de idempotência, slots da fila e arquivos temporários
+    são liberados pelos próprios blocos de limpeza.
+    """
+    deadline = Deadline(seconds or global_config.REQUEST_DEADLINE_SECONDS)
+    token = _deadline.set(deadline)
+    try:
+        # A task herda o contexto atual, incluindo o prazo
+        task = asyncio.ensure_future(awaitable)
+    finally:
+        _deadline.reset(token)
+
+    try:
+        while True:
+            poll = min(global_config.DISCONNECT_POLL_SECONDS, max(deadline.remaining(), 0))
+            done, _ = await asyncio.wait({task}, timeout=poll)
+            if done:
+                return task.result()
+
+            if deadline.remaining() <= 0:
+                reason = REASON_DEADLINE
+            elif await request.is_disconnected():
+                reason = REASON_CLIENT_DISCONNECT
+            else:
+                continue
+
+            task.cancel()
+            await asyncio.gather(task, return_exceptions=True)
+            if reason == REASON_DEADLINE:
+                raise _deadline_exceeded(deadline.stage)
+            PIPELINE_CANCELLED.labels(deadline.stage, reason).inc()
+            raise HTTPException(status_code=CLIENT_CLOSED_REQUEST, detail="Client closed request")
+    except asyncio.CancelledError:
+        # O próprio servidor cancelou a requisição (ex.: shutdown)
+        task.cancel()
+        await asyncio.gather(task, return_exceptions=True)
+        PIPELINE_CANCELLED.labels(deadline.stage, "server").inc()
+        raise
@@ -0,0 +1,191 @@
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Dict, List, Optional, Tuple
+
+from prometheus_client import CONTENT_TYPE_LATEST, Counter, Gauge, Histogram, generate_latest
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 20.0, 40.0, 80.0, 160.0)
+
+HTTP_REQUEST_LATENCY = Histogram(
+    "headmed_http_request_duration_seconds",
+    "Latência das requisições HTTP por rota",
+    ["method", "route", "status"],
+    buckets=LATENCY_BUCKETS,
+)
+
+STAGE_LATENCY = Histogram(
+    "headmed_stage_duration_seconds",
+    "Latência de cada etapa do pipeline (upload, transcrição, LLM, parsing, banco)",
+    ["stage", "provider"],
+    buckets=LATENCY_BUCKETS,
+)
+
+PROVIDER_REQUESTS = Counter(
+    "headmed_provider_requests_total",
+    "Chamadas aos provedores de IA",
+    ["provider", "model", "operation", "outcome"],
+)
+
+PROVIDER_AUDIO_SECONDS = Counter(
+    "headmed_provider_audio_seconds_total",
+    "Segundos de áudio enviados para transcrição",
+    ["provider", "model"],
+)
+
+PROVIDER_TOKENS = Counter(
+    "headmed_provider_tokens_total",
+    "Tokens consumidos nas chamadas de completion",
+    ["provider", "model", "kind"],
+)
+
+STRUCTURED_OUTPUT_EXTRACTIONS = Counter(
+    "headmed_structured_output_extractions_total",
+    "Extrações estruturadas de prontuário solicitadas ao LLM",
+    ["provider"],
+)
+
+STRUCTURED_OUTPUT_PARSE_FAILURES = Counter(
+    "headmed_structured_output_parse_failures_total",
+    "Respostas do LLM com JSON inválido ou campos ausentes",
+    ["provider", "kind"],
+)
+
+STRUCTURED_OUTPUT_REPAIRS = Counter(
+    "headmed_structured_output_repairs_total",
+    "Chamadas de reparo direcionado e seu resultado (repaired, partial, empty, failed)",
+    ["provider", "outcome"],
+)
+
+STRUCTURED_OUTPUT_REPAIR_TOKENS_ESTIMATE = Counter(
+    "headmed_structured_output_repair_tokens_estimate_total",
+    "Estimativa (tamanho dos prompts / 4) dos tokens de prompt do reparo: saved = economizados por "
+    "reparar a partir da resposta em vez de reexecutar; spent = gastos reenviando a transcrição",
+    ["provider", "effect"],
+)
+
+SCHEDULER_QUEUE_WAIT = Histogram(
+    "headmed_scheduler_queue_wait_seconds",
+    "Tempo de espera na fila justa antes de iniciar o trabalho de IA",
+    ["workload"],
+    buckets=LATENCY_BUCKETS,
+)
+
+SCHEDULER_REJECTED = Counter(
+    "headmed_scheduler_rejected_total",
+    "Trabalhos recusados pela fila justa",
+    ["workload", "reason"],
+)
+
+SCHEDULER_IN_FLIGHT = Gauge(
+    "headmed_scheduler_in_flight",
+    "Trabalhos de IA em execução",
+    ["workload"],
+)
+
+SCHEDULER_QUEUED = Gauge(
+    "headmed_scheduler_queued",
+    "Trabalhos de IA aguardando na fila",
+    ["workload"],
+)
+
+PIPELINE_CANCELLED = Counter(
+    "headmed_pipeline_cancelled_total",
+    "Trabalho de IA interrompido antes de terminar, por etapa e motivo",
+    ["stage", "reason"],
+)
+
+USAGE_LEDGER_WRITES = Counter(
+    "headmed_usage_ledger_rows_total",
+    "Linhas do ledger de consumo gravadas ou descartadas",
+    ["outcome"],
+)
+
+USAGE_LEDGER_BUFFERED = Gauge(
+    "headmed_usage_ledger_buffered",
+    "Linhas do ledger de consumo aguardando gravação",
+)
+
+
+class RequestTimings:
+    """
+    Acumula as etapas medidas durante uma requisição para o header Server-Timing.
+    """
+    __slots__ = ("spans", "annotations")
+
+    def __init__(self):
+        self.spans: List[Tuple[str, float]] = []
+        self.annotations: Dict[str, str] = {}
+
+    def add_span(self, name: str, duration_seconds: float) -> None:
+        self.spans.append((name, duration_seconds * 1000))
+
+    def annotate(self, name: str, value) -> None:
+        self.annotations[name] = str(value)
+
+    def increment(self, name: str, value: float) -> None:
+        current = float(self.annotations.get(name, 0))
+        self.annotations[name] = f"{current + value:g}"
+
+    def server_timing_header(self) -> str:
+        entries = [f"{name};dur={duration:.1f}" for name, duration in self.spans]
+        entries += [f'{name};desc="{value}"' for name, value in self.annotations.items()]
+        return ", ".join(entries)
+
+
+_request_timings: ContextVar[Optional[RequestTimings]] = ContextVar("request_timings", default=None)
+
+
+def start_request_timings() -> RequestTimings:
+    timings = RequestTimings()
+    _request_timings.set(timings)
+    return timings
+
+
+def get_request_timings() -> Optional[RequestTimings]:
+    return _request_timings.get()
+
+
+@contextmanager
+def timed(stage: str, provider: str = ""):
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        duration = time.perf_counter() - start
+        STAGE_LATENCY.labels(stage, provider).observe(duration)
+        timings = _request_timings.get()
+        if timings is not None:
+            timings.add_span(stage, duration)
+
+
+def record_provider_call(
+    provider: str,
+    model: str,
+    operation: str,
+    outcome: str = "success",
+    audio_seconds: Optional[float] = None,
+    prompt_tokens: Optional[int] = None,
+    completion_tokens: Optional[int] = None,
+) -> None:
+    PROVIDER_REQUESTS.labels(provider, model, operation, outcome).inc()
+
+    timings = _request_timings.get()
+    if timings is not None:
+        timings.annotate(f"{operation}_provider", provider)
+        timings.annotate(f"{operation}_model", model)
+
+    if audio_seconds:
+        PROVIDER_AUDIO_SECONDS.labels(provider, model).inc(audio_seconds)
+        if timings is not None:
+            timings.increment("audio_seconds", audio_seconds)
+
+    for kind, tokens in (("prompt", prompt_tokens), ("completion", completion_tokens)):
+        if tokens:
+            PROVIDER_TOKENS.labels(provider, model, kind).inc(tokens)
+            if timings is not None:
+                timings.increment(f"{kind}_tokens", tokens)
+
+
+def render_metrics() -> Tuple[bytes, str]:
+    return generate_latest(), CONTENT_TYPE_LATEST
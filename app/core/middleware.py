@@ -0,0 +1,44 @@
+import time
+
+from starlette.datastructures import MutableHeaders
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from app.core.metrics import HTTP_REQUEST_LATENCY, start_request_timings
+
+
+class ServerTimingMiddleware:
+    """
+    Mede a latência por rota e adiciona o header Server-Timing.
+
+    Middleware ASGI puro: ao contrário do BaseHTTPMiddleware, não intercepta o
+    `receive`, então `request.is_disconnected()` continua enxergando a
+    desconexão do cliente nas rotas.
+    """
+
+    def __init__(self, app: ASGIApp):
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        timings = start_request_timings()
+        start = time.perf_counter()
+        status_code = 500
+
+        async def send_with_timing(message: Message) -> None:
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+                timings.add_span("total", time.perf_counter() - start)
+                MutableHeaders(scope=message).append("Server-Timing", timings.server_timing_header())
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_timing)
+        finally:
+            route = scope.get("route")
+            HTTP_REQUEST_LATENCY.labels(
+                scope["method"], getattr(route, "path", "unmatched"), status_code
+            ).observe(time.perf_counter() - start)
@@ -0,0 +1,187 @@
+import asyncio
+import time
+from collections import deque
+from contextlib import asynccontextmanager
+from typing import Deque, Dict, Optional
+
+from fastapi import HTTPException, status
+
+from app.config.base import global_config
+from app.core.metrics import (
+    SCHEDULER_IN_FLIGHT, SCHEDULER_QUEUED, SCHEDULER_QUEUE_WAIT, SCHEDULER_REJECTED, get_request_timings
+)
+
+
+class _Waiter:
+    __slots__ = ("tag", "future")
+
+    def __init__(self, tag: float, future: asyncio.Future):
+        self.tag = tag
+        self.future = future
+
+
+class _Tenant:
+    __slots__ = ("weight", "queue", "running", "last_tag")
+
+    def __init__(self, weight: float):
+        self.weight = weight
+        self.queue: Deque[_Waiter] = deque()
+        self.running = 0
+        self.last_tag = 0.0
+
+
+class FairScheduler:
+    """
+    Fila justa ponderada (start-time fair queuing) para o trabalho de IA.
+
+    Cada tenant recebe uma fatia da capacidade proporcional ao seu peso, com
+    limite de execuções simultâneas e de fila por tenant. A capacidade é por
+    processo (worker).
+    """
+
+    def __init__(
+        self,
+        workload: str,
+        max_concurrency: int,
+        tenant_max_concurrency: int,
+        tenant_max_queue: int,
+        queue_timeout: float,
+        weights: Optional[Dict[str, float]] = None,
+    ):
+        self.workload = workload
+        self.max_concurrency = max_concurrency
+        self.tenant_max_concurrency = tenant_max_concurrency
+        self.tenant_max_queue = tenant_max_queue
+        self.queue_timeout = queue_timeout
+        self.weights = weights or {}
+        self._tenants: Dict[str, _Tenant] = {}
+        self._running = 0
+        self._queued = 0
+        self._virtual_time = 0.0
+
+    def _get_tenant(self, key: str) -> _Tenant:
+        tenant = self._tenants.get(key)
+        if tenant is None:
+            tenant = _Tenant(max(self.weights.get(key, 1.0), 0.01))
+            self._tenants[key] = tenant
+        return tenant
+
+    def _next_tag(self, tenant: _Tenant) -> float:
+        tenant.last_tag = max(self._virtual_time, tenant.last_tag) + 1.0 / tenant.weight
+        return tenant.last_tag
+
+    def _start(self, tenant: _Tenant, tag: float) -> None:
+        tenant.running += 1
+        self._running += 1
+        self._virtual_time = max(self._virtual_time, tag - 1.0 / tenant.weight)
+        SCHEDULER_IN_FLIGHT.labels(self.workload).set(self._running)
+
+    def _dispatch(self) -> None:
+        while self._running < self.max_concurrency:
+            best_tenant, best_waiter = None, None
+            for tenant in self._tenants.values():
+                if not tenant.queue or tenant.running >= self.tenant_max_concurrency:
+                    continue
+                if best_waiter is None or tenant.queue[0].tag < best_waiter.tag:
+                    best_tenant, best_waiter = tenant, tenant.queue[0]
+            if best_waiter is None:
+                return
+
+            best_tenant.queue.popleft()
+            self._queued -= 1
+            self._start(best_tenant, best_waiter.tag)
+            best_waiter.future.set_result(None)
+        SCHEDULER_QUEUED.labels(self.workload).set(self._queued)
+
+    def _release(self, key: str, tenant: _Tenant) -> None:
+        tenant.running -= 1
+        self._running -= 1
+        if not tenant.running and not tenant.queue:
+            self._tenants.pop(key, None)
+        SCHEDULER_IN_FLIGHT.labels(self.workload).set(self._running)
+        self._dispatch()
+        SCHEDULER_QUEUED.labels(self.workload).set(self._queued)
+
+    def _reject(self, reason: str, detail: str) -> HTTPException:
+        SCHEDULER_REJECTED.labels(self.workload, reason).inc()
+        return HTTPException(
+            status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+            detail=detail,
+            headers={"Retry-After": "5"},
+        )
+
+    async def _acquire(self, key: str) -> _Tenant:
+        tenant = self._get_tenant(key)
+
+        can_start = self._running < self.max_concurrency and tenant.running < self.tenant_max_concurrency
+        if can_start and not self._queued:
+            self._start(tenant, self._next_tag(tenant))
+            return tenant
+
+        # Recusa antes de calcular a tag: pedido recusado não atrasa o tenant na fila justa
+        if len(tenant.queue) >= self.tenant_max_queue:
+            if not tenant.running and not tenant.queue:
+                self._tenants.pop(key, None)
+            raise self._reject("queue_full", "Too many transcription requests queued for this user")
+
+        waiter = _Waiter(self._next_tag(tenant), asyncio.get_running_loop().create_future())
+        tenant.queue.append(waiter)
+        self._queued += 1
+        SCHEDULER_QUEUED.labels(self.workload).set(self._queued)
+        self._dispatch()
+
+        try:
+            await asyncio.wait_for(asyncio.shield(waiter.future), timeout=self.queue_timeout)
+        except BaseException as error:
+            if waiter.future.done():
+                # Já tinha ganhado a vaga: devolve para o próximo da fila
+                self._release(key, tenant)
+            else:
+                waiter.future.cancel()
+                tenant.queue.remove(waiter)
+                self._queued -= 1
+                if tenant.last_tag == waiter.tag:
+                    # Não rodou (timeout/cancelamento): devolve a fatia que a tag tinha reservado
+                    tenant.last_tag -= 1.0 / tenant.weight
+                if not tenant.running and not tenant.queue:
+                    self._tenants.pop(key, None)
+                SCHEDULER_QUEUED.labels(self.workload).set(self._queued)
+            if isinstance(error, asyncio.TimeoutError):
+                raise self._reject("timeout", "Timed out waiting for transcription capacity")
+            raise
+        return tenant
+
+    @asynccontextmanager
+    async def slot(self, key: str):
+        start = time.perf_counter()
+        tenant = await self._acquire(key)
+
+        wait = time.perf_counter() - start
+        SCHEDULER_QUEUE_WAIT.labels(self.workload).observe(wait)
+        timings = get_request_timings()
+        if timings is not None:
+            timings.add_span("queue_wait", wait)
+
+        try:
+            yield
+        finally:
+            self._release(key, tenant)
+
+
+def get_tenant_key(username: Optional[str]) -> str:
+    if not username:
+        return "anonymous"
+    for clinic, usernames in global_config.SCHEDULER_TENANT_GROUPS.items():
+        if username in usernames:
+            return f"clinic:{clinic}"
+    return f"user:{username}"
+
+
+ai_pipeline_scheduler = FairScheduler(
+    workload="ai_pipeline",
+    max_concurrency=global_config.SCHEDULER_MAX_CONCURRENCY,
+    tenant_max_concurrency=global_config.SCHEDULER_TENANT_MAX_CONCURRENCY,
+    tenant_max_queue=global_config.SCHEDULER_TENANT_MAX_QUEUE,
+    queue_timeout=global_config.SCHEDULER_QUEUE_TIMEOUT_SECONDS,
+    weights=global_config.SCHEDULER_TENANT_WEIGHTS,
+)
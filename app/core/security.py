@@ -1,33 +1,41 @@
 from datetime import datetime, timedelta
+from functools import lru_cache
 from typing import Union, Optional
 import jwt
-from passlib.context import CryptContext
 from fastapi import HTTPException, status, Depends
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy import select
-from app.database.db import get_async_session
+from app.database.db import get_session_maker, get_async_session, get_async_read_session
 from app.database.models import User
+from app.core.usage_ledger import set_usage_user
 import os
 from dotenv import load_dotenv
 
 load_dotenv()
 
-SECRET_KEY = os.getenv("SECRET_KEY")
 ALGORITHM = os.getenv("ALGORITHM", "HS256")
 ACCESS_TOKEN_EXPIRE_MINUTES = int(os.getenv("ACCESS_TOKEN_EXPIRE_MINUTES", "60"))
 
-if not SECRET_KEY:
-    raise ValueError("SECRET_KEY environment variable is required")
-
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
 security = HTTPBearer()
 
+def get_secret_key() -> str:
+    secret_key = os.getenv("SECRET_KEY")
+    if not secret_key:
+        raise ValueError("SECRET_KEY environment variable is required")
+    return secret_key
+
+@lru_cache(maxsize=1)
+def get_pwd_context():
+    # passlib/bcrypt só são carregados no primeiro login ou cadastro
+    from passlib.context import CryptContext
+    return CryptContext(schemes=["bcrypt"], deprecated="auto")
+
 def verify_password(plain_password: str, hashed_password: str) -> bool:
-    return pwd_context.verify(plain_password, hashed_password)
+    return get_pwd_context().verify(plain_password, hashed_password)
 
 def get_password_hash(password: str) -> str:
-    return pwd_context.hash(password)
+    return get_pwd_context().hash(password)
 
 def create_access_token(data: dict, expires_delta: Optional[timedelta] = None) -> str:
     to_encode = data.copy()
@@ -37,12 +45,12 @@ def create_access_token(data: dict, expires_delta: Optional[timedelta] = None) -
         expire = datetime.now() + timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)
     
     to_encode.update({"exp": expire})
-    encoded_jwt = jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
+    encoded_jwt = jwt.encode(to_encode, get_secret_key(), algorithm=ALGORITHM)
     return encoded_jwt
 
 def verify_token(token: str) -> str:
     try:
-        payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
+        payload = jwt.decode(token, get_secret_key(), algorithms=[ALGORITHM])
         username: str = payload.get("sub")
         if username is None:
             raise HTTPException(
@@ -59,15 +67,31 @@ def verify_token(token: str) -> str:
         )
 
 async def get_current_user(
+    credentials: HTTPAuthorizationCredentials = Depends(security),
+    session: AsyncSession = Depends(get_async_read_session)
+) -> User:
+    return await get_user_from_token(session, credentials.credentials)
+
+async def get_current_user_for_write(
     credentials: HTTPAuthorizationCredentials = Depends(security),
     session: AsyncSession = Depends(get_async_session)
 ) -> User:
-    token = credentials.credentials
+    # Rotas de escrita autenticam na mesma sessão do primário usada pela rota:
+    # o FastAPI reaproveita a dependência e a requisição ocupa uma única conexão
+    return await get_user_from_token(session, credentials.credentials, retry_on_primary=False)
+
+async def get_user_from_token(session: AsyncSession, token: str, retry_on_primary: bool = True) -> User:
     username = verify_token(token)
     
     result = await session.execute(select(User).filter(User.username == username))
     user = result.scalar_one_or_none()
     
+    if user is None and retry_on_primary:
+        # Usuário recém-criado pode ainda não ter sido replicado
+        async with get_session_maker()() as primary_session:
+            result = await primary_session.execute(select(User).filter(User.username == username))
+            user = result.scalar_one_or_none()
+    
     if user is None:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
@@ -75,4 +99,6 @@ async def get_current_user(
             headers={"WWW-Authenticate": "Bearer"},
         )
     
+    # Chamadas aos provedores desta requisição entram no ledger em nome do usuário
+    set_usage_user(user.id)
     return user
\ No newline at end of file
@@ -0,0 +1,142 @@
+import asyncio
+import logging
+import time
+from collections import deque
+from contextvars import ContextVar
+from datetime import datetime, timezone
+from typing import Any, Deque, Dict, List, Optional
+
+from sqlalchemy import insert
+
+from app.config.base import global_config
+from app.core.metrics import USAGE_LEDGER_BUFFERED, USAGE_LEDGER_WRITES, record_provider_call
+from app.database.db import get_session_maker
+from app.database.models import ProviderUsage
+
+logger = logging.getLogger(__name__)
+
+_usage_user_id: ContextVar[Optional[int]] = ContextVar("usage_user_id", default=None)
+
+
+def set_usage_user(user_id: Optional[int]) -> None:
+    """Atribui ao usuário as chamadas aos provedores feitas no contexto atual."""
+    _usage_user_id.set(user_id)
+
+
+class UsageLedger:
+    """
+    Acumula o consumo de cada chamada aos provedores em memória e grava em
+    lote (um único INSERT com várias linhas), fora do caminho da requisição.
+
+    A gravação roda numa task de fundo a cada `flush_seconds` ou quando o
+    buffer atinge `batch_size`. Se o banco falhar, as linhas voltam para o
+    buffer, limitado a `max_buffer` (as mais antigas são descartadas).
+    """
+
+    def __init__(self, flush_seconds: float, batch_size: int, max_buffer: int, enabled: bool = True):
+        self.flush_seconds = flush_seconds
+        self.batch_size = batch_size
+        self.max_buffer = max_buffer
+        self.enabled = enabled
+        self._buffer: Deque[Dict[str, Any]] = deque()
+        self._wakeup = asyncio.Event()
+        self._flush_lock = asyncio.Lock()
+        self._task: Optional[asyncio.Task] = None
+
+    def record(self, **row: Any) -> None:
+        if not self.enabled:
+            return
+        row.setdefault("user_id", _usage_user_id.get())
+        row.setdefault("created_at", datetime.now(timezone.utc))
+        self._buffer.append(row)
+        self._trim()
+        if len(self._buffer) >= self.batch_size:
+            self._wakeup.set()
+
+    def _trim(self) -> None:
+        dropped = 0
+        while len(self._buffer) > self.max_buffer:
+            self._buffer.popleft()
+            dropped += 1
+        if dropped:
+            USAGE_LEDGER_WRITES.labels("dropped").inc(dropped)
+            logger.warning("Usage ledger buffer full, dropped %s rows", dropped)
+        USAGE_LEDGER_BUFFERED.set(len(self._buffer))
+
+    async def flush(self) -> int:
+        async with self._flush_lock:
+            written = 0
+            while self._buffer:
+                batch: List[Dict[str, Any]] = [
+                    self._buffer.popleft() for _ in range(min(self.batch_size, len(self._buffer)))
+                ]
+                try:
+                    async with get_session_maker()() as session:
+                        await session.execute(insert(ProviderUsage), batch)
+                        await session.commit()
+                except Exception:
+                    # Devolve o lote na ordem original; a próxima rodada tenta de novo
+                    self._buffer.extendleft(reversed(batch))
+                    self._trim()
+                    logger.exception("Failed to flush %s usage rows", len(batch))
+                    break
+                written += len(batch)
+                USAGE_LEDGER_WRITES.labels("written").inc(len(batch))
+            USAGE_LEDGER_BUFFERED.set(len(self._buffer))
+            return written
+
+    async def _run(self) -> None:
+        while True:
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=self.flush_seconds)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+            await self.flush()
+
+    def start(self) -> None:
+        if self.enabled and self._task is None:
+            # Primitivas novas a cada start: o ledger pode ser reiniciado em outro event loop
+            self._wakeup = asyncio.Event()
+            self._flush_lock = asyncio.Lock()
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+        # Grava o que sobrou antes de fechar as conexões
+        await self.flush()
+
+
+usage_ledger = UsageLedger(
+    flush_seconds=global_config.USAGE_LEDGER_FLUSH_SECONDS,
+    batch_size=global_config.USAGE_LEDGER_BATCH_SIZE,
+    max_buffer=global_config.USAGE_LEDGER_MAX_BUFFER,
+    enabled=global_config.USAGE_LEDGER_ENABLED,
+)
+
+
+def record_provider_usage(
+    provider: str,
+    model: str,
+    operation: str,
+    started_at: float,
+    outcome: str = "success",
+    audio_seconds: Optional[float] = None,
+    prompt_tokens: Optional[int] = None,
+    completion_tokens: Optional[int] = None,
+) -> None:
+    """Métricas da chamada (Prometheus/Server-Timing) e linha no ledger de consumo."""
+    record_provider_call(provider, model, operation, outcome, audio_seconds, prompt_tokens, completion_tokens)
+    usage_ledger.record(
+        provider=provider,
+        model=model,
+        operation=operation,
+        outcome=outcome,
+        latency_ms=int((time.perf_counter() - started_at) * 1000),
+        audio_seconds=audio_seconds,
+        prompt_tokens=prompt_tokens,
+        completion_tokens=completion_tokens,
+    )
@@ -1,42 +1,147 @@
-from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker, AsyncSession
-from sqlalchemy.orm import DeclarativeBase
-from typing import AsyncGenerator
-import os
-from dotenv import load_dotenv
+from sqlalchemy import event, text
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker, AsyncSession, AsyncEngine
+from sqlalchemy.orm import DeclarativeBase, Session
+from typing import AsyncGenerator, Dict, Optional
+from fastapi import Request
+import asyncio
+import time
+import jwt
 
-load_dotenv()
+from app.config.base import global_config
 
-DATABASE_URL = os.getenv("DATABASE_URL")
+_engines: Dict[str, AsyncEngine] = {}
+_session_makers: Dict[str, async_sessionmaker] = {}
 
-if not DATABASE_URL:
-    raise ValueError("DATABASE_URL environment variable is required")
+def _create_engine(url: str) -> AsyncEngine:
+    return create_async_engine(
+        url,
+        echo=global_config.DATABASE_ECHO,
+        future=True
+    )
 
-engine = create_async_engine(
-    DATABASE_URL,
-    echo=True,
-    future=True
-)
+def get_engine() -> AsyncEngine:
+    # Criado no primeiro uso para que importar a aplicação não abra conexões
+    if "primary" not in _engines:
+        if not global_config.DATABASE_URL:
+            raise ValueError("DATABASE_URL environment variable is required")
+        _engines["primary"] = _create_engine(global_config.DATABASE_URL)
+    return _engines["primary"]
 
-async_session_maker = async_sessionmaker(
-    engine,
-    class_=AsyncSession,
-    expire_on_commit=False
-)
+def get_read_engine() -> AsyncEngine:
+    # Sem réplica configurada as leituras vão para o primário
+    if "replica" not in _engines:
+        replica_url = global_config.DATABASE_REPLICA_URL
+        _engines["replica"] = _create_engine(replica_url) if replica_url else get_engine()
+    return _engines["replica"]
+
+def get_session_maker() -> async_sessionmaker:
+    if "primary" not in _session_makers:
+        _session_makers["primary"] = async_sessionmaker(
+            get_engine(),
+            class_=AsyncSession,
+            expire_on_commit=False
+        )
+    return _session_makers["primary"]
+
+def get_read_session_maker() -> async_sessionmaker:
+    if "replica" not in _session_makers:
+        _session_makers["replica"] = async_sessionmaker(
+            get_read_engine(),
+            class_=AsyncSession,
+            expire_on_commit=False
+        )
+    return _session_makers["replica"]
+
+async def _ping(engine: AsyncEngine) -> None:
+    async with engine.connect() as conn:
+        await conn.execute(text("SELECT 1"))
+
+async def warm_up_pools(connections: int) -> None:
+    # Abre as conexões em paralelo para que fiquem no pool antes do primeiro request
+    engines = {id(engine): engine for engine in (get_engine(), get_read_engine())}.values()
+    for engine in engines:
+        await asyncio.gather(*(_ping(engine) for _ in range(max(connections, 1))))
+
+async def dispose_engines() -> None:
+    for engine in {id(engine): engine for engine in _engines.values()}.values():
+        await engine.dispose()
+    _engines.clear()
+    _session_makers.clear()
 
 class Base(DeclarativeBase):
     pass
 
-async def get_async_session() -> AsyncGenerator[AsyncSession, None]:
-    async with async_session_maker() as session:
+# chave do cliente -> instante (monotonic) até quando as leituras ficam no primário
+_primary_pins: Dict[str, float] = {}
+
+@event.listens_for(Session, "after_flush")
+def _mark_session_writes(session, flush_context):
+    session.info["has_writes"] = True
+
+def _get_pin_key(request: Request) -> Optional[str]:
+    # O pin é do usuário, não do token: renovar o token não pode perder o read-your-writes.
+    # A assinatura é conferida na autenticação; aqui o claim só escolhe o banco de leitura
+    scheme, _, token = request.headers.get("Authorization", "").partition(" ")
+    if scheme.lower() != "bearer" or not token:
+        return None
+    
+    try:
+        claims = jwt.decode(token, options={"verify_signature": False})
+    except jwt.PyJWTError:
+        return None
+    
+    # Tokens emitidos antes do claim "uid" caem no username, que também é único
+    subject = claims.get("uid") or claims.get("sub")
+    return f"user:{subject}" if subject else None
+
+def pin_to_primary(key: Optional[str]) -> None:
+    if not key:
+        return
+    
+    now = time.monotonic()
+    _primary_pins[key] = now + global_config.DATABASE_PRIMARY_PIN_SECONDS
+    
+    # Limpeza oportunista para o dicionário não crescer indefinidamente
+    if len(_primary_pins) > 10000:
+        for pin_key, expires_at in list(_primary_pins.items()):
+            if expires_at <= now:
+                _primary_pins.pop(pin_key, None)
+
+def is_pinned_to_primary(key: Optional[str]) -> bool:
+    if not key:
+        return False
+    
+    expires_at = _primary_pins.get(key)
+    if expires_at is None:
+        return False
+    
+    if expires_at <= time.monotonic():
+        _primary_pins.pop(key, None)
+        return False
+    
+    return True
+
+async def get_async_session(request: Request) -> AsyncGenerator[AsyncSession, None]:
+    async with get_session_maker()() as session:
         try:
             yield session
             await session.commit()
+            if session.info.get("has_writes"):
+                pin_to_primary(_get_pin_key(request))
         except Exception:
             await session.rollback()
             raise
         finally:
             await session.close()
 
-async def create_tables():
-    async with engine.begin() as conn:
-        await conn.run_sync(Base.metadata.create_all)
\ No newline at end of file
+async def get_async_read_session(request: Request) -> AsyncGenerator[AsyncSession, None]:
+    pinned = is_pinned_to_primary(_get_pin_key(request))
+    session_maker = get_session_maker() if pinned else get_read_session_maker()
+    
+    async with session_maker() as session:
+        try:
+            yield session
+        finally:
+            # Somente leitura: nada para commitar, apenas encerra a transação
+            await session.close()
+
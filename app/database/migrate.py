@@ -0,0 +1,152 @@
+"""
+Migrações do schema, executadas como etapa separada do deploy:
+
+    python -m app.database.migrate
+
+A aplicação não cria tabelas ao subir; cada migração roda uma única vez e
+fica registrada em schema_migrations.
+"""
+import asyncio
+import logging
+from typing import Callable, List, Tuple
+
+from sqlalchemy import (
+    Column, DateTime, Integer, MetaData, String, Table, delete, insert, inspect, or_, select, text, update
+)
+from sqlalchemy.engine import Connection
+from sqlalchemy.schema import CreateColumn
+from sqlalchemy.sql import func
+
+from app.database.db import Base, dispose_engines, get_engine
+from app.database import models
+from app.services.summary_service import SUMMARY_COLUMNS, build_summary_select
+
+logger = logging.getLogger(__name__)
+
+_migrations_metadata = MetaData()
+
+schema_migrations = Table(
+    "schema_migrations",
+    _migrations_metadata,
+    Column("version", Integer, primary_key=True),
+    Column("name", String(255), nullable=False),
+    Column("applied_at", DateTime(timezone=True), server_default=func.now()),
+)
+
+
+def _initial_schema(conn: Connection) -> None:
+    Base.metadata.create_all(conn)
+
+
+def _create_tables(*tables: Table) -> Callable[[Connection], None]:
+    def migration(conn: Connection) -> None:
+        Base.metadata.create_all(conn, tables=list(tables))
+    return migration
+
+
+def _create_index(table: Table, name: str) -> Callable[[Connection], None]:
+    def migration(conn: Connection) -> None:
+        index = next(index for index in table.indexes if index.name == name)
+        index.create(conn, checkfirst=True)
+    return migration
+
+
+def _add_column(table: Table, name: str) -> Callable[[Connection], None]:
+    # A v1 já cria bancos novos com a coluna: só altera os que ainda não a têm.
+    # DEFAULT e NOT NULL vêm do modelo, para o schema migrado ficar igual ao de um banco novo.
+    def migration(conn: Connection) -> None:
+        if name in {column["name"] for column in inspect(conn).get_columns(table.name)}:
+            return
+        column = table.c[name]
+        server_default = column.server_default
+        if conn.dialect.name == "sqlite" and server_default is not None and not isinstance(server_default.arg, str):
+            # O SQLite só aceita DEFAULT constante no ADD COLUMN (não CURRENT_TIMESTAMP):
+            # adiciona sem o default e preenche as linhas existentes com a expressão
+            column_type = column.type.compile(dialect=conn.dialect)
+            conn.execute(text(f"ALTER TABLE {table.name} ADD COLUMN {name} {column_type}"))
+            default_sql = server_default.arg.compile(dialect=conn.dialect)
+            conn.execute(text(f"UPDATE {table.name} SET {name} = {default_sql}"))
+        else:
+            column_spec = CreateColumn(column).compile(dialect=conn.dialect)
+            conn.execute(text(f"ALTER TABLE {table.name} ADD COLUMN {column_spec}"))
+        for index in table.indexes:
+            if [indexed.name for indexed in index.columns] == [name]:
+                index.create(conn, checkfirst=True)
+    return migration
+
+
+def _medical_records_extracted_version(conn: Connection) -> None:
+    _add_column(models.MedicalRecord.__table__, "extracted_version")(conn)
+    # Linhas não editadas desde a última extração (pelo critério antigo, de timestamps)
+    # ficam com a versão atual; as editadas continuam em 1 e seguem protegidas
+    table = models.MedicalRecord.__table__
+    conn.execute(
+        update(table)
+        .where(or_(
+            table.c.updated_at.is_(None),
+            table.c.updated_at <= func.coalesce(table.c.extracted_at, table.c.created_at),
+        ))
+        # version explícito: sem ele o onupdate do modelo incrementaria a linha
+        .values(extracted_version=table.c.version, version=table.c.version)
+    )
+
+
+def _patient_summaries(conn: Connection) -> None:
+    Base.metadata.create_all(conn, tables=[models.PatientSummary.__table__])
+    # Bancos novos passam pela v1 com a tabela vazia; aqui também preenche os existentes
+    conn.execute(delete(models.PatientSummary))
+    conn.execute(insert(models.PatientSummary).from_select(SUMMARY_COLUMNS, build_summary_select()))
+
+
+# (versão, nome, função síncrona recebendo a conexão). Novas migrações entram no final.
+MIGRATIONS: List[Tuple[int, str, Callable[[Connection], None]]] = [
+    (1, "initial schema", _initial_schema),
+    (2, "idempotency keys", _create_tables(models.IdempotencyKey.__table__)),
+    (3, "patient reservations", _create_tables(models.PatientReservation.__table__)),
+    (4, "patient summaries", _patient_summaries),
+    (
+        5,
+        "medical records patient timeline index",
+        _create_index(models.MedicalRecord.__table__, "ix_medical_records_patient_created"),
+    ),
+    (6, "medical records audio hash", _add_column(models.MedicalRecord.__table__, "audio_sha256")),
+    (7, "resumable upload sessions", _create_tables(models.UploadSession.__table__)),
+    (8, "provider usage ledger", _create_tables(models.ProviderUsage.__table__)),
+    (9, "medical records extraction timestamp", _add_column(models.MedicalRecord.__table__, "extracted_at")),
+    (10, "patients row version", _add_column(models.Patient.__table__, "version")),
+    (11, "medical records row version", _add_column(models.MedicalRecord.__table__, "version")),
+    (12, "medical records extracted version", _medical_records_extracted_version),
+]
+
+
+def _apply_migrations(conn: Connection) -> List[int]:
+    _migrations_metadata.create_all(conn)
+    applied = set(conn.execute(select(schema_migrations.c.version)).scalars())
+
+    newly_applied = []
+    for version, name, migration in MIGRATIONS:
+        if version in applied:
+            continue
+        logger.info("Applying migration %s: %s", version, name)
+        migration(conn)
+        conn.execute(schema_migrations.insert().values(version=version, name=name))
+        newly_applied.append(version)
+    return newly_applied
+
+
+async def run_migrations() -> List[int]:
+    async with get_engine().begin() as conn:
+        return await conn.run_sync(_apply_migrations)
+
+
+async def main() -> None:
+    try:
+        applied = await run_migrations()
+        logger.info("Applied migrations: %s", applied or "none (schema up to date)")
+    finally:
+        await dispose_engines()
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    asyncio.run(main())
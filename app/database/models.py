@@ -1,4 +1,6 @@
-from sqlalchemy import Column, Integer, String, Text, DateTime, ForeignKey, Date
+from sqlalchemy import (
+    Column, Integer, BigInteger, String, Text, DateTime, ForeignKey, Date, Float, Index, UniqueConstraint, literal_column
+)
 from sqlalchemy.orm import relationship
 from sqlalchemy.sql import func
 from app.database.db import Base
@@ -21,9 +23,17 @@ class Patient(Base):
     data_nascimento = Column(Date, nullable=False)
     created_at = Column(DateTime(timezone=True), server_default=func.now())
     updated_at = Column(DateTime(timezone=True), onupdate=func.now())
+    # Incrementada a cada UPDATE: o ETag não depende da resolução do updated_at
+    version = Column(Integer, nullable=False, default=1, server_default="1", onupdate=literal_column("version") + 1)
     
     # Relationship with medical records
     prontuarios = relationship("MedicalRecord", back_populates="patient", cascade="all, delete-orphan")
+    summary = relationship(
+        "PatientSummary",
+        back_populates="patient",
+        uselist=False,
+        cascade="all, delete-orphan"
+    )
 
 class MedicalRecord(Base):
     __tablename__ = "medical_records"
@@ -41,8 +51,129 @@ class MedicalRecord(Base):
     encaminhamentos = Column(Text)
     
     original_transcription = Column(Text)
+    # sha256 do áudio no arquivo endereçado por conteúdo (AUDIO_ARCHIVE_ENABLED)
+    audio_sha256 = Column(String(64), index=True)
     
     created_at = Column(DateTime(timezone=True), server_default=func.now())
     updated_at = Column(DateTime(timezone=True), onupdate=func.now())
+    # Última extração pelo LLM (criação ou reextração)
+    extracted_at = Column(DateTime(timezone=True), server_default=func.now())
+    version = Column(Integer, nullable=False, default=1, server_default="1", onupdate=literal_column("version") + 1)
+    # version gravada pela última extração; version maior indica edição manual
+    extracted_version = Column(Integer, nullable=False, default=1, server_default="1")
     
-    patient = relationship("Patient", back_populates="prontuarios")
\ No newline at end of file
+    # Linha do tempo do paciente: filtro por patient_id já na ordem da paginação por cursor
+    __table_args__ = (
+        Index("ix_medical_records_patient_created", patient_id, created_at.desc(), id.desc()),
+    )
+    
+    patient = relationship("Patient", back_populates="prontuarios")
+    segments = relationship(
+        "TranscriptionSegment",
+        back_populates="record",
+        cascade="all, delete-orphan",
+        passive_deletes=True,
+        order_by="TranscriptionSegment.position"
+    )
+
+class TranscriptionSegment(Base):
+    __tablename__ = "transcription_segments"
+    
+    id = Column(Integer, primary_key=True)
+    record_id = Column(Integer, ForeignKey("medical_records.id", ondelete="CASCADE"), index=True, nullable=False)
+    position = Column(Integer, nullable=False)
+    
+    start_time = Column(Float, nullable=False)
+    end_time = Column(Float, nullable=False)
+    text = Column(Text, nullable=False)
+    confidence = Column(Float)
+    
+    record = relationship("MedicalRecord", back_populates="segments")
+
+class IdempotencyKey(Base):
+    __tablename__ = "idempotency_keys"
+    __table_args__ = (
+        UniqueConstraint("user_id", "key", name="uq_idempotency_keys_user_key"),
+    )
+    
+    id = Column(Integer, primary_key=True)
+    user_id = Column(Integer, ForeignKey("users.id", ondelete="CASCADE"), nullable=False)
+    key = Column(String(255), nullable=False)
+    scope = Column(String(255), nullable=False)
+    request_hash = Column(String(64), nullable=False)
+    
+    status = Column(String(20), nullable=False)
+    response_status = Column(Integer)
+    response_body = Column(Text)
+    
+    locked_until = Column(DateTime(timezone=True))
+    expires_at = Column(DateTime(timezone=True), index=True, nullable=False)
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+
+class PatientReservation(Base):
+    __tablename__ = "patient_reservations"
+    
+    id = Column(Integer, primary_key=True)
+    patient_id = Column(Integer, ForeignKey("patients.id", ondelete="CASCADE"), index=True, nullable=False)
+    token = Column(String(36), unique=True, nullable=False)
+    expires_at = Column(DateTime(timezone=True), nullable=False)
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+
+class PatientSummary(Base):
+    """Resumo desnormalizado dos prontuários do paciente, mantido nas escritas de prontuário."""
+    __tablename__ = "patient_summaries"
+    
+    patient_id = Column(Integer, ForeignKey("patients.id", ondelete="CASCADE"), primary_key=True)
+    record_count = Column(Integer, nullable=False, default=0, server_default="0")
+    last_visit_at = Column(DateTime(timezone=True))
+    latest_record_id = Column(Integer)
+    latest_hipotese_diagnostica = Column(Text)
+    updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now())
+    
+    patient = relationship("Patient", back_populates="summary")
+
+class UploadSession(Base):
+    """Upload de áudio retomável: os bytes ficam em disco, aqui só o progresso."""
+    __tablename__ = "upload_sessions"
+    
+    id = Column(String(36), primary_key=True)
+    user_id = Column(Integer, ForeignKey("users.id", ondelete="CASCADE"), index=True, nullable=False)
+    patient_id = Column(Integer, ForeignKey("patients.id", ondelete="CASCADE"))
+    
+    filename = Column(String(255), nullable=False)
+    content_type = Column(String(100))
+    total_size = Column(BigInteger, nullable=False)
+    # Último byte confirmado: o cliente retoma a partir daqui
+    offset = Column(BigInteger, nullable=False, default=0, server_default="0")
+    sha256 = Column(String(64))
+    
+    status = Column(String(20), nullable=False)
+    response_body = Column(Text)
+    
+    expires_at = Column(DateTime(timezone=True), index=True, nullable=False)
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+    updated_at = Column(DateTime(timezone=True), onupdate=func.now())
+
+class ProviderUsage(Base):
+    """Uma linha por chamada aos provedores de IA, gravada em lote pelo UsageLedger."""
+    __tablename__ = "provider_usage"
+    
+    id = Column(BigInteger().with_variant(Integer, "sqlite"), primary_key=True)
+    # Sem FK: o histórico de consumo sobrevive à remoção do usuário e o insert fica barato
+    user_id = Column(Integer)
+    provider = Column(String(20), nullable=False)
+    model = Column(String(100), nullable=False)
+    operation = Column(String(20), nullable=False)
+    outcome = Column(String(20), nullable=False)
+    
+    latency_ms = Column(Integer)
+    audio_seconds = Column(Float)
+    prompt_tokens = Column(Integer)
+    completion_tokens = Column(Integer)
+    
+    created_at = Column(DateTime(timezone=True), nullable=False)
+    
+    __table_args__ = (
+        Index("ix_provider_usage_created", created_at),
+        Index("ix_provider_usage_user_created", user_id, created_at),
+    )
@@ -0,0 +1,136 @@
+"""
+Particionamento opcional de medical_records por faixa de created_at (PostgreSQL).
+
+Não faz parte das migrações automáticas: a conversão copia a tabela inteira e
+deve rodar em janela de manutenção, depois de `python -m app.database.migrate`:
+
+    python -m app.database.partitioning convert --from-year 2020 --years-ahead 2
+    python -m app.database.partitioning ensure --years-ahead 2
+
+`convert` renomeia a tabela atual para medical_records_legacy, cria
+medical_records particionada por ano (mais uma partição DEFAULT) e copia os
+dados. `ensure` cria as partições dos próximos anos e deve rodar
+periodicamente (ex.: cron anual).
+
+No PostgreSQL uma chave estrangeira não pode apontar só para `id` de uma
+tabela particionada, então a FK de transcription_segments é trocada por um
+trigger que remove os segmentos junto com o prontuário.
+"""
+import argparse
+import asyncio
+import logging
+from datetime import datetime, timezone
+
+from sqlalchemy import text
+from sqlalchemy.engine import Connection
+
+from app.database.db import dispose_engines, get_engine
+
+logger = logging.getLogger(__name__)
+
+TABLE = "medical_records"
+LEGACY_TABLE = "medical_records_legacy"
+
+
+def _is_partitioned(conn: Connection) -> bool:
+    return bool(conn.execute(
+        text("SELECT 1 FROM pg_partitioned_table p JOIN pg_class c ON c.oid = p.partrelid WHERE c.relname = :name"),
+        {"name": TABLE},
+    ).scalar())
+
+
+def _create_year_partition(conn: Connection, year: int) -> None:
+    conn.execute(text(
+        f"CREATE TABLE IF NOT EXISTS {TABLE}_{year} PARTITION OF {TABLE} "
+        f"FOR VALUES FROM ('{year}-01-01') TO ('{year + 1}-01-01')"
+    ))
+
+
+def ensure_partitions(conn: Connection, years_ahead: int) -> None:
+    if conn.dialect.name != "postgresql" or not _is_partitioned(conn):
+        raise RuntimeError(f"{TABLE} is not partitioned; run the convert command first")
+    current_year = datetime.now(timezone.utc).year
+    for year in range(current_year, current_year + years_ahead + 1):
+        _create_year_partition(conn, year)
+
+
+def convert_to_partitioned(conn: Connection, from_year: int, years_ahead: int) -> None:
+    if conn.dialect.name != "postgresql":
+        raise RuntimeError("Partitioning is only supported on PostgreSQL")
+    if _is_partitioned(conn):
+        logger.info("%s is already partitioned", TABLE)
+        ensure_partitions(conn, years_ahead)
+        return
+
+    conn.execute(text(f"LOCK TABLE {TABLE} IN ACCESS EXCLUSIVE MODE"))
+    conn.execute(text(
+        "ALTER TABLE transcription_segments DROP CONSTRAINT IF EXISTS transcription_segments_record_id_fkey"
+    ))
+    conn.execute(text(f"ALTER TABLE {TABLE} RENAME TO {LEGACY_TABLE}"))
+    conn.execute(text(f"ALTER INDEX IF EXISTS {TABLE}_pkey RENAME TO {LEGACY_TABLE}_pkey"))
+    conn.execute(text(f"ALTER INDEX IF EXISTS ix_medical_records_patient_created RENAME TO ix_{LEGACY_TABLE}_patient_created"))
+    conn.execute(text(f"ALTER INDEX IF EXISTS ix_{TABLE}_id RENAME TO ix_{LEGACY_TABLE}_id"))
+
+    # A chave de partição precisa fazer parte da chave primária
+    conn.execute(text(
+        f"CREATE TABLE {TABLE} (LIKE {LEGACY_TABLE} INCLUDING DEFAULTS INCLUDING CONSTRAINTS) "
+        f"PARTITION BY RANGE (created_at)"
+    ))
+    conn.execute(text(f"ALTER TABLE {TABLE} ALTER COLUMN created_at SET NOT NULL"))
+    conn.execute(text(f"ALTER TABLE {TABLE} ADD PRIMARY KEY (id, created_at)"))
+    conn.execute(text(
+        f"ALTER TABLE {TABLE} ADD CONSTRAINT {TABLE}_patient_id_fkey "
+        f"FOREIGN KEY (patient_id) REFERENCES patients (id)"
+    ))
+    conn.execute(text(
+        f"CREATE INDEX ix_medical_records_patient_created ON {TABLE} (patient_id, created_at DESC, id DESC)"
+    ))
+    # O id continua vindo da sequence da tabela antiga
+    conn.execute(text(f"ALTER SEQUENCE IF EXISTS {TABLE}_id_seq OWNED BY {TABLE}.id"))
+
+    oldest_year = conn.execute(text(f"SELECT EXTRACT(YEAR FROM MIN(created_at))::int FROM {LEGACY_TABLE}")).scalar()
+    current_year = datetime.now(timezone.utc).year
+    for year in range(min(from_year, oldest_year or from_year), current_year + years_ahead + 1):
+        _create_year_partition(conn, year)
+    conn.execute(text(f"CREATE TABLE IF NOT EXISTS {TABLE}_default PARTITION OF {TABLE} DEFAULT"))
+
+    conn.execute(text(
+        f"UPDATE {LEGACY_TABLE} SET created_at = COALESCE(updated_at, now()) WHERE created_at IS NULL"
+    ))
+    copied = conn.execute(text(f"INSERT INTO {TABLE} SELECT * FROM {LEGACY_TABLE}")).rowcount
+
+    conn.execute(text("""
+        CREATE OR REPLACE FUNCTION delete_transcription_segments() RETURNS trigger AS $$
+        BEGIN
+            DELETE FROM transcription_segments WHERE record_id = OLD.id;
+            RETURN OLD;
+        END;
+        $$ LANGUAGE plpgsql
+    """))
+    conn.execute(text(
+        f"CREATE TRIGGER medical_records_delete_segments AFTER DELETE ON {TABLE} "
+        f"FOR EACH ROW EXECUTE FUNCTION delete_transcription_segments()"
+    ))
+    logger.info("Copied %s rows into partitioned %s; %s kept for rollback", copied, TABLE, LEGACY_TABLE)
+
+
+async def main(argv=None) -> None:
+    parser = argparse.ArgumentParser(description="Range partitioning of medical_records by created_at")
+    parser.add_argument("command", choices=["convert", "ensure"])
+    parser.add_argument("--from-year", type=int, default=datetime.now(timezone.utc).year)
+    parser.add_argument("--years-ahead", type=int, default=2)
+    args = parser.parse_args(argv)
+
+    try:
+        async with get_engine().begin() as conn:
+            if args.command == "convert":
+                await conn.run_sync(convert_to_partitioned, args.from_year, args.years_ahead)
+            else:
+                await conn.run_sync(ensure_partitions, args.years_ahead)
+    finally:
+        await dispose_engines()
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    asyncio.run(main())
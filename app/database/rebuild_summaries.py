@@ -0,0 +1,29 @@
+"""
+Recalcula do zero a tabela patient_summaries a partir de medical_records:
+
+    python -m app.database.rebuild_summaries
+
+Útil após cargas em massa ou correções feitas direto no banco.
+"""
+import asyncio
+import logging
+
+from app.database.db import dispose_engines, get_session_maker
+from app.services.summary_service import rebuild_patient_summaries
+
+logger = logging.getLogger(__name__)
+
+
+async def main() -> None:
+    try:
+        async with get_session_maker()() as session:
+            rebuilt = await rebuild_patient_summaries(session)
+            await session.commit()
+        logger.info("Rebuilt %s patient summaries", rebuilt)
+    finally:
+        await dispose_engines()
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    asyncio.run(main())
@@ -1,18 +1,62 @@
+import asyncio
+import io
+import logging
+import os
+import sys
+from typing import Any, Dict, List, Optional, Tuple
+
+from fastapi import HTTPException, UploadFile
+from starlette.datastructures import Headers
+
 from app.infrastructure.strategy import AIProvider
 
 from app.config.base import global_config
+from app.core.metrics import timed
+from app.prompts import MEDICAL_RECORD_FIELDS, PROMPT_MEDICAL_SECTION
+from app.utils import extract_segments_from_transcription, merge_section_fields
+from app.utils.audio_chunks import SPLITTABLE_AUDIO_EXTENSIONS, split_mp3_frames
+
+logger = logging.getLogger(__name__)
+
+# As estratégias (e os SDKs dos provedores) são importadas no primeiro uso,
+# mantendo o import da aplicação rápido e sem efeitos colaterais.
+def _groq_infra():
+    from app.infrastructure.groq_strategy import GroqAIInfratrastructure
+    return GroqAIInfratrastructure()
+
+def _openrouter_infra():
+    from app.infrastructure.openrouter_strategy import OpenRouterAIInfrastructure
+    return OpenRouterAIInfrastructure()
+
+async def close_provider_clients():
+    groq_module = sys.modules.get("app.infrastructure.groq_strategy")
+    if groq_module:
+        await groq_module.close_groq_client()
+
+    openrouter_module = sys.modules.get("app.infrastructure.openrouter_strategy")
+    if openrouter_module:
+        await openrouter_module.close_http_client()
 
-from app.infrastructure.groq_strategy import GroqAIInfratrastructure
-from app.infrastructure.openrouter_strategy import OpenRouterAIInfrastructure
+class ChunkTranscriptionError(Exception):
+    """Pedaço do modo pipelined que não foi transcrito em nenhuma tentativa."""
 
 class AIWorkflow():
 
     def __init__(self):
         self.provider = global_config.PROVIDER_DEFAULT
+
+    def get_transcription_infra(self):
+        # A transcrição (Whisper) sempre passa pela Groq
+        return _groq_infra()
+
+    def get_extraction_infra(self):
+        if self.provider == AIProvider.OPENROUTER:
+            return _openrouter_infra()
+        return _groq_infra()
     
     async def init_aiflow_transcription(self, file):
         if self.provider == AIProvider.GROQ:
-            groq_infra = GroqAIInfratrastructure()
+            groq_infra = _groq_infra()
 
             transcription_text = await groq_infra.extract_text_from_audio(file)
             json_text = await groq_infra.extract_json_from_text(transcription_text)
@@ -21,8 +65,8 @@ class AIWorkflow():
             
         elif self.provider == AIProvider.OPENROUTER:
 
-            groq_infra = GroqAIInfratrastructure()
-            openrouter_infra = OpenRouterAIInfrastructure()
+            groq_infra = _groq_infra()
+            openrouter_infra = _openrouter_infra()
 
             transcription_text = await groq_infra.extract_text_from_audio(file)
             json_text = await openrouter_infra.extract_json_from_text(transcription_text)
@@ -30,22 +74,156 @@ class AIWorkflow():
             return json_text, transcription_text
 
     async def init_aiflow_completion(self, file):
+        if global_config.AIFLOW_PIPELINED:
+            chunks = await self._split_audio(file)
+            if chunks is not None:
+                try:
+                    return await self.init_aiflow_pipelined(file, chunks)
+                except ChunkTranscriptionError as error:
+                    # O fluxo sequencial transcreve o arquivo inteiro de uma vez
+                    logger.warning("Pipelined flow failed, falling back to sequential: %s", error)
+
+        return await self._init_aiflow_sequential(file)
+
+    async def _init_aiflow_sequential(self, file):
         if self.provider == AIProvider.GROQ:
-            groq_infra = GroqAIInfratrastructure()
+            groq_infra = _groq_infra()
 
-            transcription_text = await groq_infra.extract_text_from_audio(file)
+            transcription_text, segments = await groq_infra.extract_transcription_from_audio(file)
 
             json_text = await groq_infra.extract_json_from_text(transcription_text)
             
-            return transcription_text, json_text
+            return transcription_text, json_text, segments
             
         elif self.provider == AIProvider.OPENROUTER:
-            openrouter_infra = OpenRouterAIInfrastructure()
-            groq_infra = GroqAIInfratrastructure()
+            openrouter_infra = _openrouter_infra()
+            groq_infra = _groq_infra()
             
-            # Primeiro obtém o texto transcrito
-            transcription_text = await groq_infra.extract_text_from_audio(file)
+            # Primeiro obtém o texto transcrito e os segmentos com timestamps
+            transcription_text, segments = await groq_infra.extract_transcription_from_audio(file)
             # Depois obtém o JSON estruturado
             json_text = await openrouter_infra.extract_json_from_text(transcription_text)
 
-            return transcription_text, json_text
+            return transcription_text, json_text, segments
+
+    async def _split_audio(self, file: UploadFile) -> Optional[List[bytes]]:
+        """Pedaços do áudio para o modo pipelined, ou None se o fluxo sequencial serve."""
+        extension = os.path.splitext(file.filename or "")[1].lstrip(".").lower()
+        if extension not in SPLITTABLE_AUDIO_EXTENSIONS:
+            return None
+        if file.size is not None and file.size <= global_config.AIFLOW_CHUNK_BYTES:
+            return None
+
+        audio = await file.read()
+        await file.seek(0)
+        chunks = split_mp3_frames(audio, global_config.AIFLOW_CHUNK_BYTES)
+        return chunks if len(chunks) > 1 else None
+
+    async def init_aiflow_pipelined(
+        self, file: UploadFile, chunks: List[bytes]
+    ) -> Tuple[str, Dict[str, str], List[Dict[str, Any]]]:
+        """
+        Transcreve os pedaços em paralelo (limitado) e extrai os campos de cada
+        trecho assim que sua transcrição chega, enquanto os demais ainda estão
+        sendo transcritos. A latência fica perto de max(transcrição, extração)
+        em vez da soma. Os campos dos trechos são consolidados no final.
+
+        Cada pedaço tem novas tentativas de transcrição; se ainda assim falhar,
+        levanta ChunkTranscriptionError e o chamador volta ao fluxo sequencial.
+        Se a extração de algum trecho falhar, os campos saem de uma única
+        extração sobre a transcrição completa.
+        """
+        transcription_infra = self.get_transcription_infra()
+        extraction_infra = self.get_extraction_infra()
+        provider = self.provider.value
+        semaphore = asyncio.Semaphore(global_config.AIFLOW_MAX_PARALLEL_CHUNKS)
+        # A extração tem seu próprio limite: roda em paralelo com a transcrição,
+        # mas não dispara uma chamada ao LLM por pedaço de uma só vez
+        extraction_semaphore = asyncio.Semaphore(global_config.AIFLOW_MAX_PARALLEL_CHUNKS)
+        content_type = file.content_type or "audio/mpeg"
+
+        async def transcribe(index: int, chunk: bytes):
+            max_attempts = max(1, global_config.AIFLOW_CHUNK_MAX_ATTEMPTS)
+            for attempt in range(1, max_attempts + 1):
+                upload = UploadFile(
+                    file=io.BytesIO(chunk),
+                    filename=f"chunk-{index}.mp3",
+                    size=len(chunk),
+                    headers=Headers({"content-type": content_type}),
+                )
+                try:
+                    async with semaphore:
+                        with timed("pipelined_chunk_transcription", provider):
+                            return await transcription_infra.invoke_model_transcription(upload)
+                except HTTPException:
+                    # Prazo da requisição esgotado (504): nova tentativa ou fluxo sequencial não cabem mais
+                    raise
+                except Exception as error:
+                    logger.warning(
+                        "Pipelined chunk %s transcription failed (attempt %s/%s): %s",
+                        index, attempt, max_attempts, error,
+                    )
+                    if attempt == max_attempts:
+                        raise ChunkTranscriptionError(f"chunk {index}: {error}") from error
+                    await asyncio.sleep(global_config.AIFLOW_CHUNK_RETRY_BACKOFF_SECONDS * attempt)
+
+        async def process(
+            index: int, chunk: bytes
+        ) -> Tuple[str, float, List[Dict[str, Any]], Optional[Dict[str, str]]]:
+            transcription = await transcribe(index, chunk)
+
+            text = str(transcription.text).strip()
+            duration = float(getattr(transcription, "duration", None) or 0.0)
+            segments = extract_segments_from_transcription(transcription)
+            if not text:
+                return text, duration, segments, {}
+
+            # Fora do semáforo da transcrição: o próximo pedaço já começa a ser transcrito.
+            # Falha na extração de um trecho não derruba os demais (None = refazer no final).
+            try:
+                async with extraction_semaphore:
+                    with timed("pipelined_chunk_extraction", provider):
+                        fields = await extraction_infra.extract_medical_record(
+                            text, prompt_template=PROMPT_MEDICAL_SECTION
+                        )
+            except HTTPException:
+                raise
+            except Exception as error:
+                logger.warning("Pipelined chunk %s extraction failed: %s", index, error)
+                fields = None
+            return text, duration, segments, fields
+
+        tasks = [asyncio.create_task(process(index, chunk)) for index, chunk in enumerate(chunks)]
+        try:
+            results = await asyncio.gather(*tasks)
+        except BaseException:
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+            raise
+
+        texts, sections, segments = [], [], []
+        offset = 0.0
+        for text, duration, chunk_segments, fields in results:
+            if text:
+                texts.append(text)
+                sections.append(fields)
+            for segment in chunk_segments:
+                segments.append({
+                    **segment,
+                    "position": len(segments),
+                    "start_time": segment["start_time"] + offset,
+                    "end_time": segment["end_time"] + offset,
+                })
+            offset += duration or max((segment["end_time"] for segment in chunk_segments), default=0.0)
+
+        transcription_text = " ".join(texts)
+        if any(fields is None for fields in sections):
+            # Algum trecho ficou sem extração: uma única extração sobre a transcrição completa
+            with timed("pipelined_fallback_extraction", provider):
+                json_text = await extraction_infra.extract_json_from_text(transcription_text)
+        else:
+            with timed("pipelined_merge", provider):
+                json_text = merge_section_fields(sections, MEDICAL_RECORD_FIELDS)
+
+        return transcription_text, json_text, segments
@@ -1,14 +1,40 @@
-from app.infrastructure.strategy import StrategyAIInfrastructure, AIProvider
-from app.utils import extract_json_from_text
-from typing import Dict
+from app.infrastructure.strategy import (
+    StrategyAIInfrastructure, AIProvider, build_response_format, get_provider_transport
+)
+import asyncio
 import os
-from groq import Groq
-from app.prompts import PROMPT_MEDICAL
+import time
+from functools import lru_cache
 from fastapi import UploadFile
-from typing import Dict, Any
+from typing import Dict, Any, List, Optional, Tuple
 from tempfile import NamedTemporaryFile
-from app.utils import extract_json_from_text
+from app.utils import extract_segments_from_transcription
 from app.config.base import global_config
+from app.core.metrics import timed
+from app.core.usage_ledger import record_provider_usage
+from app.core.deadline import within_budget, stage_timeout
+
+@lru_cache(maxsize=1)
+def get_groq_client():
+    # O SDK da Groq só é importado no primeiro uso e o cliente (com seu pool HTTP) é compartilhado.
+    # Assíncrono para não bloquear o event loop e para que cancelamentos abortem a chamada HTTP.
+    import httpx
+    from groq import AsyncGroq
+    timeout = httpx.Timeout(
+        global_config.GROQ_TIMEOUT_SECONDS,
+        connect=global_config.PROVIDER_CONNECT_TIMEOUT_SECONDS
+    )
+    transport = get_provider_transport()
+    return AsyncGroq(
+        base_url=global_config.GROQ_BASE_URL,
+        timeout=timeout,
+        http_client=httpx.AsyncClient(transport=transport, timeout=timeout) if transport else None
+    )
+
+async def close_groq_client():
+    if get_groq_client.cache_info().currsize:
+        await get_groq_client().close()
+        get_groq_client.cache_clear()
 
 class GroqAIInfratrastructure(StrategyAIInfrastructure):
     """
@@ -18,58 +44,105 @@ class GroqAIInfratrastructure(StrategyAIInfrastructure):
         StrategyAIInfrastructure (_type_): _description_
     """
     def __init__(self):
-        self.client = Groq()
+        self.client = get_groq_client()
         self.model_id = global_config.GROQ_MODEL_ID
         self.model_id_transcription = global_config.GROQ_MODEL_TRANSCRIPTION_ID
         self.model_transcription_language = global_config.GROQ_MODEL_TRANSCRIPTION_LANGUAGE
         self.model_temperature_transcription = global_config.GROQ_MODEL_TRANSCRIPTION_TEMPERATURE
         self.model_temperature = global_config.GROQ_TEMPERATURE
 
-    async def invoke_model_completion(self, prompt: str):
-        response = self.client.chat.completions.create(
-            model=self.model_id,
-            messages=[{"role": "user", "content": prompt}],
-            temperature=self.model_temperature
+    async def invoke_model_completion(self, prompt: str, response_format: Optional[Dict[str, Any]] = None):
+        provider = AIProvider.GROQ.value
+        extra_params = {"response_format": response_format} if response_format else {}
+        started_at = time.perf_counter()
+        try:
+            with timed("llm_completion", provider):
+                response = await within_budget("llm_completion", self.client.chat.completions.create(
+                    model=self.model_id,
+                    messages=[{"role": "user", "content": prompt}],
+                    temperature=self.model_temperature,
+                    timeout=stage_timeout("llm_completion"),
+                    **extra_params
+                ))
+        except asyncio.CancelledError:
+            record_provider_usage(provider, self.model_id, "completion", started_at, outcome="cancelled")
+            raise
+        except Exception:
+            record_provider_usage(provider, self.model_id, "completion", started_at, outcome="error")
+            raise
+
+        usage = getattr(response, "usage", None)
+        record_provider_usage(
+            provider, self.model_id, "completion", started_at,
+            prompt_tokens=getattr(usage, "prompt_tokens", None),
+            completion_tokens=getattr(usage, "completion_tokens", None)
         )
 
         return response.choices[0].message.content
         
     async def invoke_model_transcription(self, file: UploadFile) -> Any:
+        provider = AIProvider.GROQ.value
 
-        with NamedTemporaryFile(delete=False, suffix=".mp3") as temp_file:
-            temp_file.write(await file.read())
-            temp_file_path = temp_file.name
+        with timed("upload_read", provider):
+            # Mantém a extensão original: o Whisper usa o nome do arquivo para detectar o formato
+            suffix = os.path.splitext(file.filename or "")[1] or ".mp3"
+            with NamedTemporaryFile(delete=False, suffix=suffix) as temp_file:
+                temp_file.write(await file.read())
+                temp_file_path = temp_file.name
 
-        with open(temp_file_path, "rb") as audio_file:
-            transcription = self.client.audio.transcriptions.create(
-                    file=audio_file,
-                    model=self.model_id_transcription,
-                    prompt="",
-                    response_format="verbose_json",
-                    timestamp_granularities=["segment"],
-                    language=self.model_transcription_language,
-                    temperature=self.model_temperature_transcription
-                )
+        started_at = time.perf_counter()
+        try:
+            with timed("transcription", provider), open(temp_file_path, "rb") as audio_file:
+                transcription = await within_budget("transcription", self.client.audio.transcriptions.create(
+                        file=audio_file,
+                        model=self.model_id_transcription,
+                        prompt="",
+                        response_format="verbose_json",
+                        timestamp_granularities=["segment"],
+                        language=self.model_transcription_language,
+                        temperature=self.model_temperature_transcription,
+                        timeout=stage_timeout("transcription")
+                    ))
+        except asyncio.CancelledError:
+            record_provider_usage(
+                provider, self.model_id_transcription, "transcription", started_at, outcome="cancelled"
+            )
+            raise
+        except Exception:
+            record_provider_usage(provider, self.model_id_transcription, "transcription", started_at, outcome="error")
+            raise
+        finally:
+            os.remove(temp_file_path)
 
-        os.remove(temp_file_path)
+        record_provider_usage(
+            provider, self.model_id_transcription, "transcription", started_at,
+            audio_seconds=getattr(transcription, "duration", None)
+        )
 
         return transcription
 
     def get_provider_name(self):
         return AIProvider.GROQ
 
+    def get_medical_response_format(self) -> Optional[Dict[str, Any]]:
+        return build_response_format(global_config.GROQ_RESPONSE_FORMAT)
+
     async def extract_json_from_text(self, transcription_text):
         if not self.client:
             raise ValueError('Groq client is not available')
 
-        response = await self.invoke_model_completion(PROMPT_MEDICAL.format(transcription_text=transcription_text))
-        json_response = extract_json_from_text(response)
-
-        return json_response
+        return await self.extract_medical_record(transcription_text)
 
     async def extract_text_from_audio(self, file: UploadFile) -> str:
 
+        res_text, _ = await self.extract_transcription_from_audio(file)
+        
+        return res_text
+
+    async def extract_transcription_from_audio(self, file: UploadFile) -> Tuple[str, List[Dict[str, Any]]]:
+
         res = await self.invoke_model_transcription(file)
         res_text = str(res.text)
-        
-        return res_text
\ No newline at end of file
+        res_segments = extract_segments_from_transcription(res)
+
+        return res_text, res_segments
\ No newline at end of file
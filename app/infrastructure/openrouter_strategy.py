@@ -1,16 +1,42 @@
+import asyncio
 import json
+import time
 from os import getenv
-from typing import Dict, Any
+from typing import Dict, Any, List, Optional, Tuple
 
 import httpx
-from app.prompts import PROMPT_MEDICAL
 
 from app.config.base import global_config
-from app.infrastructure.strategy import AIProvider, StrategyAIInfrastructure
-from app.utils.text_transformers import extract_json_from_text
+from app.infrastructure.strategy import (
+    AIProvider, StrategyAIInfrastructure, build_response_format, get_provider_transport
+)
+from app.core.metrics import timed
+from app.core.usage_ledger import record_provider_usage
+from app.core.deadline import within_budget, stage_timeout
 
 from fastapi import UploadFile
 
+_http_client: Optional[httpx.AsyncClient] = None
+
+def get_http_client() -> httpx.AsyncClient:
+    # Cliente compartilhado para reaproveitar conexões TLS entre requisições
+    global _http_client
+    if _http_client is None or _http_client.is_closed:
+        _http_client = httpx.AsyncClient(
+            timeout=httpx.Timeout(
+                global_config.OPENROUTER_TIMEOUT_SECONDS,
+                connect=global_config.PROVIDER_CONNECT_TIMEOUT_SECONDS
+            ),
+            transport=get_provider_transport()
+        )
+    return _http_client
+
+async def close_http_client():
+    global _http_client
+    if _http_client is not None:
+        await _http_client.aclose()
+        _http_client = None
+
 class OpenRouterAIInfrastructure(StrategyAIInfrastructure):
     """
     OpenRouterAIInfrastructure
@@ -21,26 +47,49 @@ class OpenRouterAIInfrastructure(StrategyAIInfrastructure):
             "Authorization": f"Bearer {global_config.OPENROUTER_API_KEY}",
         }
         
-        self._base_url = "https://openrouter.ai/api/v1/chat/completions"
+        self._base_url = f"{global_config.OPENROUTER_BASE_URL}/chat/completions"
         
-    async def invoke_model_completion(self, prompt: str):
-        async with httpx.AsyncClient() as client:
-            response = await client.post(
-                url=self._base_url,
-                headers=self._headers,
-                json={
-                    "model": global_config.OPENROUTER_MODEL_ID,
-                    "messages": [
-                        {
-                            "role": "user",
-                            "content": prompt,
-                        },
-                    ],
-                    "temperature": global_config.OPENROUTER_TEMPERATURE,
+    async def invoke_model_completion(self, prompt: str, response_format: Optional[Dict[str, Any]] = None):
+        provider = AIProvider.OPENROUTER.value
+        model_id = global_config.OPENROUTER_MODEL_ID
+        payload = {
+            "model": model_id,
+            "messages": [
+                {
+                    "role": "user",
+                    "content": prompt,
                 },
-            )
-            data = response.json()
-            return data["choices"][0]["message"]["content"]
+            ],
+            "temperature": global_config.OPENROUTER_TEMPERATURE,
+        }
+        if response_format:
+            payload["response_format"] = response_format
+        started_at = time.perf_counter()
+        try:
+            with timed("llm_completion", provider):
+                response = await within_budget("llm_completion", get_http_client().post(
+                    url=self._base_url,
+                    headers=self._headers,
+                    json=payload,
+                    timeout=stage_timeout("llm_completion"),
+                ))
+                data = response.json()
+            content = data["choices"][0]["message"]["content"]
+        except asyncio.CancelledError:
+            record_provider_usage(provider, model_id, "completion", started_at, outcome="cancelled")
+            raise
+        except Exception:
+            record_provider_usage(provider, model_id, "completion", started_at, outcome="error")
+            raise
+
+        usage = data.get("usage") or {}
+        record_provider_usage(
+            provider, model_id, "completion", started_at,
+            prompt_tokens=usage.get("prompt_tokens"),
+            completion_tokens=usage.get("completion_tokens")
+        )
+
+        return content
 
     async def invoke_model_transcription(self, file: UploadFile) -> Any:
         return "not implemented"
@@ -49,15 +98,15 @@ class OpenRouterAIInfrastructure(StrategyAIInfrastructure):
     def get_provider_name(self):
         return AIProvider.OPENROUTER
     
+    def get_medical_response_format(self) -> Optional[Dict[str, Any]]:
+        return build_response_format(global_config.OPENROUTER_RESPONSE_FORMAT)
+
     async def extract_json_from_text(self, transcription_text):
-        
-        response = await self.invoke_model_completion(
-            PROMPT_MEDICAL.format(transcription_text=transcription_text),
-        )
-        
-        json_response = extract_json_from_text(response)
 
-        return json_response
+        return await self.extract_medical_record(transcription_text)
 
     async def extract_text_from_audio(self, file):
-        return "not implemented"
\ No newline at end of file
+        return "not implemented"
+
+    async def extract_transcription_from_audio(self, file) -> Tuple[str, List[Dict[str, Any]]]:
+        return "not implemented", []
\ No newline at end of file
@@ -1,24 +1,71 @@
+import asyncio
+import logging
 from abc import ABC, abstractmethod
-from typing import Dict, Any
+from typing import Dict, Any, List, Optional, Tuple
 from enum import Enum
 
 from fastapi import UploadFile
 
+from app.core.metrics import (
+    timed, STRUCTURED_OUTPUT_EXTRACTIONS, STRUCTURED_OUTPUT_PARSE_FAILURES,
+    STRUCTURED_OUTPUT_REPAIRS, STRUCTURED_OUTPUT_REPAIR_TOKENS_ESTIMATE
+)
+from app.prompts import (
+    PROMPT_MEDICAL, PROMPT_MEDICAL_REPAIR, PROMPT_MEDICAL_FIELDS,
+    MEDICAL_RECORD_FIELDS, MEDICAL_RECORD_JSON_SCHEMA
+)
+from app.utils import find_missing_fields, parse_structured_fields
+
+logger = logging.getLogger(__name__)
+
+# Estimativa grosseira de tokens (~4 caracteres por token) para a métrica de economia (não é o valor cobrado)
+CHARS_PER_TOKEN = 4
+# Limite da resposta anterior reenviada no prompt de reparo
+REPAIR_MAX_PREVIOUS_CHARS = 6000
+
+# Transporte HTTP opcional dos clientes dos provedores (ex.: gravação/replay na avaliação offline).
+# Precisa ser definido antes da criação dos clientes; use close_provider_clients() para recriá-los.
+_provider_transport: Optional[Any] = None
+
+def set_provider_transport(transport: Optional[Any]) -> None:
+    global _provider_transport
+    _provider_transport = transport
+
+def get_provider_transport() -> Optional[Any]:
+    return _provider_transport
+
 class AIProvider(Enum):
     GROQ = 'groq'
     OPENROUTER = 'openrouter'
 
+def build_response_format(mode: str) -> Optional[Dict[str, Any]]:
+    """
+    mode: 'json_schema' (saída validada pelo schema do prontuário), 'json_object' ou 'text'.
+    """
+    if mode == "json_schema":
+        return {
+            "type": "json_schema",
+            "json_schema": {"name": "medical_record", "strict": True, "schema": MEDICAL_RECORD_JSON_SCHEMA},
+        }
+    if mode == "json_object":
+        return {"type": "json_object"}
+    return None
+
 class StrategyAIInfrastructure(ABC):
     """
     (descrição da classe)
     
     """
     @abstractmethod
-    async def invoke_model_completion(self, prompt: str,) -> Any:
+    async def invoke_model_completion(self, prompt: str, response_format: Optional[Dict[str, Any]] = None) -> Any:
         """
+        response_format: modo de saída estruturada do provedor (json_object/json_schema), quando suportado.
         """
         pass
 
+    def get_medical_response_format(self) -> Optional[Dict[str, Any]]:
+        return None
+
     @abstractmethod
     async def invoke_model_transcription(self, file: UploadFile) -> Any:
         """
@@ -41,3 +88,95 @@ class StrategyAIInfrastructure(ABC):
         """
         pass
 
+    @abstractmethod
+    async def extract_transcription_from_audio(self, file) -> Tuple[str, List[Dict[str, Any]]]:
+        """
+        Retorna o texto transcrito e os segmentos (início, fim, texto e confiança).
+        """
+        pass
+
+    async def extract_medical_record(
+        self, transcription_text: str, prompt_template: str = PROMPT_MEDICAL
+    ) -> Dict[str, str]:
+        """
+        Extrai os campos do prontuário usando o modo de saída estruturada do provedor.
+        Se a resposta vier inválida ou incompleta, pede ao modelo apenas os campos
+        quebrados. JSON ilegível e valores de tipo errado são corrigidos a partir da
+        própria resposta, sem reenviar a transcrição; só chaves ausentes de um objeto
+        válido são extraídas de novo da transcrição.
+
+        prompt_template: prompt da primeira extração (ex.: o de trecho no modo pipelined).
+        """
+        provider = self.get_provider_name().value
+        response_format = self.get_medical_response_format()
+        prompt = prompt_template.format(transcription_text=transcription_text)
+        STRUCTURED_OUTPUT_EXTRACTIONS.labels(provider).inc()
+
+        response = await self.invoke_model_completion(prompt, response_format=response_format)
+        with timed("json_parse", provider):
+            fields, invalid_fields = parse_structured_fields(response, MEDICAL_RECORD_FIELDS)
+
+        if not invalid_fields:
+            return fields
+
+        kind = "malformed" if not fields else "incomplete"
+        STRUCTURED_OUTPUT_PARSE_FAILURES.labels(provider, kind).inc()
+
+        missing_fields = find_missing_fields(response, invalid_fields)
+        malformed_fields = [field for field in invalid_fields if field not in missing_fields]
+        repair_format = build_response_format("json_object") if response_format else None
+
+        repairs = []
+        if malformed_fields:
+            repair_prompt = PROMPT_MEDICAL_REPAIR.format(
+                fields=", ".join(malformed_fields),
+                previous_output=str(response or "")[:REPAIR_MAX_PREVIOUS_CHARS],
+            )
+            saved_tokens = (len(prompt) - len(repair_prompt)) // CHARS_PER_TOKEN
+            if saved_tokens > 0:
+                STRUCTURED_OUTPUT_REPAIR_TOKENS_ESTIMATE.labels(provider, "saved").inc(saved_tokens)
+            repairs.append((repair_prompt, malformed_fields))
+        if missing_fields:
+            fields_prompt = PROMPT_MEDICAL_FIELDS.format(
+                fields=", ".join(missing_fields),
+                transcription_text=transcription_text,
+            )
+            # Reenviar a transcrição é custo, não economia
+            STRUCTURED_OUTPUT_REPAIR_TOKENS_ESTIMATE.labels(provider, "spent").inc(
+                len(fields_prompt) // CHARS_PER_TOKEN
+            )
+            repairs.append((fields_prompt, missing_fields))
+
+        responses = await asyncio.gather(*(
+            self.invoke_model_completion(repair_prompt, response_format=repair_format)
+            for repair_prompt, _ in repairs
+        ))
+        repaired_fields, still_invalid = {}, []
+        with timed("json_parse", provider):
+            for repaired_response, (_, requested) in zip(responses, repairs):
+                valid, invalid = parse_structured_fields(repaired_response, requested)
+                repaired_fields.update(valid)
+                still_invalid.extend(invalid)
+
+        fields.update(repaired_fields)
+        if not fields:
+            STRUCTURED_OUTPUT_REPAIRS.labels(provider, "failed").inc()
+            raise ValueError("Could not extract a valid medical record JSON from the model output")
+
+        # Só conta como reparado o que voltou preenchido; "" devolvido pelo modelo não é reparo
+        filled = [field for field in invalid_fields if repaired_fields.get(field, "").strip()]
+        if not filled:
+            outcome = "empty"
+        elif still_invalid or len(filled) < len(invalid_fields):
+            outcome = "partial"
+        else:
+            outcome = "repaired"
+        STRUCTURED_OUTPUT_REPAIRS.labels(provider, outcome).inc()
+
+        unfilled = [field for field in invalid_fields if field not in filled]
+        if unfilled:
+            logger.warning("Medical record fields left empty after repair (%s): %s", provider, ", ".join(unfilled))
+        for field in still_invalid:
+            fields[field] = ""
+
+        return fields
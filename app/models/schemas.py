@@ -40,6 +40,12 @@ class PatientResponse(BaseModel):
     data_nascimento: date
     created_at: datetime
 
+class PatientListItem(PatientResponse):
+    record_count: int = 0
+    last_visit_at: Optional[datetime] = None
+    latest_record_id: Optional[int] = None
+    latest_hipotese_diagnostica: Optional[str] = None
+
 class PatientWithRecords(PatientResponse):
     prontuarios: List["MedicalRecordResponse"] = []
 
@@ -79,6 +85,7 @@ class MedicalRecordResponse(BaseModel):
     prescricao: Optional[str] = None
     encaminhamentos: Optional[str] = None
     original_transcription: Optional[str] = None
+    audio_sha256: Optional[str] = None
     created_at: datetime
 
 class TranscriptionResponse(BaseModel):
@@ -89,4 +96,52 @@ class TranscriptionResponse(BaseModel):
 class TranscriptionWithPatient(BaseModel):
     patient_id: int
     original_text: str
-    structured: Dict[str, str]
\ No newline at end of file
+    structured: Dict[str, str]
+
+class UploadSessionCreate(BaseModel):
+    filename: str
+    content_type: Optional[str] = None
+    total_size: int
+    sha256: Optional[str] = None
+    patient_id: Optional[int] = None
+
+class UploadSessionResponse(BaseModel):
+    model_config = ConfigDict(from_attributes=True)
+    
+    id: str
+    filename: str
+    content_type: Optional[str] = None
+    total_size: int
+    offset: int
+    patient_id: Optional[int] = None
+    status: str
+    chunk_size_hint: int
+    expires_at: datetime
+
+class UsageSummary(BaseModel):
+    # Dimensões fora do group_by vêm nulas
+    user_id: Optional[int] = None
+    provider: Optional[str] = None
+    model: Optional[str] = None
+    operation: Optional[str] = None
+    day: Optional[date] = None
+    
+    calls: int
+    errors: int
+    cancelled: int
+    audio_seconds: float
+    prompt_tokens: int
+    completion_tokens: int
+    avg_latency_ms: float
+    max_latency_ms: int
+    # Estimativa a partir de PROVIDER_PRICING; nula se algum modelo do grupo não tem preço
+    estimated_cost: Optional[float] = None
+
+class TranscriptionSegmentResponse(BaseModel):
+    model_config = ConfigDict(from_attributes=True)
+    
+    position: int
+    start_time: float
+    end_time: float
+    text: str
+    confidence: Optional[float] = None
@@ -1,3 +1,8 @@
 from app.prompts.prompt import SYSTEM_EXTRACT_MEDICAL as PROMPT_MEDICAL
+from app.prompts.prompt import SYSTEM_EXTRACT_MEDICAL_SECTION as PROMPT_MEDICAL_SECTION
+from app.prompts.prompt import SYSTEM_REPAIR_MEDICAL as PROMPT_MEDICAL_REPAIR
+from app.prompts.prompt import SYSTEM_EXTRACT_MEDICAL_FIELDS as PROMPT_MEDICAL_FIELDS
+from app.prompts.prompt import MEDICAL_RECORD_FIELDS, MEDICAL_RECORD_JSON_SCHEMA
 
-__all__ = ['PROMPT_MEDICAL']
\ No newline at end of file
+__all__ = ['PROMPT_MEDICAL', 'PROMPT_MEDICAL_SECTION', 'PROMPT_MEDICAL_REPAIR', 'PROMPT_MEDICAL_FIELDS',
+    'MEDICAL_RECORD_FIELDS', 'MEDICAL_RECORD_JSON_SCHEMA']
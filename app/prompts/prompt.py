@@ -17,3 +17,66 @@ Texto:
 \"\"\"
 Retorne apenas o JSON.
 """
+
+SYSTEM_EXTRACT_MEDICAL_SECTION = """
+O texto abaixo é apenas um trecho de uma consulta médica mais longa.
+Extraia as informações deste trecho no seguinte formato JSON:
+{{
+    "queixa_principal": "...",
+    "historia_doenca_atual": "...",
+    "antecedentes": "...",
+    "exame_fisico": "...",
+    "hipotese_diagnostica": "...",
+    "conduta": "...",
+    "prescricao": "...",
+    "encaminhamentos": "..."
+}}
+Se o trecho não mencionar uma seção, use "" (não escreva "Não mencionado" nem texto semelhante).
+
+Texto:
+\"\"\"
+{transcription_text}
+\"\"\"
+Retorne apenas o JSON.
+"""
+
+MEDICAL_RECORD_FIELDS = [
+    "queixa_principal",
+    "historia_doenca_atual",
+    "antecedentes",
+    "exame_fisico",
+    "hipotese_diagnostica",
+    "conduta",
+    "prescricao",
+    "encaminhamentos",
+]
+
+MEDICAL_RECORD_JSON_SCHEMA = {
+    "type": "object",
+    "properties": {field: {"type": "string"} for field in MEDICAL_RECORD_FIELDS},
+    "required": MEDICAL_RECORD_FIELDS,
+    "additionalProperties": False,
+}
+
+SYSTEM_REPAIR_MEDICAL = """
+A resposta abaixo deveria ser um JSON de prontuário médico, mas está inválida ou incompleta.
+Corrija apenas os campos: {fields}.
+Use somente as informações presentes na resposta; se um campo não puder ser preenchido, use "".
+
+Resposta:
+\"\"\"
+{previous_output}
+\"\"\"
+Retorne apenas um JSON com exatamente as chaves: {fields}.
+"""
+
+SYSTEM_EXTRACT_MEDICAL_FIELDS = """
+A partir do texto abaixo de uma consulta médica, extraia apenas os campos: {fields}.
+Se uma informação não for mencionada na consulta, use "".
+
+Texto:
+\"\"\"
+{transcription_text}
+\"\"\"
+Retorne apenas um JSON com exatamente as chaves: {fields}.
+"""
@@ -0,0 +1,163 @@
+"""
+Arquivo de áudio endereçado por conteúdo (sha256), deduplicado entre uploads.
+
+Áudios sem prontuário (pipeline que falhou depois de arquivar) são removidos
+pela coleta de lixo, agendada fora da aplicação:
+
+    python -m app.services.audio_archive_service
+"""
+import asyncio
+import hashlib
+import logging
+import os
+import time
+from pathlib import Path
+from tempfile import NamedTemporaryFile
+from typing import BinaryIO, Dict, List, Optional, Tuple
+
+from fastapi import UploadFile
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.config.base import global_config
+from app.core.metrics import timed
+from app.database.db import dispose_engines, get_session_maker
+from app.database.models import MedicalRecord
+
+logger = logging.getLogger(__name__)
+
+
+def _archive_dir() -> Path:
+    return Path(global_config.AUDIO_ARCHIVE_DIR)
+
+
+def _archive_path(sha256: str, extension: str) -> Path:
+    # Dois níveis de diretório para não acumular milhões de arquivos numa pasta só
+    return _archive_dir() / sha256[:2] / sha256[2:4] / f"{sha256}{extension}"
+
+
+def find_archived_audio(sha256: str) -> Optional[Path]:
+    directory = _archive_dir() / sha256[:2] / sha256[2:4]
+    if not directory.is_dir():
+        return None
+    return next(iter(sorted(directory.glob(f"{sha256}.*"))), None)
+
+
+def _archive_file(source: BinaryIO, extension: str, chunk_size: int) -> Tuple[str, bool]:
+    _archive_dir().mkdir(parents=True, exist_ok=True)
+    source.seek(0)
+    digest = hashlib.sha256()
+    # Escreve num temporário do mesmo volume para o rename final ser atômico
+    with NamedTemporaryFile(dir=_archive_dir(), suffix=".partial", delete=False) as temp_file:
+        temp_path = temp_file.name
+        try:
+            while chunk := source.read(chunk_size):
+                digest.update(chunk)
+                temp_file.write(chunk)
+        except BaseException:
+            temp_file.close()
+            os.unlink(temp_path)
+            raise
+    source.seek(0)
+
+    sha256 = digest.hexdigest()
+    existing = find_archived_audio(sha256)
+    if existing is not None:
+        try:
+            # Renova o mtime: a coleta de lixo não remove o arquivo antes deste prontuário ser gravado
+            os.utime(existing)
+            os.unlink(temp_path)
+            return sha256, False
+        except FileNotFoundError:
+            pass
+
+    target = _archive_path(sha256, extension)
+    target.parent.mkdir(parents=True, exist_ok=True)
+    os.replace(temp_path, target)
+    return sha256, True
+
+
+async def archive_audio(file: UploadFile, chunk_size: int = 1024 * 1024) -> Tuple[Optional[str], bool]:
+    """
+    Guarda o áudio no arquivo endereçado por conteúdo e devolve o sha256 e se
+    o arquivo foi criado agora (uploads repetidos não ocupam espaço de novo).
+    Retorna (None, False) se desativado. A cópia roda numa thread, fora do event loop.
+    """
+    if not global_config.AUDIO_ARCHIVE_ENABLED:
+        return None, False
+
+    extension = os.path.splitext(file.filename or "")[1].lower() or ".mp3"
+    with timed("audio_archive"):
+        return await asyncio.to_thread(_archive_file, file.file, extension, chunk_size)
+
+
+def _unreferenced_candidates(older_than: float) -> Dict[str, List[Path]]:
+    candidates: Dict[str, List[Path]] = {}
+    for path in _archive_dir().glob("*/*/*"):
+        try:
+            if path.stat().st_mtime < older_than:
+                candidates.setdefault(path.name.split(".", 1)[0], []).append(path)
+        except FileNotFoundError:
+            continue
+    return candidates
+
+
+def _remove_stale(paths: List[Path], older_than: float) -> int:
+    removed = 0
+    for path in paths:
+        try:
+            # Reconfere o mtime: um upload pode ter deduplicado contra o arquivo depois da varredura
+            if path.stat().st_mtime < older_than:
+                path.unlink()
+                removed += 1
+        except FileNotFoundError:
+            continue
+    return removed
+
+
+def _remove_partial_files(older_than: float) -> int:
+    # Temporários de cópias interrompidas (processo morto no meio da escrita)
+    return _remove_stale(list(_archive_dir().glob("*.partial")), older_than)
+
+
+async def collect_unreferenced_audio(
+    session: AsyncSession, grace_seconds: Optional[float] = None, batch_size: int = 500
+) -> int:
+    """
+    Remove áudios que nenhum prontuário referencia. Só considera arquivos sem
+    uso há mais de grace_seconds, para não disputar com requisições que acabaram
+    de arquivar (ou deduplicar) e ainda não gravaram o prontuário. Um prontuário
+    que não chega a ser gravado deixa o áudio para esta coleta, em vez de apagá-lo na hora.
+    """
+    if grace_seconds is None:
+        grace_seconds = global_config.AUDIO_ARCHIVE_GC_GRACE_SECONDS
+    older_than = time.time() - grace_seconds
+    if not _archive_dir().is_dir():
+        return 0
+
+    candidates = await asyncio.to_thread(_unreferenced_candidates, older_than)
+    removed = await asyncio.to_thread(_remove_partial_files, older_than)
+    hashes = sorted(candidates)
+    for start in range(0, len(hashes), batch_size):
+        batch = hashes[start:start + batch_size]
+        result = await session.execute(
+            select(MedicalRecord.audio_sha256).filter(MedicalRecord.audio_sha256.in_(batch)).distinct()
+        )
+        referenced = set(result.scalars())
+        stale = [path for sha256 in batch if sha256 not in referenced for path in candidates[sha256]]
+        removed += await asyncio.to_thread(_remove_stale, stale, older_than)
+    return removed
+
+
+async def main() -> None:
+    try:
+        async with get_session_maker()() as session:
+            removed = await collect_unreferenced_audio(session)
+        logger.info("Removed %s unreferenced archived audio files", removed)
+    finally:
+        await dispose_engines()
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    asyncio.run(main())
@@ -24,7 +24,7 @@ async def login_user(session: AsyncSession, user_data: UserLogin) -> Token:
     
     access_token_expires = timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)
     access_token = create_access_token(
-        data={"sub": user.username}, expires_delta=access_token_expires
+        data={"sub": user.username, "uid": user.id}, expires_delta=access_token_expires
     )
     
     return Token(access_token=access_token, token_type="bearer")
@@ -0,0 +1,253 @@
+import asyncio
+import hashlib
+import json
+import time
+from datetime import datetime, timedelta, timezone
+from typing import Awaitable, Callable, Dict, Optional, Tuple
+
+from fastapi import HTTPException, UploadFile, status
+from fastapi.responses import JSONResponse
+from pydantic import BaseModel
+from sqlalchemy import delete, select, update
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.config.base import global_config
+from app.database.db import get_session_maker
+from app.database.models import IdempotencyKey
+
+STATUS_IN_PROGRESS = "in_progress"
+STATUS_COMPLETED = "completed"
+
+# Acorda na hora quem espera no mesmo worker; entre workers o fallback é o polling no banco
+_in_flight: Dict[Tuple[int, str], asyncio.Event] = {}
+
+
+def _now() -> datetime:
+    return datetime.now(timezone.utc)
+
+
+def _as_utc(value: Optional[datetime]) -> Optional[datetime]:
+    if value is not None and value.tzinfo is None:
+        return value.replace(tzinfo=timezone.utc)
+    return value
+
+
+def build_request_hash(scope: str, *parts) -> str:
+    digest = hashlib.sha256(scope.encode("utf-8"))
+    for part in parts:
+        digest.update(b"\0")
+        digest.update(part if isinstance(part, bytes) else str(part).encode("utf-8"))
+    return digest.hexdigest()
+
+
+async def hash_upload(file: UploadFile, chunk_size: int = 1024 * 1024) -> str:
+    digest = hashlib.sha256()
+    while chunk := await file.read(chunk_size):
+        digest.update(chunk)
+    await file.seek(0)
+    return digest.hexdigest()
+
+
+def _replay(row: IdempotencyKey) -> JSONResponse:
+    return JSONResponse(
+        status_code=row.response_status,
+        content=json.loads(row.response_body),
+        headers={"Idempotent-Replayed": "true"},
+    )
+
+
+def _check_same_request(row: IdempotencyKey, scope: str, request_hash: str) -> None:
+    if row.scope != scope or row.request_hash != request_hash:
+        raise HTTPException(
+            status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+            detail="Idempotency-Key was already used with a different request"
+        )
+
+
+def _is_stale(row: IdempotencyKey, now: datetime) -> bool:
+    expired = _as_utc(row.expires_at) <= now
+    abandoned = row.status == STATUS_IN_PROGRESS and _as_utc(row.locked_until) <= now
+    return expired or abandoned
+
+
+async def _get_key(user_id: int, key: str) -> Optional[IdempotencyKey]:
+    async with get_session_maker()() as session:
+        result = await session.execute(
+            select(IdempotencyKey).filter(IdempotencyKey.user_id == user_id, IdempotencyKey.key == key)
+        )
+        return result.scalar_one_or_none()
+
+
+async def _claim(user_id: int, key: str, scope: str, request_hash: str) -> Optional[IdempotencyKey]:
+    """
+    Tenta registrar a chave como em andamento. Retorna None se esta requisição
+    ficou com a chave, ou a linha existente caso outra já a tenha.
+    """
+    now = _now()
+    async with get_session_maker()() as session:
+        session.add(IdempotencyKey(
+            user_id=user_id,
+            key=key,
+            scope=scope,
+            request_hash=request_hash,
+            status=STATUS_IN_PROGRESS,
+            locked_until=now + timedelta(seconds=global_config.IDEMPOTENCY_LOCK_SECONDS),
+            expires_at=now + timedelta(seconds=global_config.IDEMPOTENCY_TTL_SECONDS),
+        ))
+        try:
+            await session.commit()
+            return None
+        except IntegrityError:
+            await session.rollback()
+
+        result = await session.execute(
+            select(IdempotencyKey).filter(IdempotencyKey.user_id == user_id, IdempotencyKey.key == key)
+        )
+        existing = result.scalar_one_or_none()
+        if existing is None:
+            # Liberada entre o insert e o select: tenta de novo
+            return await _claim(user_id, key, scope, request_hash)
+
+        if not _is_stale(existing, now):
+            return existing
+
+        # Assume a chave expirada/abandonada apenas se ninguém a alterou nesse meio tempo
+        takeover = await session.execute(
+            update(IdempotencyKey)
+            .where(IdempotencyKey.id == existing.id, IdempotencyKey.status == existing.status)
+            .where(IdempotencyKey.locked_until == existing.locked_until)
+            .values(
+                scope=scope,
+                request_hash=request_hash,
+                status=STATUS_IN_PROGRESS,
+                response_status=None,
+                response_body=None,
+                locked_until=now + timedelta(seconds=global_config.IDEMPOTENCY_LOCK_SECONDS),
+                expires_at=now + timedelta(seconds=global_config.IDEMPOTENCY_TTL_SECONDS),
+            )
+        )
+        await session.commit()
+        if takeover.rowcount == 1:
+            return None
+        return await _claim(user_id, key, scope, request_hash)
+
+
+async def _wait_for_completion(user_id: int, key: str, scope: str, request_hash: str) -> Optional[IdempotencyKey]:
+    deadline = time.monotonic() + global_config.IDEMPOTENCY_WAIT_SECONDS
+    while time.monotonic() < deadline:
+        event = _in_flight.get((user_id, key))
+        timeout = min(global_config.IDEMPOTENCY_POLL_SECONDS, max(deadline - time.monotonic(), 0))
+        if event is not None:
+            try:
+                await asyncio.wait_for(event.wait(), timeout=timeout)
+            except asyncio.TimeoutError:
+                pass
+        else:
+            await asyncio.sleep(timeout)
+
+        # Só tenta inserir de novo se a chave foi liberada ou ficou abandonada
+        existing = await _get_key(user_id, key)
+        if existing is None or _is_stale(existing, _now()):
+            existing = await _claim(user_id, key, scope, request_hash)
+        if existing is None or existing.status == STATUS_COMPLETED:
+            return existing
+
+    raise HTTPException(
+        status_code=status.HTTP_409_CONFLICT,
+        detail="A request with this Idempotency-Key is still in progress"
+    )
+
+
+async def _complete(
+    session: Optional[AsyncSession],
+    user_id: int,
+    key: str,
+    response_status: int,
+    body: BaseModel
+) -> None:
+    statement = (
+        update(IdempotencyKey)
+        .where(IdempotencyKey.user_id == user_id, IdempotencyKey.key == key)
+        .values(
+            status=STATUS_COMPLETED,
+            response_status=response_status,
+            response_body=body.model_dump_json(),
+            locked_until=None,
+        )
+    )
+    if session is not None:
+        # Mesma transação do insert: a resposta só fica visível se o prontuário for gravado.
+        # O commit é aqui, não no teardown da dependência: quem espera a chave só acorda
+        # depois dele, e uma falha no commit ainda passa pelo _release do run_idempotent.
+        await session.execute(statement)
+        await session.commit()
+        return
+
+    async with get_session_maker()() as own_session:
+        await own_session.execute(statement)
+        await own_session.commit()
+
+
+async def _release(user_id: int, key: str) -> None:
+    async with get_session_maker()() as session:
+        await session.execute(
+            delete(IdempotencyKey).where(
+                IdempotencyKey.user_id == user_id,
+                IdempotencyKey.key == key,
+                IdempotencyKey.status == STATUS_IN_PROGRESS,
+            )
+        )
+        await session.commit()
+
+
+async def run_idempotent(
+    idempotency_key: Optional[str],
+    user_id: int,
+    scope: str,
+    request_hash: str,
+    handler: Callable[[], Awaitable[BaseModel]],
+    session: Optional[AsyncSession] = None,
+    response_status: int = status.HTTP_200_OK,
+):
+    if not idempotency_key:
+        return await handler()
+
+    if len(idempotency_key) > 255:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Idempotency-Key must be at most 255 characters"
+        )
+
+    existing = await _claim(user_id, idempotency_key, scope, request_hash)
+    if existing is not None:
+        _check_same_request(existing, scope, request_hash)
+        if existing.status != STATUS_COMPLETED:
+            existing = await _wait_for_completion(user_id, idempotency_key, scope, request_hash)
+        if existing is not None:
+            _check_same_request(existing, scope, request_hash)
+            return _replay(existing)
+
+    in_flight_key = (user_id, idempotency_key)
+    event = _in_flight.setdefault(in_flight_key, asyncio.Event())
+    # O evento só dispara depois do commit da resposta (ou da liberação da chave)
+    try:
+        response = await handler()
+        await _complete(session, user_id, idempotency_key, response_status, response)
+        return response
+    except BaseException:
+        if session is not None:
+            # Solta os locks da transação da requisição antes de liberar a chave em outra conexão
+            await session.rollback()
+        await _release(user_id, idempotency_key)
+        raise
+    finally:
+        _in_flight.pop(in_flight_key, None)
+        event.set()
+
+
+async def purge_expired_idempotency_keys() -> int:
+    async with get_session_maker()() as session:
+        result = await session.execute(delete(IdempotencyKey).where(IdempotencyKey.expires_at <= _now()))
+        await session.commit()
+        return result.rowcount
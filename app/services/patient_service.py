@@ -1,10 +1,11 @@
-from typing import List, Optional
+from typing import Any, Dict, List, Optional
 from fastapi import HTTPException, status
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import select
+from sqlalchemy import select, func
 from sqlalchemy.orm import selectinload
-from app.database.models import Patient
-from app.models.schemas import PatientCreate, PatientUpdate, PatientResponse, PatientWithRecords
+from app.database.models import Patient, MedicalRecord, PatientSummary
+from app.services.reservation_service import has_active_reservation
+from app.models.schemas import PatientCreate, PatientUpdate, PatientResponse, PatientWithRecords, PatientListItem
 
 async def create_patient(session: AsyncSession, patient_data: PatientCreate) -> PatientResponse:
     result = await session.execute(select(Patient).filter(Patient.cpf == patient_data.cpf))
@@ -25,19 +26,31 @@ async def create_patient(session: AsyncSession, patient_data: PatientCreate) ->
     session.add(db_patient)
     await session.flush()
     await session.refresh(db_patient)
+    session.add(PatientSummary(patient_id=db_patient.id, record_count=0))
     
     return PatientResponse.model_validate(db_patient)
 
-async def get_patients(session: AsyncSession, skip: int = 0, limit: int = 100) -> List[PatientResponse]:
+async def get_patients(session: AsyncSession, skip: int = 0, limit: int = 100) -> List[PatientListItem]:
+    # Resumo vem de patient_summaries pela chave primária, sem agregar medical_records
     result = await session.execute(
-        select(Patient)
+        select(
+            Patient.id,
+            Patient.nome,
+            Patient.cpf,
+            Patient.data_nascimento,
+            Patient.created_at,
+            func.coalesce(PatientSummary.record_count, 0).label("record_count"),
+            PatientSummary.last_visit_at,
+            PatientSummary.latest_record_id,
+            PatientSummary.latest_hipotese_diagnostica
+        )
+        .outerjoin(PatientSummary, PatientSummary.patient_id == Patient.id)
         .offset(skip)
         .limit(limit)
         .order_by(Patient.nome)
     )
-    patients = result.scalars().all()
     
-    return [PatientResponse.model_validate(patient) for patient in patients]
+    return [PatientListItem.model_validate(row) for row in result.all()]
 
 async def get_patient_by_id(session: AsyncSession, patient_id: int) -> PatientWithRecords:
     result = await session.execute(
@@ -55,6 +68,41 @@ async def get_patient_by_id(session: AsyncSession, patient_id: int) -> PatientWi
     
     return PatientWithRecords.model_validate(patient)
 
+async def get_patient_version(session: AsyncSession, patient_id: int) -> Dict[str, Any]:
+    # Apenas colunas de timestamp e agregados: não carrega nem serializa os prontuários
+    result = await session.execute(
+        select(
+            func.coalesce(Patient.updated_at, Patient.created_at),
+            Patient.version,
+            func.count(MedicalRecord.id),
+            func.max(func.coalesce(MedicalRecord.updated_at, MedicalRecord.created_at)),
+            func.max(MedicalRecord.id),
+            # Muda a cada edição de prontuário, mesmo duas no mesmo segundo
+            func.coalesce(func.sum(MedicalRecord.version), 0)
+        )
+        .outerjoin(MedicalRecord, MedicalRecord.patient_id == Patient.id)
+        .filter(Patient.id == patient_id)
+        .group_by(Patient.id, Patient.version)
+    )
+    row = result.one_or_none()
+    
+    if not row:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Patient not found"
+        )
+    
+    patient_modified_at, patient_version, record_count, records_modified_at, last_record_id, records_version = row
+    
+    return {
+        "patient_modified_at": patient_modified_at,
+        "patient_version": patient_version,
+        "record_count": record_count,
+        "records_modified_at": records_modified_at,
+        "last_record_id": last_record_id,
+        "records_version": records_version,
+    }
+
 async def get_patient_by_cpf(session: AsyncSession, cpf: str) -> PatientWithRecords:
     result = await session.execute(
         select(Patient)
@@ -100,7 +148,9 @@ async def update_patient(session: AsyncSession, patient_id: int, patient_data: P
     return PatientResponse.model_validate(patient)
 
 async def delete_patient(session: AsyncSession, patient_id: int) -> bool:
-    result = await session.execute(select(Patient).filter(Patient.id == patient_id))
+    # FOR UPDATE até o commit: uma reserva concorrente espera e depois não acha o paciente,
+    # ou já está gravada e a checagem abaixo a enxerga
+    result = await session.execute(select(Patient).filter(Patient.id == patient_id).with_for_update())
     patient = result.scalar_one_or_none()
     
     if not patient:
@@ -109,5 +159,11 @@ async def delete_patient(session: AsyncSession, patient_id: int) -> bool:
             detail="Patient not found"
         )
     
+    if await has_active_reservation(session, patient_id):
+        raise HTTPException(
+            status_code=status.HTTP_409_CONFLICT,
+            detail="Patient has a transcription in progress"
+        )
+    
     await session.delete(patient)
     return True
\ No newline at end of file
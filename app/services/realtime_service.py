@@ -0,0 +1,286 @@
+import asyncio
+import io
+import json
+import logging
+import math
+from typing import Any, Dict, List, Optional, Tuple
+
+from fastapi import UploadFile, WebSocket, WebSocketDisconnect, status
+from starlette.datastructures import Headers
+
+from app.config.base import global_config
+from app.core.metrics import timed
+from app.core.scheduler import ai_pipeline_scheduler
+from app.database.db import get_session_maker
+from app.infrastructure.ai_workflow import AIWorkflow
+from app.services.reservation_service import reserve_patient, release_patient_reservation
+from app.services.transcription_service import save_transcription_record
+
+logger = logging.getLogger(__name__)
+
+
+class RealtimeTranscriptionSession:
+    """
+    Transcreve janelas de áudio em segundo plano enquanto a consulta acontece.
+
+    Cada janela é um arquivo de áudio completo (ex.: MediaRecorder reiniciado a
+    cada N segundos). Ao encerrar, só falta a extração estruturada do texto.
+    """
+
+    def __init__(
+        self,
+        workflow: Optional[AIWorkflow] = None,
+        window_seconds: Optional[float] = None,
+        max_parallel: Optional[int] = None,
+        tenant: Optional[str] = None,
+    ):
+        self.workflow = workflow or AIWorkflow()
+        self.tenant = tenant or "anonymous"
+        self.window_seconds = window_seconds
+        self._semaphore = asyncio.Semaphore(max_parallel or global_config.REALTIME_MAX_PARALLEL_WINDOWS)
+        self._tasks: Dict[int, asyncio.Task] = {}
+        self._results: Dict[int, Tuple[str, List[Dict[str, Any]]]] = {}
+        self._failed: Dict[int, str] = {}
+        self._next_index = 0
+        # Erro da extração final; a transcrição e os segmentos são gravados mesmo assim
+        self.extraction_error: Optional[str] = None
+
+    def add_window(self, audio: bytes, filename: str, content_type: str) -> "asyncio.Task":
+        index = self._next_index
+        self._next_index += 1
+        task = asyncio.create_task(self._transcribe_window(index, audio, filename, content_type))
+        self._tasks[index] = task
+        return task
+
+    async def _transcribe_window(self, index: int, audio: bytes, filename: str, content_type: str) -> int:
+        """
+        Nunca levanta erro (exceto cancelamento): uma janela que falha em todas as
+        tentativas fica registrada em `failed_windows` e a consulta segue com as demais.
+        """
+        max_attempts = max(1, global_config.REALTIME_WINDOW_MAX_ATTEMPTS)
+        for attempt in range(1, max_attempts + 1):
+            upload = UploadFile(
+                file=io.BytesIO(audio),
+                filename=filename,
+                size=len(audio),
+                headers=Headers({"content-type": content_type}),
+            )
+            try:
+                async with self._semaphore, ai_pipeline_scheduler.slot(self.tenant):
+                    with timed("realtime_window_transcription", self.workflow.provider.value):
+                        infra = self.workflow.get_transcription_infra()
+                        text, segments = await infra.extract_transcription_from_audio(upload)
+            except Exception as error:
+                logger.warning(
+                    "Realtime window %s failed (attempt %s/%s): %s", index, attempt, max_attempts, error
+                )
+                if attempt == max_attempts:
+                    self._failed[index] = str(getattr(error, "detail", None) or error) or type(error).__name__
+                    return index
+                await asyncio.sleep(global_config.REALTIME_WINDOW_RETRY_BACKOFF_SECONDS * attempt)
+                continue
+
+            self._results[index] = (text.strip(), segments)
+            return index
+        return index
+
+    @property
+    def window_count(self) -> int:
+        return self._next_index
+
+    @property
+    def failed_windows(self) -> List[int]:
+        return sorted(self._failed)
+
+    def window_error(self, index: int) -> Optional[str]:
+        return self._failed.get(index)
+
+    @property
+    def pending_windows(self) -> int:
+        return sum(1 for task in self._tasks.values() if not task.done())
+
+    def transcript(self, contiguous_only: bool = True) -> str:
+        # Texto parcial só até a primeira janela ainda pendente, para não mostrar buracos
+        texts = []
+        for index in range(self._next_index):
+            if index in self._failed:
+                continue
+            if index not in self._results:
+                if contiguous_only:
+                    break
+                continue
+            if self._results[index][0]:
+                texts.append(self._results[index][0])
+        return " ".join(texts)
+
+    def segments(self) -> List[Dict[str, Any]]:
+        merged: List[Dict[str, Any]] = []
+        offset = 0.0
+        for index in range(self._next_index):
+            window_segments = self._results.get(index, ("", []))[1]
+            for segment in window_segments:
+                merged.append({
+                    **segment,
+                    "position": len(merged),
+                    "start_time": segment["start_time"] + offset,
+                    "end_time": segment["end_time"] + offset,
+                })
+            if self.window_seconds:
+                offset = (index + 1) * self.window_seconds
+            elif window_segments:
+                offset += max(segment["end_time"] for segment in window_segments)
+        return merged
+
+    async def finalize(self) -> Tuple[str, Dict[str, str], List[Dict[str, Any]]]:
+        if self._tasks:
+            await asyncio.gather(*self._tasks.values(), return_exceptions=True)
+
+        if self._tasks and len(self._failed) == len(self._tasks):
+            raise ValueError("No audio window could be transcribed")
+
+        transcription_text = self.transcript()
+        try:
+            async with ai_pipeline_scheduler.slot(self.tenant):
+                with timed("realtime_final_extraction", self.workflow.provider.value):
+                    json_text = await self.workflow.get_extraction_infra().extract_json_from_text(transcription_text)
+        except Exception as error:
+            # A consulta já foi transcrita: perde-se só a estruturação, que pode ser refeita pela reextração
+            logger.exception("Realtime final extraction failed")
+            self.extraction_error = str(getattr(error, "detail", None) or error) or type(error).__name__
+            json_text = {}
+
+        return transcription_text, json_text, self.segments()
+
+    async def cancel(self) -> None:
+        for task in self._tasks.values():
+            task.cancel()
+        await asyncio.gather(*self._tasks.values(), return_exceptions=True)
+
+
+async def handle_realtime_transcription(
+    websocket: WebSocket,
+    patient_id: int,
+    workflow: Optional[AIWorkflow] = None,
+    tenant: Optional[str] = None,
+) -> None:
+    """
+    Protocolo:
+      - cliente -> {"type": "start", "content_type": "audio/webm", "window_seconds": 10} (opcional)
+      - cliente -> frames binários, cada um uma janela de áudio completa
+      - servidor -> {"type": "partial", "window": i, "transcript": "..."} a cada janela transcrita
+      - servidor -> {"type": "window_error", "window": i, "detail": "..."} se a janela se perdeu
+        depois das tentativas; a consulta continua com as demais
+      - cliente -> {"type": "stop"}
+      - servidor -> {"type": "error", "detail": "..."} se o "start" for inválido; a sessão continua
+      - servidor -> {"type": "final", "medical_record_id": ..., "original_text": ..., "structured": {...},
+                     "failed_windows": [...], "extraction_error": null}
+        (se a extração final falhar, o prontuário é gravado só com a transcrição e "structured" vem vazio)
+    """
+    reservation_token = await reserve_patient(patient_id, global_config.REALTIME_MAX_SESSION_SECONDS)
+    realtime = RealtimeTranscriptionSession(workflow=workflow, tenant=tenant)
+    content_type = "audio/webm"
+    extension = "webm"
+    notifier_tasks: List[asyncio.Task] = []
+
+    async def notify_partial(task: asyncio.Task) -> None:
+        index = await task
+        error = realtime.window_error(index)
+        if error is not None:
+            await websocket.send_json({"type": "window_error", "window": index, "detail": error})
+            return
+        await websocket.send_json({
+            "type": "partial",
+            "window": index,
+            "pending_windows": realtime.pending_windows,
+            "transcript": realtime.transcript(),
+        })
+
+    try:
+        while True:
+            message = await websocket.receive()
+            if message["type"] == "websocket.disconnect":
+                raise WebSocketDisconnect(message.get("code", status.WS_1000_NORMAL_CLOSURE))
+
+            if message.get("bytes") is not None:
+                audio = message["bytes"]
+                if len(audio) > global_config.REALTIME_MAX_WINDOW_BYTES:
+                    await websocket.send_json({"type": "error", "detail": "Audio window too large"})
+                    continue
+                task = realtime.add_window(audio, f"window-{realtime.window_count}.{extension}", content_type)
+                notifier_tasks.append(asyncio.create_task(notify_partial(task)))
+                continue
+
+            control = _parse_control(message.get("text"))
+            if control.get("type") == "start":
+                try:
+                    window_seconds = _parse_window_seconds(control.get("window_seconds"))
+                    start_content_type = control.get("content_type", content_type)
+                    if not isinstance(start_content_type, str) or not start_content_type:
+                        raise ValueError("content_type must be a non-empty string")
+                except ValueError as error:
+                    await websocket.send_json({"type": "error", "detail": str(error)})
+                    continue
+                content_type = start_content_type
+                extension = content_type.split("/")[-1].split(";")[0] or extension
+                realtime.window_seconds = window_seconds or realtime.window_seconds
+            elif control.get("type") == "stop":
+                break
+
+        response_text, response_json, response_segments = await realtime.finalize()
+        await asyncio.gather(*notifier_tasks, return_exceptions=True)
+
+        async with get_session_maker()() as session:
+            medical_record = await save_transcription_record(
+                session, patient_id, response_text, response_json, response_segments, reservation_token
+            )
+            await session.commit()
+
+        await websocket.send_json({
+            "type": "final",
+            "medical_record_id": medical_record.id,
+            "original_text": response_text,
+            "structured": response_json,
+            "failed_windows": realtime.failed_windows,
+            "extraction_error": realtime.extraction_error,
+        })
+        await websocket.close()
+    except WebSocketDisconnect:
+        logger.info("Realtime transcription for patient %s disconnected before stop", patient_id)
+        await realtime.cancel()
+        await release_patient_reservation(reservation_token)
+    except Exception:
+        logger.exception("Realtime transcription for patient %s failed", patient_id)
+        await realtime.cancel()
+        await release_patient_reservation(reservation_token)
+        await websocket.send_json({"type": "error", "detail": "Transcription failed"})
+        await websocket.close(code=status.WS_1011_INTERNAL_ERROR)
+    except BaseException:
+        await realtime.cancel()
+        await release_patient_reservation(reservation_token)
+        raise
+    finally:
+        for task in notifier_tasks:
+            task.cancel()
+
+
+def _parse_window_seconds(value: Any) -> Optional[float]:
+    """Valor do cliente: número positivo (aceita "10"); ausente mantém o padrão."""
+    if value is None:
+        return None
+    if isinstance(value, bool):
+        raise ValueError("window_seconds must be a positive number")
+    try:
+        seconds = float(value)
+    except (TypeError, ValueError):
+        raise ValueError("window_seconds must be a positive number")
+    if not math.isfinite(seconds) or seconds <= 0:
+        raise ValueError("window_seconds must be a positive number")
+    return seconds
+
+
+def _parse_control(text: Optional[str]) -> Dict[str, Any]:
+    try:
+        control = json.loads(text or "{}")
+    except ValueError:
+        return {}
+    return control if isinstance(control, dict) else {}
@@ -1,11 +1,17 @@
-from typing import List
+from typing import Any, Dict, List, Optional, Tuple
 from fastapi import HTTPException, status
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import select
+from sqlalchemy import select, func, tuple_
 from app.database.models import MedicalRecord, Patient
+from app.services.summary_service import apply_record_created, apply_record_updated, apply_record_deleted
 from app.models.schemas import MedicalRecordCreate, MedicalRecordUpdate, MedicalRecordResponse
+from app.utils.pagination import decode_cursor, encode_cursor
 
-async def create_medical_record(session: AsyncSession, record_data: MedicalRecordCreate) -> MedicalRecordResponse:
+async def create_medical_record(
+    session: AsyncSession,
+    record_data: MedicalRecordCreate,
+    audio_sha256: Optional[str] = None
+) -> MedicalRecordResponse:
     patient_result = await session.execute(select(Patient).filter(Patient.id == record_data.patient_id))
     patient = patient_result.scalar_one_or_none()
     
@@ -25,33 +31,63 @@ async def create_medical_record(session: AsyncSession, record_data: MedicalRecor
         conduta=record_data.conduta,
         prescricao=record_data.prescricao,
         encaminhamentos=record_data.encaminhamentos,
-        original_transcription=record_data.original_transcription
+        original_transcription=record_data.original_transcription,
+        audio_sha256=audio_sha256
     )
     
     session.add(db_record)
     await session.flush()
     await session.refresh(db_record)
+    await apply_record_created(session, db_record)
     
     return MedicalRecordResponse.model_validate(db_record)
 
-async def get_patient_records(session: AsyncSession, patient_id: int) -> List[MedicalRecordResponse]:
-    patient_result = await session.execute(select(Patient).filter(Patient.id == patient_id))
-    patient = patient_result.scalar_one_or_none()
+async def get_patient_records(
+    session: AsyncSession,
+    patient_id: int,
+    limit: Optional[int] = None,
+    cursor: Optional[str] = None
+) -> Tuple[List[MedicalRecordResponse], Optional[str]]:
+    patient_result = await session.execute(select(Patient.id).filter(Patient.id == patient_id))
     
-    if not patient:
+    if patient_result.scalar_one_or_none() is None:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="Patient not found"
         )
     
-    result = await session.execute(
+    # Mesma ordem do índice ix_medical_records_patient_created: sem sort, sem OFFSET
+    query = (
         select(MedicalRecord)
         .filter(MedicalRecord.patient_id == patient_id)
-        .order_by(MedicalRecord.created_at.desc())
+        .order_by(MedicalRecord.created_at.desc(), MedicalRecord.id.desc())
     )
-    records = result.scalars().all()
     
-    return [MedicalRecordResponse.model_validate(record) for record in records]
+    if cursor:
+        try:
+            cursor_created_at, cursor_id = decode_cursor(cursor)
+        except ValueError:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail="Invalid cursor"
+            )
+        query = query.filter(
+            tuple_(MedicalRecord.created_at, MedicalRecord.id) < tuple_(cursor_created_at, cursor_id)
+        )
+    
+    if limit is not None:
+        # Um registro a mais indica se existe próxima página
+        query = query.limit(limit + 1)
+    
+    result = await session.execute(query)
+    records = list(result.scalars().all())
+    
+    next_cursor = None
+    if limit is not None and len(records) > limit:
+        records = records[:limit]
+        next_cursor = encode_cursor(records[-1].created_at, records[-1].id)
+    
+    return [MedicalRecordResponse.model_validate(record) for record in records], next_cursor
 
 async def get_medical_record(session: AsyncSession, record_id: int) -> MedicalRecordResponse:
     result = await session.execute(select(MedicalRecord).filter(MedicalRecord.id == record_id))
@@ -65,6 +101,21 @@ async def get_medical_record(session: AsyncSession, record_id: int) -> MedicalRe
     
     return MedicalRecordResponse.model_validate(record)
 
+async def get_medical_record_version(session: AsyncSession, record_id: int) -> Dict[str, Any]:
+    result = await session.execute(
+        select(func.coalesce(MedicalRecord.updated_at, MedicalRecord.created_at), MedicalRecord.version)
+        .filter(MedicalRecord.id == record_id)
+    )
+    row = result.one_or_none()
+    
+    if not row:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Medical record not found"
+        )
+    
+    return {"record_id": record_id, "modified_at": row[0], "version": row[1]}
+
 async def update_medical_record(session: AsyncSession, record_id: int, record_data: MedicalRecordUpdate) -> MedicalRecordResponse:
     result = await session.execute(select(MedicalRecord).filter(MedicalRecord.id == record_id))
     record = result.scalar_one_or_none()
@@ -81,6 +132,8 @@ async def update_medical_record(session: AsyncSession, record_id: int, record_da
     
     await session.flush()
     await session.refresh(record)
+    if "hipotese_diagnostica" in update_data:
+        await apply_record_updated(session, record)
     
     return MedicalRecordResponse.model_validate(record)
 
@@ -95,4 +148,6 @@ async def delete_medical_record(session: AsyncSession, record_id: int) -> bool:
         )
     
     await session.delete(record)
+    await session.flush()
+    await apply_record_deleted(session, record.patient_id)
     return True
\ No newline at end of file
@@ -0,0 +1,243 @@
+"""
+Reextração em massa: roda de novo só a etapa de LLM sobre as transcrições
+guardadas (ex.: após mudar PROMPT_MEDICAL ou OPENROUTER_MODEL_ID).
+
+    python -m app.services.reextraction_service --patient-id 42 --created-from 2024-01-01
+    python -m app.services.reextraction_service --provider openrouter --concurrency 8 --checkpoint reextract.json
+
+Repetir o comando com os mesmos filtros e o mesmo --checkpoint retoma de onde parou.
+
+Prontuários editados à mão (version maior que a gravada na última extração) são
+pulados e listados no checkpoint; --overwrite-edited os reextrai mesmo assim.
+
+Os prontuários são processados em ordem de id, em lotes. Cada lote é extraído
+com concorrência limitada e gravado numa única transação; só então o
+checkpoint avança. Falhas individuais ficam registradas no checkpoint e não
+interrompem o job.
+"""
+import argparse
+import asyncio
+import logging
+from datetime import date
+from pathlib import Path
+from typing import Dict, List, Optional
+
+from pydantic import BaseModel
+from sqlalchemy import bindparam, func, select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.core.usage_ledger import usage_ledger
+from app.database.db import dispose_engines, get_session_maker
+from app.database.models import MedicalRecord
+from app.infrastructure.ai_workflow import AIWorkflow, close_provider_clients
+from app.infrastructure.strategy import AIProvider
+from app.prompts import MEDICAL_RECORD_FIELDS
+from app.services.summary_service import refresh_patient_summary
+
+logger = logging.getLogger(__name__)
+
+
+class ReextractionFilters(BaseModel):
+    patient_ids: List[int] = []
+    record_ids: List[int] = []
+    created_from: Optional[str] = None
+    created_to: Optional[str] = None
+    provider: Optional[str] = None
+    overwrite_edited: bool = False
+
+
+class ReextractionCheckpoint(BaseModel):
+    filters: ReextractionFilters
+    last_record_id: int = 0
+    processed: int = 0
+    updated: int = 0
+    failed: List[int] = []
+    skipped_edited: List[int] = []
+
+    @classmethod
+    def load(cls, path: Optional[Path], filters: ReextractionFilters) -> "ReextractionCheckpoint":
+        if path is None or not path.exists():
+            return cls(filters=filters)
+        checkpoint = cls.model_validate_json(path.read_text())
+        if checkpoint.filters != filters:
+            raise ValueError(f"Checkpoint {path} was created with different filters: {checkpoint.filters}")
+        return checkpoint
+
+    def save(self, path: Optional[Path]) -> None:
+        if path is None:
+            return
+        # Escreve e renomeia: um job interrompido nunca deixa o checkpoint pela metade
+        temp_path = path.with_suffix(path.suffix + ".tmp")
+        temp_path.write_text(self.model_dump_json(indent=2))
+        temp_path.replace(path)
+
+
+def _edited_condition(table):
+    # Toda escrita incrementa version; a extração guarda a version que ela mesma gerou
+    return table.c.version > table.c.extracted_version
+
+
+def _build_query(filters: ReextractionFilters, after_id: int, batch_size: int):
+    query = (
+        select(
+            MedicalRecord.id,
+            MedicalRecord.patient_id,
+            MedicalRecord.original_transcription,
+            MedicalRecord.version,
+            _edited_condition(MedicalRecord.__table__).label("edited"),
+        )
+        .filter(MedicalRecord.id > after_id)
+        .filter(func.length(func.coalesce(MedicalRecord.original_transcription, "")) > 0)
+        .order_by(MedicalRecord.id)
+        .limit(batch_size)
+    )
+    if filters.patient_ids:
+        query = query.filter(MedicalRecord.patient_id.in_(filters.patient_ids))
+    if filters.record_ids:
+        query = query.filter(MedicalRecord.id.in_(filters.record_ids))
+    if filters.created_from:
+        query = query.filter(MedicalRecord.created_at >= date.fromisoformat(filters.created_from))
+    if filters.created_to:
+        query = query.filter(MedicalRecord.created_at < date.fromisoformat(filters.created_to))
+    return query
+
+
+async def _write_batch(
+    session: AsyncSession, rows: List[Dict], patient_ids: List[int], overwrite_edited: bool = False
+) -> None:
+    table = MedicalRecord.__table__
+    statement = (
+        update(table)
+        .where(table.c.id == bindparam("record_id"))
+        .values({
+            **{name: bindparam(name) for name in MEDICAL_RECORD_FIELDS},
+            "updated_at": func.now(),
+            "extracted_at": func.now(),
+            # O UPDATE incrementa version; o SET lê o valor anterior
+            "extracted_version": table.c.version + 1,
+        })
+    )
+    if not overwrite_edited:
+        # Edição feita enquanto o lote era extraído muda a version lida: a linha não é sobrescrita
+        statement = statement.where(table.c.version == bindparam("read_version"))
+    await session.execute(statement, rows)
+    # O resumo mostra a hipótese diagnóstica do prontuário mais recente
+    for patient_id in sorted(set(patient_ids)):
+        await refresh_patient_summary(session, patient_id)
+
+
+async def run_reextraction(
+    filters: ReextractionFilters,
+    concurrency: int = 4,
+    batch_size: int = 50,
+    checkpoint_path: Optional[Path] = None,
+    dry_run: bool = False,
+) -> ReextractionCheckpoint:
+    checkpoint = ReextractionCheckpoint.load(checkpoint_path, filters)
+    workflow = AIWorkflow()
+    if filters.provider:
+        workflow.provider = AIProvider(filters.provider)
+    infra = workflow.get_extraction_infra()
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def extract(record_id: int, transcription: str) -> Optional[Dict[str, str]]:
+        async with semaphore:
+            try:
+                return await infra.extract_json_from_text(transcription)
+            except Exception:
+                logger.exception("Re-extraction failed for medical record %s", record_id)
+                return None
+
+    while True:
+        async with get_session_maker()() as session:
+            result = await session.execute(_build_query(filters, checkpoint.last_record_id, batch_size))
+            batch = result.all()
+        if not batch:
+            break
+
+        edited = [row.id for row in batch if row.edited and not filters.overwrite_edited]
+        if edited:
+            logger.warning("Skipping manually edited medical records: %s", edited)
+            checkpoint.skipped_edited.extend(edited)
+        pending = [row for row in batch if row.id not in edited]
+
+        extracted = await asyncio.gather(*(extract(row.id, row.original_transcription) for row in pending))
+
+        rows, patient_ids = [], []
+        for row, fields in zip(pending, extracted):
+            if fields is None:
+                checkpoint.failed.append(row.id)
+                continue
+            rows.append({
+                "record_id": row.id,
+                "read_version": row.version,
+                **{name: fields.get(name) for name in MEDICAL_RECORD_FIELDS},
+            })
+            patient_ids.append(row.patient_id)
+
+        if rows and not dry_run:
+            async with get_session_maker()() as session:
+                await _write_batch(session, rows, patient_ids, filters.overwrite_edited)
+                await session.commit()
+
+        checkpoint.last_record_id = batch[-1].id
+        checkpoint.processed += len(batch)
+        checkpoint.updated += 0 if dry_run else len(rows)
+        checkpoint.save(checkpoint_path)
+        await usage_ledger.flush()
+        logger.info(
+            "Re-extracted up to record %s (%s processed, %s updated, %s failed, %s edited skipped)",
+            checkpoint.last_record_id, checkpoint.processed, checkpoint.updated, len(checkpoint.failed),
+            len(checkpoint.skipped_edited)
+        )
+
+    return checkpoint
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Re-run the LLM extraction over stored transcriptions")
+    parser.add_argument("--patient-id", type=int, action="append", default=[], dest="patient_ids")
+    parser.add_argument("--record-id", type=int, action="append", default=[], dest="record_ids")
+    parser.add_argument("--created-from", help="YYYY-MM-DD, inclusivo")
+    parser.add_argument("--created-to", help="YYYY-MM-DD, exclusivo")
+    parser.add_argument("--provider", choices=[provider.value for provider in AIProvider])
+    parser.add_argument("--concurrency", type=int, default=4)
+    parser.add_argument("--batch-size", type=int, default=50)
+    parser.add_argument("--checkpoint", type=Path, help="arquivo JSON para retomar o job")
+    parser.add_argument("--dry-run", action="store_true", help="extrai sem gravar")
+    parser.add_argument(
+        "--overwrite-edited",
+        action="store_true",
+        help="reextrai também prontuários editados manualmente após a última extração",
+    )
+    return parser.parse_args(argv)
+
+
+async def main(argv=None) -> None:
+    args = parse_args(argv)
+    filters = ReextractionFilters(
+        patient_ids=args.patient_ids,
+        record_ids=args.record_ids,
+        created_from=args.created_from,
+        created_to=args.created_to,
+        provider=args.provider,
+        overwrite_edited=args.overwrite_edited,
+    )
+    try:
+        checkpoint = await run_reextraction(
+            filters, args.concurrency, args.batch_size, args.checkpoint, args.dry_run
+        )
+        logger.info(
+            "Re-extraction finished: %s processed, %s updated, failed records: %s, edited records skipped: %s",
+            checkpoint.processed, checkpoint.updated, checkpoint.failed or "none",
+            checkpoint.skipped_edited or "none"
+        )
+    finally:
+        await usage_ledger.flush()
+        await close_provider_clients()
+        await dispose_engines()
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    asyncio.run(main())
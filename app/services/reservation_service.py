@@ -0,0 +1,65 @@
+import uuid
+from datetime import datetime, timedelta, timezone
+from typing import Optional
+from fastapi import HTTPException, status
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy import select, delete
+from app.config.base import global_config
+from app.database.db import get_session_maker
+from app.database.models import Patient, PatientReservation
+
+async def reserve_patient(patient_id: int, ttl_seconds: Optional[int] = None) -> str:
+    # Sessão própria e curta: a conexão não fica presa durante as chamadas aos provedores
+    now = datetime.now(timezone.utc)
+    
+    async with get_session_maker()() as session:
+        # Mesmo lock de linha do delete_patient: reserva e exclusão do paciente não se cruzam
+        patient_result = await session.execute(
+            select(Patient.id).filter(Patient.id == patient_id).with_for_update()
+        )
+        
+        if patient_result.scalar_one_or_none() is None:
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND,
+                detail="Patient not found"
+            )
+        
+        await session.execute(
+            delete(PatientReservation).where(
+                PatientReservation.patient_id == patient_id,
+                PatientReservation.expires_at <= now
+            )
+        )
+        
+        token = str(uuid.uuid4())
+        session.add(PatientReservation(
+            patient_id=patient_id,
+            token=token,
+            expires_at=now + timedelta(seconds=ttl_seconds or global_config.PATIENT_RESERVATION_SECONDS)
+        ))
+        await session.commit()
+    
+    return token
+
+async def release_patient_reservation(token: str, session: Optional[AsyncSession] = None) -> None:
+    statement = delete(PatientReservation).where(PatientReservation.token == token)
+    
+    if session is not None:
+        await session.execute(statement)
+        return
+    
+    async with get_session_maker()() as own_session:
+        await own_session.execute(statement)
+        await own_session.commit()
+
+async def has_active_reservation(session: AsyncSession, patient_id: int) -> bool:
+    result = await session.execute(
+        select(PatientReservation.id)
+        .filter(
+            PatientReservation.patient_id == patient_id,
+            PatientReservation.expires_at > datetime.now(timezone.utc)
+        )
+        .limit(1)
+    )
+    
+    return result.scalar_one_or_none() is not None
@@ -0,0 +1,50 @@
+from typing import Any, Dict, List, Optional
+from fastapi import HTTPException, status
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy import select, insert
+from app.database.models import MedicalRecord, TranscriptionSegment
+from app.models.schemas import TranscriptionSegmentResponse
+
+async def create_transcription_segments(
+    session: AsyncSession, 
+    record_id: int, 
+    segments: List[Dict[str, Any]]
+) -> int:
+    if not segments:
+        return 0
+    
+    rows = [{**segment, "record_id": record_id} for segment in segments]
+    await session.execute(insert(TranscriptionSegment), rows)
+    
+    return len(rows)
+
+async def get_record_segments(
+    session: AsyncSession,
+    record_id: int,
+    start: Optional[float] = None,
+    end: Optional[float] = None,
+    search: Optional[str] = None
+) -> List[TranscriptionSegmentResponse]:
+    record_result = await session.execute(select(MedicalRecord.id).filter(MedicalRecord.id == record_id))
+    
+    if record_result.scalar_one_or_none() is None:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Medical record not found"
+        )
+    
+    query = select(TranscriptionSegment).filter(TranscriptionSegment.record_id == record_id)
+    
+    if start is not None:
+        query = query.filter(TranscriptionSegment.end_time >= start)
+    if end is not None:
+        query = query.filter(TranscriptionSegment.start_time <= end)
+    if search:
+        # % e _ digitados pelo usuário são literais, não curingas
+        escaped = search.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+        query = query.filter(TranscriptionSegment.text.ilike(f"%{escaped}%", escape="\\"))
+    
+    result = await session.execute(query.order_by(TranscriptionSegment.position))
+    segments = result.scalars().all()
+    
+    return [TranscriptionSegmentResponse.model_validate(segment) for segment in segments]
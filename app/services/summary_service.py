@@ -0,0 +1,95 @@
+from sqlalchemy import Select, and_, delete, func, insert, or_, select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.database.models import MedicalRecord, Patient, PatientSummary
+
+SUMMARY_COLUMNS = ["patient_id", "record_count", "last_visit_at", "latest_record_id", "latest_hipotese_diagnostica"]
+
+
+def build_summary_select() -> Select:
+    """Resumo calculado do zero a partir de medical_records, uma linha por paciente."""
+    latest_record_id = (
+        select(MedicalRecord.id)
+        .where(MedicalRecord.patient_id == Patient.id)
+        .order_by(MedicalRecord.created_at.desc(), MedicalRecord.id.desc())
+        .limit(1)
+        .correlate(Patient)
+        .scalar_subquery()
+    )
+    latest_hipotese = (
+        select(MedicalRecord.hipotese_diagnostica)
+        .where(MedicalRecord.id == latest_record_id)
+        .scalar_subquery()
+    )
+    record_count = (
+        select(func.count(MedicalRecord.id))
+        .where(MedicalRecord.patient_id == Patient.id)
+        .correlate(Patient)
+        .scalar_subquery()
+    )
+    last_visit_at = (
+        select(func.max(MedicalRecord.created_at))
+        .where(MedicalRecord.patient_id == Patient.id)
+        .correlate(Patient)
+        .scalar_subquery()
+    )
+    return select(Patient.id, record_count, last_visit_at, latest_record_id, latest_hipotese)
+
+
+async def refresh_patient_summary(session: AsyncSession, patient_id: int) -> None:
+    await session.execute(delete(PatientSummary).where(PatientSummary.patient_id == patient_id))
+    await session.execute(
+        insert(PatientSummary).from_select(SUMMARY_COLUMNS, build_summary_select().where(Patient.id == patient_id))
+    )
+
+
+async def rebuild_patient_summaries(session: AsyncSession) -> int:
+    await session.execute(delete(PatientSummary))
+    result = await session.execute(insert(PatientSummary).from_select(SUMMARY_COLUMNS, build_summary_select()))
+    return result.rowcount
+
+
+async def apply_record_created(session: AsyncSession, record: MedicalRecord) -> None:
+    # Incremento atômico: escritas concorrentes no mesmo paciente não perdem contagem
+    result = await session.execute(
+        update(PatientSummary)
+        .where(PatientSummary.patient_id == record.patient_id)
+        .values(record_count=PatientSummary.record_count + 1)
+    )
+    if result.rowcount == 0:
+        # Paciente sem resumo (ex.: criado fora da API): recalcula a partir dos prontuários
+        await refresh_patient_summary(session, record.patient_id)
+        return
+
+    # Mesma ordem do build_summary_select (created_at desc, id desc): um prontuário
+    # importado com data retroativa ou um insert concorrente não toma o lugar do mais recente.
+    # A data vem da própria linha para a comparação ser feita no formato gravado no banco.
+    record_created_at = select(MedicalRecord.created_at).where(MedicalRecord.id == record.id).scalar_subquery()
+    await session.execute(
+        update(PatientSummary)
+        .where(PatientSummary.patient_id == record.patient_id)
+        .where(or_(
+            PatientSummary.latest_record_id.is_(None),
+            PatientSummary.last_visit_at < record_created_at,
+            and_(PatientSummary.last_visit_at == record_created_at, PatientSummary.latest_record_id < record.id),
+        ))
+        .values(
+            last_visit_at=record_created_at,
+            latest_record_id=record.id,
+            latest_hipotese_diagnostica=record.hipotese_diagnostica,
+        )
+    )
+
+
+async def apply_record_updated(session: AsyncSession, record: MedicalRecord) -> None:
+    # Só o prontuário mais recente alimenta o resumo
+    await session.execute(
+        update(PatientSummary)
+        .where(PatientSummary.patient_id == record.patient_id, PatientSummary.latest_record_id == record.id)
+        .values(latest_hipotese_diagnostica=record.hipotese_diagnostica)
+    )
+
+
+async def apply_record_deleted(session: AsyncSession, patient_id: int) -> None:
+    # Remoções são raras: recalcula o resumo deste paciente, que depende só do índice por patient_id
+    await refresh_patient_summary(session, patient_id)
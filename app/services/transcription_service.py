@@ -1,14 +1,87 @@
-from fastapi import UploadFile
+import os
+from typing import Any, Dict, List, Optional
+from fastapi import HTTPException, UploadFile, status
 from sqlalchemy.ext.asyncio import AsyncSession
 from app.infrastructure.ai_workflow import AIWorkflow
+from app.core.metrics import timed
+from app.core.scheduler import ai_pipeline_scheduler
+from app.config.base import global_config
+from app.services.audio_archive_service import archive_audio
+from app.services.reservation_service import reserve_patient, release_patient_reservation
 from app.services.record_service import create_medical_record
-from app.models.schemas import TranscriptionResponse, MedicalRecordCreate
+from app.services.segment_service import create_transcription_segments
+from app.models.schemas import TranscriptionResponse, MedicalRecordCreate, MedicalRecordResponse
 
 
-async def handle_transcription_flow(file: UploadFile) -> TranscriptionResponse:
-        
+def validate_audio_upload(file: UploadFile) -> None:
+    extension = os.path.splitext(file.filename or "")[1].lstrip(".").lower()
+    content_type = (file.content_type or "").split(";")[0].strip().lower()
+    
+    if extension not in global_config.UPLOAD_ALLOWED_EXTENSIONS and not content_type.startswith(("audio/", "video/")):
+        raise HTTPException(
+            status_code=status.HTTP_415_UNSUPPORTED_MEDIA_TYPE,
+            detail=f"Unsupported audio format. Allowed: {', '.join(global_config.UPLOAD_ALLOWED_EXTENSIONS)}"
+        )
+    
+    size = file.size
+    if size is None:
+        file.file.seek(0, os.SEEK_END)
+        size = file.file.tell()
+        file.file.seek(0)
+    
+    if size == 0:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Audio file is empty"
+        )
+    
+    if size > global_config.UPLOAD_MAX_BYTES:
+        raise HTTPException(
+            status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+            detail=f"Audio file exceeds {global_config.UPLOAD_MAX_BYTES} bytes"
+        )
+
+async def save_transcription_record(
+    session: AsyncSession,
+    patient_id: int,
+    response_text: str,
+    response_json: Dict[str, Any],
+    response_segments: List[Dict[str, Any]],
+    reservation_token: str,
+    audio_sha256: Optional[str] = None
+) -> MedicalRecordResponse:
+    record_data = MedicalRecordCreate(
+        patient_id=patient_id,
+        queixa_principal=response_json.get("queixa_principal"),
+        historia_doenca_atual=response_json.get("historia_doenca_atual"),
+        antecedentes=response_json.get("antecedentes"),
+        exame_fisico=response_json.get("exame_fisico"),
+        hipotese_diagnostica=response_json.get("hipotese_diagnostica"),
+        conduta=response_json.get("conduta"),
+        prescricao=response_json.get("prescricao"),
+        encaminhamentos=response_json.get("encaminhamentos"),
+        original_transcription=response_text
+    )
+    try:
+        with timed("db_write"):
+            medical_record = await create_medical_record(session, record_data, audio_sha256)
+            await create_transcription_segments(session, medical_record.id, response_segments)
+            # Liberada na mesma transação do insert do prontuário
+            await release_patient_reservation(reservation_token, session)
+    except BaseException:
+        await release_patient_reservation(reservation_token)
+        raise
+    
+    return medical_record
+
+async def handle_transcription_flow(file: UploadFile, tenant: Optional[str] = None) -> TranscriptionResponse:
+    
+    validate_audio_upload(file)
+    
     aiworkflow = AIWorkflow()
-    response = await aiworkflow.init_aiflow_completion(file)
+    async with ai_pipeline_scheduler.slot(tenant or "anonymous"):
+        with timed("aiflow", aiworkflow.provider.value):
+            response = await aiworkflow.init_aiflow_completion(file)
     
     if not response:
         return TranscriptionResponse(
@@ -16,7 +89,7 @@ async def handle_transcription_flow(file: UploadFile) -> TranscriptionResponse:
             structured={},
         )
     
-    response_text, response_json = response
+    response_text, response_json, _ = response
 
     return TranscriptionResponse(
         original_text=response_text,
@@ -26,35 +99,43 @@ async def handle_transcription_flow(file: UploadFile) -> TranscriptionResponse:
 async def handle_transcription_with_patient(
     session: AsyncSession, 
     file: UploadFile, 
-    patient_id: int
+    patient_id: int,
+    tenant: Optional[str] = None
 ) -> TranscriptionResponse:
     
-    aiworkflow = AIWorkflow()
-    response = await aiworkflow.init_aiflow_completion(file)
+    # Checagens baratas antes de gastar áudio e tokens nos provedores
+    validate_audio_upload(file)
+    with timed("patient_reservation"):
+        reservation_token = await reserve_patient(patient_id)
+    
+    try:
+        aiworkflow = AIWorkflow()
+        async with ai_pipeline_scheduler.slot(tenant or "anonymous"):
+            with timed("aiflow", aiworkflow.provider.value):
+                response = await aiworkflow.init_aiflow_completion(file)
+    except BaseException:
+        await release_patient_reservation(reservation_token)
+        raise
     
     if not response:
+        await release_patient_reservation(reservation_token)
         return TranscriptionResponse(
             original_text="",
             structured={},
         )
 
-    response_text, response_json = response
-    print("\n\n\n response json: ", response_json)
-    print("\n\n\n response text: ",response_text)
-    record_data = MedicalRecordCreate(
-        patient_id=patient_id,
-        queixa_principal=response_json.get("queixa_principal"),
-        historia_doenca_atual=response_json.get("historia_doenca_atual"),
-        antecedentes=response_json.get("antecedentes"),
-        exame_fisico=response_json.get("exame_fisico"),
-        hipotese_diagnostica=response_json.get("hipotese_diagnostica"),
-        conduta=response_json.get("conduta"),
-        prescricao=response_json.get("prescricao"),
-        encaminhamentos=response_json.get("encaminhamentos"),
-        original_transcription=response_text
+    response_text, response_json, response_segments = response
+    # Arquiva só depois do pipeline: falha nos provedores não deixa áudio sem prontuário
+    try:
+        audio_sha256, _ = await archive_audio(file)
+    except BaseException:
+        await release_patient_reservation(reservation_token)
+        raise
+
+    # Se o prontuário não for gravado (aqui ou no commit da rota), o áudio fica para a coleta de lixo
+    medical_record = await save_transcription_record(
+        session, patient_id, response_text, response_json, response_segments, reservation_token, audio_sha256
     )
-    print("\n\n\nrecord data:", record_data)
-    medical_record = await create_medical_record(session, record_data)
     
     return TranscriptionResponse(
         original_text=response_text,
@@ -0,0 +1,371 @@
+import asyncio
+import base64
+import binascii
+import hashlib
+import logging
+import os
+import uuid
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+from typing import AsyncIterator, Awaitable, BinaryIO, Callable, Dict, Optional
+
+from fastapi import HTTPException, UploadFile, status
+from sqlalchemy import and_, delete, func, or_, select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+from starlette.datastructures import Headers
+from starlette.requests import ClientDisconnect
+
+from app.config.base import global_config
+from app.core.metrics import timed
+from app.database.db import get_session_maker
+from app.database.models import Patient, UploadSession
+from app.models.schemas import TranscriptionResponse, UploadSessionCreate, UploadSessionResponse
+
+logger = logging.getLogger(__name__)
+
+STATUS_UPLOADING = "uploading"
+STATUS_FINALIZING = "finalizing"
+STATUS_COMPLETED = "completed"
+
+# Bytes acumulados do corpo do PATCH antes de cada escrita no disco
+UPLOAD_WRITE_BUFFER_BYTES = 1024 * 1024
+
+# Um PATCH por upload de cada vez neste worker; entre workers vale a checagem de offset no banco
+_upload_locks: Dict[str, asyncio.Lock] = {}
+
+
+def _now() -> datetime:
+    return datetime.now(timezone.utc)
+
+
+def _as_utc(value: datetime) -> datetime:
+    return value.replace(tzinfo=timezone.utc) if value.tzinfo is None else value
+
+
+def _upload_path(upload_id: str) -> Path:
+    return Path(global_config.UPLOAD_SESSION_DIR) / f"{upload_id}.part"
+
+
+def _to_response(upload: UploadSession) -> UploadSessionResponse:
+    return UploadSessionResponse(
+        id=upload.id,
+        filename=upload.filename,
+        content_type=upload.content_type,
+        total_size=upload.total_size,
+        offset=upload.offset,
+        patient_id=upload.patient_id,
+        status=upload.status,
+        chunk_size_hint=global_config.UPLOAD_CHUNK_SIZE_HINT,
+        expires_at=upload.expires_at,
+    )
+
+
+def parse_upload_checksum(header: Optional[str]) -> Optional[bytes]:
+    """Header no formato do tus: `Upload-Checksum: sha256 <digest em base64>`."""
+    if not header:
+        return None
+    algorithm, _, encoded = header.strip().partition(" ")
+    if algorithm.lower() != "sha256":
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Only sha256 Upload-Checksum is supported"
+        )
+    try:
+        return base64.b64decode(encoded.strip(), validate=True)
+    except (binascii.Error, ValueError):
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Invalid Upload-Checksum"
+        )
+
+
+async def _get_upload(upload_id: str, user_id: int) -> UploadSession:
+    async with get_session_maker()() as session:
+        result = await session.execute(
+            select(UploadSession).filter(UploadSession.id == upload_id, UploadSession.user_id == user_id)
+        )
+        upload = result.scalar_one_or_none()
+
+    if upload is None or _as_utc(upload.expires_at) <= _now():
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Upload not found"
+        )
+    return upload
+
+
+async def create_upload_session(user_id: int, data: UploadSessionCreate) -> UploadSessionResponse:
+    extension = os.path.splitext(data.filename)[1].lstrip(".").lower()
+    if extension not in global_config.UPLOAD_ALLOWED_EXTENSIONS:
+        raise HTTPException(
+            status_code=status.HTTP_415_UNSUPPORTED_MEDIA_TYPE,
+            detail=f"Unsupported audio format. Allowed: {', '.join(global_config.UPLOAD_ALLOWED_EXTENSIONS)}"
+        )
+
+    if data.total_size <= 0:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Audio file is empty"
+        )
+
+    # O limite do pipeline vale desde o início: não adianta receber 200 MB para recusar no finalize
+    if data.total_size > global_config.UPLOAD_MAX_BYTES:
+        raise HTTPException(
+            status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+            detail=f"Audio file exceeds {global_config.UPLOAD_MAX_BYTES} bytes"
+        )
+
+    upload = UploadSession(
+        id=str(uuid.uuid4()),
+        user_id=user_id,
+        patient_id=data.patient_id,
+        filename=os.path.basename(data.filename),
+        content_type=data.content_type,
+        total_size=data.total_size,
+        offset=0,
+        sha256=data.sha256.lower() if data.sha256 else None,
+        status=STATUS_UPLOADING,
+        expires_at=_now() + timedelta(seconds=global_config.UPLOAD_SESSION_TTL_SECONDS),
+    )
+
+    async with get_session_maker()() as session:
+        if data.patient_id is not None:
+            patient_result = await session.execute(select(Patient.id).filter(Patient.id == data.patient_id))
+            if patient_result.scalar_one_or_none() is None:
+                raise HTTPException(
+                    status_code=status.HTTP_404_NOT_FOUND,
+                    detail="Patient not found"
+                )
+        session.add(upload)
+        await session.commit()
+
+    path = _upload_path(upload.id)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.touch()
+
+    return _to_response(upload)
+
+
+async def get_upload_session(upload_id: str, user_id: int) -> UploadSessionResponse:
+    return _to_response(await _get_upload(upload_id, user_id))
+
+
+async def append_upload_chunk(
+    upload_id: str,
+    user_id: int,
+    offset: int,
+    chunks: AsyncIterator[bytes],
+    checksum: Optional[bytes] = None,
+) -> UploadSessionResponse:
+    """
+    Grava o chunk direto no arquivo a partir de `offset`. Se o checksum não
+    bater ou o cliente cair no meio, o arquivo volta ao último byte confirmado.
+    """
+    async with _upload_locks.setdefault(upload_id, asyncio.Lock()):
+        upload = await _get_upload(upload_id, user_id)
+
+        if upload.status != STATUS_UPLOADING:
+            raise HTTPException(
+                status_code=status.HTTP_409_CONFLICT,
+                detail=f"Upload is {upload.status}"
+            )
+
+        if offset != upload.offset:
+            raise HTTPException(
+                status_code=status.HTTP_409_CONFLICT,
+                detail="Upload-Offset does not match the current offset",
+                headers={"Upload-Offset": str(upload.offset)}
+            )
+
+        path = _upload_path(upload_id)
+        digest = hashlib.sha256()
+        written = 0
+        pending = bytearray()
+        with timed("upload_chunk"), open(path, "r+b") as target:
+            # Escrita, fsync e truncate rodam numa thread: um PATCH de vários MB não trava o event loop
+            target.seek(offset)
+            try:
+                async for chunk in chunks:
+                    if offset + written + len(pending) + len(chunk) > upload.total_size:
+                        raise HTTPException(
+                            status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+                            detail="Chunk goes past Upload-Length"
+                        )
+                    digest.update(chunk)
+                    pending += chunk
+                    if len(pending) >= UPLOAD_WRITE_BUFFER_BYTES:
+                        await asyncio.to_thread(target.write, pending)
+                        written += len(pending)
+                        pending = bytearray()
+
+                if checksum is not None and digest.digest() != checksum:
+                    raise HTTPException(
+                        status_code=status.HTTP_400_BAD_REQUEST,
+                        detail="Chunk checksum mismatch"
+                    )
+                await asyncio.to_thread(_write_and_sync, target, bytes(pending))
+                written += len(pending)
+            except (HTTPException, ClientDisconnect, asyncio.CancelledError):
+                # Sem await: o truncate precisa acontecer mesmo com a tarefa cancelada
+                target.truncate(offset)
+                raise
+            await asyncio.to_thread(target.truncate, offset + written)
+
+        async with get_session_maker()() as session:
+            result = await session.execute(
+                update(UploadSession)
+                .where(UploadSession.id == upload_id, UploadSession.offset == offset)
+                .values(offset=offset + written)
+            )
+            await session.commit()
+
+        if result.rowcount != 1:
+            raise HTTPException(
+                status_code=status.HTTP_409_CONFLICT,
+                detail="Upload was modified concurrently"
+            )
+
+        upload.offset = offset + written
+        return _to_response(upload)
+
+
+def _write_and_sync(target: BinaryIO, data: bytes) -> None:
+    target.write(data)
+    target.flush()
+    os.fsync(target.fileno())
+
+
+def _file_sha256(path: Path, chunk_size: int = 1024 * 1024) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as source:
+        while chunk := source.read(chunk_size):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+async def _set_status(
+    upload_id: str,
+    from_status: str,
+    to_status: str,
+    response_body: Optional[str] = None,
+    session: Optional[AsyncSession] = None,
+) -> bool:
+    condition = UploadSession.status == from_status
+    if from_status == STATUS_UPLOADING:
+        # Finalize abandonado (worker morreu no meio): pode ser retomado depois do prazo da requisição
+        stale_before = _now() - timedelta(seconds=global_config.REQUEST_DEADLINE_SECONDS)
+        condition = or_(condition, and_(
+            UploadSession.status == STATUS_FINALIZING,
+            func.coalesce(UploadSession.updated_at, UploadSession.created_at) < stale_before
+        ))
+
+    statement = (
+        update(UploadSession)
+        .where(UploadSession.id == upload_id, condition)
+        .values(status=to_status, response_body=response_body)
+    )
+    if session is not None:
+        # Mesma transação do insert do prontuário: upload concluído e prontuário gravado juntos
+        result = await session.execute(statement)
+        if result.rowcount != 1:
+            # Outro finalize assumiu o upload: o prontuário desta transação também não é gravado
+            await session.rollback()
+            return False
+        await session.commit()
+        return True
+
+    async with get_session_maker()() as own_session:
+        result = await own_session.execute(statement)
+        await own_session.commit()
+    return result.rowcount == 1
+
+
+async def finalize_upload(
+    upload_id: str,
+    user_id: int,
+    pipeline: Callable[[UploadFile, Optional[int]], Awaitable[TranscriptionResponse]],
+    session: Optional[AsyncSession] = None,
+) -> TranscriptionResponse:
+    """
+    Entrega o arquivo montado ao pipeline de transcrição sem recarregá-lo em
+    memória. Repetir o finalize de um upload concluído devolve o mesmo resultado.
+    """
+    upload = await _get_upload(upload_id, user_id)
+
+    if upload.status == STATUS_COMPLETED and upload.response_body:
+        return TranscriptionResponse.model_validate_json(upload.response_body)
+
+    if upload.offset != upload.total_size:
+        raise HTTPException(
+            status_code=status.HTTP_409_CONFLICT,
+            detail=f"Upload is incomplete: {upload.offset} of {upload.total_size} bytes received",
+            headers={"Upload-Offset": str(upload.offset)}
+        )
+
+    path = _upload_path(upload_id)
+    if upload.sha256:
+        with timed("upload_verify"):
+            actual = await asyncio.to_thread(_file_sha256, path)
+        if actual != upload.sha256:
+            raise HTTPException(
+                status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+                detail="Assembled file does not match the declared sha256"
+            )
+
+    if not await _set_status(upload_id, STATUS_UPLOADING, STATUS_FINALIZING):
+        raise HTTPException(
+            status_code=status.HTTP_409_CONFLICT,
+            detail="Upload is already being finalized"
+        )
+
+    try:
+        with open(path, "rb") as audio:
+            file = UploadFile(
+                file=audio,
+                filename=upload.filename,
+                size=upload.total_size,
+                headers=Headers({"content-type": upload.content_type or "application/octet-stream"}),
+            )
+            response = await pipeline(file, upload.patient_id)
+    except BaseException:
+        # Mantém o arquivo: o cliente pode tentar o finalize de novo
+        await _set_status(upload_id, STATUS_FINALIZING, STATUS_UPLOADING)
+        raise
+
+    if not await _set_status(upload_id, STATUS_FINALIZING, STATUS_COMPLETED, response.model_dump_json(), session):
+        raise HTTPException(
+            status_code=status.HTTP_409_CONFLICT,
+            detail="Upload was taken over by another finalize"
+        )
+    path.unlink(missing_ok=True)
+    _upload_locks.pop(upload_id, None)
+    return response
+
+
+async def delete_upload_session(upload_id: str, user_id: int) -> None:
+    upload = await _get_upload(upload_id, user_id)
+    if upload.status == STATUS_FINALIZING:
+        raise HTTPException(
+            status_code=status.HTTP_409_CONFLICT,
+            detail="Upload is being finalized"
+        )
+
+    async with get_session_maker()() as session:
+        await session.execute(delete(UploadSession).where(UploadSession.id == upload_id))
+        await session.commit()
+    _upload_path(upload_id).unlink(missing_ok=True)
+    _upload_locks.pop(upload_id, None)
+
+
+async def purge_expired_upload_sessions() -> int:
+    async with get_session_maker()() as session:
+        result = await session.execute(select(UploadSession.id).where(UploadSession.expires_at <= _now()))
+        expired_ids = list(result.scalars())
+        if expired_ids:
+            await session.execute(delete(UploadSession).where(UploadSession.id.in_(expired_ids)))
+            await session.commit()
+
+    for upload_id in expired_ids:
+        _upload_path(upload_id).unlink(missing_ok=True)
+        _upload_locks.pop(upload_id, None)
+    return len(expired_ids)
@@ -0,0 +1,135 @@
+from datetime import date, datetime, time, timedelta, timezone
+from typing import Dict, List, Optional, Tuple
+
+from fastapi import HTTPException, status
+from sqlalchemy import case, func, select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.config.base import global_config
+from app.database.models import ProviderUsage, User
+from app.models.schemas import UsageSummary
+
+USAGE_DIMENSIONS = {
+    "user": ProviderUsage.user_id.label("user_id"),
+    "provider": ProviderUsage.provider.label("provider"),
+    "model": ProviderUsage.model.label("model"),
+    "operation": ProviderUsage.operation.label("operation"),
+    "day": func.date(ProviderUsage.created_at).label("day"),
+}
+DEFAULT_USAGE_WINDOW_DAYS = 30
+
+
+def _estimate_cost(model: str, audio_seconds: float, prompt_tokens: int, completion_tokens: int) -> Optional[float]:
+    pricing = global_config.PROVIDER_PRICING.get(model)
+    if pricing is None:
+        return None
+    return (
+        audio_seconds / 3600 * pricing.get("audio_hour", 0.0)
+        + prompt_tokens / 1_000_000 * pricing.get("prompt_million", 0.0)
+        + completion_tokens / 1_000_000 * pricing.get("completion_million", 0.0)
+    )
+
+
+def _day_start(value: date) -> datetime:
+    return datetime.combine(value, time.min, tzinfo=timezone.utc)
+
+
+async def get_usage_summary(
+    session: AsyncSession,
+    current_user: User,
+    group_by: List[str],
+    start: Optional[date] = None,
+    end: Optional[date] = None,
+    user_id: Optional[int] = None,
+) -> List[UsageSummary]:
+    """
+    Consumo agregado dos provedores no intervalo [start, end] (dias em UTC).
+    Usuários fora de USAGE_ADMIN_USERNAMES só enxergam o próprio consumo.
+    """
+    invalid = [name for name in group_by if name not in USAGE_DIMENSIONS]
+    if invalid:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Invalid group_by: {', '.join(invalid)}. Allowed: {', '.join(USAGE_DIMENSIONS)}"
+        )
+
+    if current_user.username not in global_config.USAGE_ADMIN_USERNAMES:
+        if user_id is not None and user_id != current_user.id:
+            raise HTTPException(
+                status_code=status.HTTP_403_FORBIDDEN,
+                detail="Not allowed to read other users' usage"
+            )
+        user_id = current_user.id
+
+    end = end or datetime.now(timezone.utc).date()
+    start = start or end - timedelta(days=DEFAULT_USAGE_WINDOW_DAYS)
+    if start > end:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="start must not be after end"
+        )
+
+    dimensions = list(dict.fromkeys(group_by))
+    # O custo depende do modelo: agrega sempre por modelo e consolida depois
+    sql_dimensions = dimensions if "model" in dimensions else dimensions + ["model"]
+    columns = [USAGE_DIMENSIONS[name] for name in sql_dimensions]
+
+    query = (
+        select(
+            *columns,
+            func.count().label("calls"),
+            # Cancelamento (cliente desconectou, prazo) não é falha do provedor
+            func.sum(case((ProviderUsage.outcome.not_in(("success", "cancelled")), 1), else_=0)).label("errors"),
+            func.sum(case((ProviderUsage.outcome == "cancelled", 1), else_=0)).label("cancelled"),
+            func.coalesce(func.sum(ProviderUsage.audio_seconds), 0.0).label("audio_seconds"),
+            func.coalesce(func.sum(ProviderUsage.prompt_tokens), 0).label("prompt_tokens"),
+            func.coalesce(func.sum(ProviderUsage.completion_tokens), 0).label("completion_tokens"),
+            func.coalesce(func.sum(ProviderUsage.latency_ms), 0).label("latency_ms"),
+            func.coalesce(func.max(ProviderUsage.latency_ms), 0).label("max_latency_ms"),
+        )
+        .filter(ProviderUsage.created_at >= _day_start(start))
+        .filter(ProviderUsage.created_at < _day_start(end + timedelta(days=1)))
+        .group_by(*columns)
+    )
+    if user_id is not None:
+        query = query.filter(ProviderUsage.user_id == user_id)
+
+    result = await session.execute(query)
+
+    groups: Dict[Tuple, Dict] = {}
+    for row in result:
+        key = tuple(getattr(row, USAGE_DIMENSIONS[name].name) for name in dimensions)
+        group = groups.setdefault(key, {
+            "calls": 0, "errors": 0, "cancelled": 0, "audio_seconds": 0.0, "prompt_tokens": 0, "completion_tokens": 0,
+            "latency_ms": 0, "max_latency_ms": 0, "estimated_cost": 0.0,
+        })
+        group["calls"] += row.calls
+        group["errors"] += row.errors
+        group["cancelled"] += row.cancelled
+        group["audio_seconds"] += float(row.audio_seconds)
+        group["prompt_tokens"] += int(row.prompt_tokens)
+        group["completion_tokens"] += int(row.completion_tokens)
+        group["latency_ms"] += int(row.latency_ms)
+        group["max_latency_ms"] = max(group["max_latency_ms"], int(row.max_latency_ms))
+
+        cost = _estimate_cost(row.model, float(row.audio_seconds), int(row.prompt_tokens), int(row.completion_tokens))
+        if cost is None or group["estimated_cost"] is None:
+            group["estimated_cost"] = None
+        else:
+            group["estimated_cost"] += cost
+
+    summaries = []
+    for key, group in groups.items():
+        latency_ms = group.pop("latency_ms")
+        if group["estimated_cost"] is not None:
+            group["estimated_cost"] = round(group["estimated_cost"], 6)
+        summaries.append(UsageSummary(
+            **{USAGE_DIMENSIONS[name].name: value for name, value in zip(dimensions, key)},
+            **group,
+            avg_latency_ms=round(latency_ms / group["calls"], 1),
+        ))
+
+    summaries.sort(key=lambda summary: tuple(
+        str(getattr(summary, USAGE_DIMENSIONS[name].name) or "") for name in dimensions
+    ))
+    return summaries
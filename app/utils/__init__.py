@@ -1,3 +1,9 @@
-from .text_transformers import extract_json_from_text
+from .text_transformers import (
+    extract_json_from_text, extract_segments_from_transcription, parse_structured_fields, find_missing_fields,
+    merge_section_fields
+)
 
-__all__ = ['extract_json_from_text']
\ No newline at end of file
+__all__ = [
+    'extract_json_from_text', 'extract_segments_from_transcription', 'parse_structured_fields', 'find_missing_fields',
+    'merge_section_fields'
+]
@@ -0,0 +1,99 @@
+from typing import List, Optional
+
+# Extensões que podem ser cortadas em bytes: MP3 é uma sequência de frames
+# independentes. Contêineres (webm, m4a, ogg, wav) têm cabeçalho único e não.
+SPLITTABLE_AUDIO_EXTENSIONS = ("mp3", "mpga", "mpeg")
+
+# Bitrates (kbps) por índice 1-14, chaveados por (MPEG-1?, layer)
+_BITRATES = {
+    (True, 1): (32, 64, 96, 128, 160, 192, 224, 256, 288, 320, 352, 384, 416, 448),
+    (True, 2): (32, 48, 56, 64, 80, 96, 112, 128, 160, 192, 224, 256, 320, 384),
+    (True, 3): (32, 40, 48, 56, 64, 80, 96, 112, 128, 160, 192, 224, 256, 320),
+    (False, 1): (32, 48, 56, 64, 80, 96, 112, 128, 144, 160, 176, 192, 224, 256),
+    (False, 2): (8, 16, 24, 32, 40, 48, 56, 64, 80, 96, 112, 128, 144, 160),
+    (False, 3): (8, 16, 24, 32, 40, 48, 56, 64, 80, 96, 112, 128, 144, 160),
+}
+
+# Sample rates por bits de versão: 3 = MPEG-1, 2 = MPEG-2, 0 = MPEG-2.5
+_SAMPLE_RATES = {3: (44100, 48000, 32000), 2: (22050, 24000, 16000), 0: (11025, 12000, 8000)}
+
+
+def _is_frame_header(data: bytes, position: int) -> bool:
+    if position + 4 > len(data) or data[position] != 0xFF:
+        return False
+    second, third = data[position + 1], data[position + 2]
+    return (
+        second & 0xE0 == 0xE0             # sync de 11 bits
+        and (second >> 3) & 0x03 != 0x01  # versão reservada
+        and (second >> 1) & 0x03 != 0x00  # layer reservada
+        and third >> 4 not in (0x00, 0x0F)  # bitrate livre/inválido
+        and (third >> 2) & 0x03 != 0x03   # sample rate reservada
+    )
+
+
+def _frame_length(data: bytes, position: int) -> Optional[int]:
+    if not _is_frame_header(data, position):
+        return None
+    second, third = data[position + 1], data[position + 2]
+    version = (second >> 3) & 0x03
+    layer = 4 - ((second >> 1) & 0x03)
+    mpeg1 = version == 3
+    bitrate = _BITRATES[(mpeg1, layer)][(third >> 4) - 1] * 1000
+    sample_rate = _SAMPLE_RATES[version][(third >> 2) & 0x03]
+    padding = (third >> 1) & 0x01
+
+    if layer == 1:
+        return (12 * bitrate // sample_rate + padding) * 4
+    if layer == 3 and not mpeg1:
+        return 72 * bitrate // sample_rate + padding
+    return 144 * bitrate // sample_rate + padding
+
+
+def _is_frame_start(data: bytes, position: int) -> bool:
+    # Um 0xFFE solto no meio do áudio passa no teste do cabeçalho; um frame
+    # de verdade termina exatamente onde começa o próximo (ou no fim do arquivo)
+    length = _frame_length(data, position)
+    if length is None:
+        return False
+    following = position + length
+    return following == len(data) or _frame_length(data, following) is not None
+
+
+def _id3v2_length(data: bytes) -> int:
+    """Tamanho da tag ID3v2 no início do arquivo (0 se não houver)."""
+    if len(data) < 10 or data[:3] != b"ID3":
+        return 0
+    # Tamanho "syncsafe": 4 bytes de 7 bits, sem contar o cabeçalho de 10 bytes
+    size = 0
+    for byte in data[6:10]:
+        size = (size << 7) | (byte & 0x7F)
+    footer = 10 if data[5] & 0x10 else 0
+    return min(10 + size + footer, len(data))
+
+
+def _next_frame_header(data: bytes, start: int) -> Optional[int]:
+    position = data.find(b"\xff", start)
+    while position != -1:
+        if _is_frame_start(data, position):
+            return position
+        position = data.find(b"\xff", position + 1)
+    return None
+
+
+def split_mp3_frames(data: bytes, chunk_bytes: int) -> List[bytes]:
+    """
+    Corta o MP3 em pedaços de ~chunk_bytes, sempre no início de um frame,
+    para que cada pedaço seja um arquivo decodificável por si só. A tag
+    ID3v2 inicial (capa, metadados) fica no primeiro pedaço e nunca é cortada.
+    """
+    chunks = []
+    start = 0
+    search_from = _id3v2_length(data)
+    while len(data) - search_from > chunk_bytes:
+        cut = _next_frame_header(data, search_from + chunk_bytes)
+        if cut is None:
+            break
+        chunks.append(data[start:cut])
+        start = search_from = cut
+    chunks.append(data[start:])
+    return chunks
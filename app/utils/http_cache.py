@@ -0,0 +1,54 @@
+import hashlib
+from datetime import datetime, timezone
+from email.utils import format_datetime
+from typing import Dict, Optional
+
+from fastapi import Response, status
+
+
+def format_http_date(value: Optional[datetime]) -> Optional[str]:
+    if value is None:
+        return None
+    if value.tzinfo is None:
+        value = value.replace(tzinfo=timezone.utc)
+    return format_datetime(value.astimezone(timezone.utc), usegmt=True)
+
+
+def build_etag(*parts) -> str:
+    raw = '|'.join('' if part is None else str(part) for part in parts)
+    return '"' + hashlib.sha1(raw.encode('utf-8')).hexdigest() + '"'
+
+
+def _strip_weak(etag: str) -> str:
+    return etag[2:] if etag.startswith('W/') else etag
+
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    # Comparação fraca (RFC 9110): proxies que comprimem a resposta trocam o ETag por W/"..."
+    if not if_none_match:
+        return False
+    candidates = [_strip_weak(candidate.strip()) for candidate in if_none_match.split(',')]
+    return '*' in candidates or _strip_weak(etag) in candidates
+
+
+def build_cache_headers(etag: str, last_modified: Optional[datetime]) -> Dict[str, str]:
+    headers = {'ETag': etag, 'Cache-Control': 'private, no-cache'}
+    http_date = format_http_date(last_modified)
+    if http_date:
+        headers['Last-Modified'] = http_date
+    return headers
+
+
+def conditional_response(
+    if_none_match: Optional[str],
+    response: Response,
+    etag: str,
+    last_modified: Optional[datetime]
+) -> Optional[Response]:
+    headers = build_cache_headers(etag, last_modified)
+
+    if etag_matches(if_none_match, etag):
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+
+    response.headers.update(headers)
+    return None
@@ -0,0 +1,18 @@
+import base64
+from datetime import datetime
+from typing import Tuple
+
+
+def encode_cursor(created_at: datetime, record_id: int) -> str:
+    raw = f"{created_at.isoformat()}|{record_id}"
+    return base64.urlsafe_b64encode(raw.encode("utf-8")).decode("ascii").rstrip("=")
+
+
+def decode_cursor(cursor: str) -> Tuple[datetime, int]:
+    # Erros de formato viram ValueError para o chamador responder 400
+    padded = cursor + "=" * (-len(cursor) % 4)
+    try:
+        created_at, record_id = base64.urlsafe_b64decode(padded.encode("ascii")).decode("utf-8").split("|")
+        return datetime.fromisoformat(created_at), int(record_id)
+    except (UnicodeError, ValueError) as error:
+        raise ValueError("Invalid cursor") from error
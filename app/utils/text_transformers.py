@@ -1,5 +1,6 @@
 import re
 import json
+import math
 
 def extract_json_from_text(text):
     try:
@@ -10,4 +11,110 @@ def extract_json_from_text(text):
         return json.loads(json_str)
     except Exception as e:
         print(f'Error on JSON parsing: {e}')
-        raise
\ No newline at end of file
+        raise
+
+def extract_segments_from_transcription(transcription):
+    segments = getattr(transcription, 'segments', None) or []
+    compact_segments = []
+
+    for position, segment in enumerate(segments):
+        if not isinstance(segment, dict):
+            segment = segment.model_dump() if hasattr(segment, 'model_dump') else vars(segment)
+
+        text = str(segment.get('text') or '').strip()
+        if not text:
+            continue
+
+        avg_logprob = segment.get('avg_logprob')
+        confidence = round(math.exp(avg_logprob), 4) if avg_logprob is not None else None
+
+        compact_segments.append({
+            'position': position,
+            'start_time': float(segment.get('start') or 0.0),
+            'end_time': float(segment.get('end') or 0.0),
+            'text': text,
+            'confidence': confidence,
+        })
+
+    return compact_segments
+
+
+def parse_structured_fields(text, fields):
+    """
+    Interpreta a resposta do LLM sem levantar exceção.
+
+    Retorna os campos válidos (strings) e a lista dos campos ausentes ou quebrados.
+    """
+    try:
+        data = extract_json_from_text(text)
+    except Exception:
+        return {}, list(fields)
+
+    if not isinstance(data, dict):
+        return {}, list(fields)
+
+    valid = {}
+    invalid = []
+    for field in fields:
+        value = data.get(field)
+        if isinstance(value, str):
+            valid[field] = value
+        elif isinstance(value, list) and all(isinstance(item, str) for item in value):
+            valid[field] = '\n'.join(value)
+        elif value is None and field in data:
+            valid[field] = ''
+        else:
+            invalid.append(field)
+
+    return valid, invalid
+
+
+def find_missing_fields(text, fields):
+    """
+    Campos cuja chave falta num objeto JSON que, fora isso, é válido: só a
+    transcrição pode preenchê-los. JSON ilegível não tem campos ausentes, só
+    quebrados, e é corrigido a partir da própria resposta.
+    """
+    try:
+        data = extract_json_from_text(text)
+    except Exception:
+        return []
+
+    if not isinstance(data, dict):
+        return []
+
+    return [field for field in fields if field not in data]
+
+
+# Respostas de "seção ausente" que o modelo às vezes escreve em vez de ""
+_ABSENT_SECTION_VALUES = {
+    'não mencionado', 'não mencionada', 'não informado', 'não informada', 'não relatado',
+    'não relatada', 'n/a', '-',
+}
+
+
+def merge_section_fields(sections, fields):
+    """
+    Junta os campos extraídos de trechos consecutivos da consulta.
+
+    Para cada campo mantém os valores não vazios na ordem dos trechos,
+    descartando repetições, valores já contidos em outro (ex.: a mesma
+    queixa citada em dois trechos) e marcadores de seção ausente.
+    """
+    merged = {}
+    for field in fields:
+        kept = []
+        for section in sections:
+            value = str(section.get(field) or '').strip()
+            if not value:
+                continue
+            normalized = ' '.join(value.lower().split())
+            if normalized.rstrip('.') in _ABSENT_SECTION_VALUES:
+                continue
+            if any(normalized in other for other, _ in kept):
+                continue
+            kept = [(other, text) for other, text in kept if other not in normalized]
+            kept.append((normalized, value))
+        merged[field] = '\n'.join(text for _, text in kept)
+
+    return merged
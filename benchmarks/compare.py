@@ -0,0 +1,64 @@
+"""
+Compara dois resultados de benchmark e aponta regressões.
+
+Uso:
+    python -m benchmarks.compare benchmarks/results/antes.json benchmarks/results/depois.json
+"""
+import argparse
+import json
+import sys
+from pathlib import Path
+from typing import Dict, List
+
+# Para latência, maior é pior; para vazão, menor é pior
+METRICS = {"p50_ms": 1, "p95_ms": 1, "p99_ms": 1, "throughput_rps": -1}
+
+
+def compare_results(baseline: Dict, current: Dict, threshold: float = 0.10) -> List[Dict]:
+    rows = []
+    for scenario, current_stats in current["scenarios"].items():
+        baseline_stats = baseline["scenarios"].get(scenario)
+        if not baseline_stats:
+            continue
+        for metric, direction in METRICS.items():
+            before, after = baseline_stats.get(metric, 0.0), current_stats.get(metric, 0.0)
+            change = (after - before) / before if before else 0.0
+            rows.append({
+                "scenario": scenario,
+                "metric": metric,
+                "baseline": before,
+                "current": after,
+                "change": change,
+                "regression": change * direction > threshold,
+            })
+    return rows
+
+
+def print_comparison(rows: List[Dict]) -> None:
+    print(f"\n{'scenario':<16} {'metric':<15} {'baseline':>10} {'current':>10} {'change':>8}")
+    for row in rows:
+        flag = "  REGRESSION" if row["regression"] else ""
+        print(
+            f"{row['scenario']:<16} {row['metric']:<15} {row['baseline']:>10.1f} "
+            f"{row['current']:>10.1f} {row['change']:>+7.1%}{flag}"
+        )
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Compare two benchmark result files")
+    parser.add_argument("baseline", type=Path)
+    parser.add_argument("current", type=Path)
+    parser.add_argument("--regression-threshold", type=float, default=0.10)
+    args = parser.parse_args(argv)
+
+    rows = compare_results(
+        json.loads(args.baseline.read_text()),
+        json.loads(args.current.read_text()),
+        args.regression_threshold,
+    )
+    print_comparison(rows)
+    return 1 if any(row["regression"] for row in rows) else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
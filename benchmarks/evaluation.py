@@ -0,0 +1,324 @@
+"""
+Avaliação offline de provedores e modelos sobre um corpus anonimizado.
+
+Para cada estratégia (Groq, OpenRouter) e modelo candidato, extrai o
+prontuário de cada transcrição do corpus e compara campo a campo com o
+gabarito (F1 de tokens nas oito seções do MedicalRecord). Casos com áudio
+também avaliam os modelos Whisper (WER contra a transcrição de referência).
+Reporta latência, tokens e concordância por campo.
+
+As chamadas passam pelo transporte de gravação/replay
+(benchmarks/provider_replay.py): em replay (padrão, usado na CI) nada sai
+da máquina. A latência de provedor reportada é a gravada no cassete.
+
+Uso:
+    python -m benchmarks.evaluation
+    python -m benchmarks.evaluation --groq-models meta-llama/llama-4-scout-17b-16e-instruct llama-3.3-70b-versatile
+    python -m benchmarks.evaluation --mode missing --openrouter-models openai/gpt-4o openai/gpt-4o-mini
+    python -m benchmarks.evaluation --mode record --upstream stub --cassette benchmarks/fixtures/evaluation/cassettes/stub.json
+    python -m benchmarks.evaluation --min-agreement 0.6
+
+O corpus em benchmarks/fixtures/evaluation é sintético e anonimizado. O
+cassete stub.json foi gravado contra benchmarks.stub_providers (respostas
+fixas): valida o harness na CI, não compara modelos. Gravações de
+provedores reais vão em outro cassete (--cassette ... --mode missing).
+
+Formato do corpus (JSONL, uma consulta por linha):
+    {"id": "...", "transcript": "...", "expected": {"queixa_principal": "...", ...}, "audio": "audio/caso.mp3"}
+O campo "audio" é opcional e relativo ao arquivo do corpus.
+"""
+import argparse
+import asyncio
+import io
+import json
+import os
+import re
+import subprocess
+import sys
+import time
+from collections import Counter
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Dict, List, Optional
+
+ROOT_DIR = Path(__file__).resolve().parent.parent
+RESULTS_DIR = Path(__file__).resolve().parent / "results"
+FIXTURES_DIR = Path(__file__).resolve().parent / "fixtures" / "evaluation"
+DEFAULT_CORPUS = FIXTURES_DIR / "corpus.jsonl"
+DEFAULT_CASSETTE = FIXTURES_DIR / "cassettes" / "stub.json"
+
+# Os clientes exigem uma chave mesmo quando nada sai da máquina
+os.environ.setdefault("GROQ_API_KEY", "replay")
+os.environ.setdefault("OPENROUTER_API_KEY", "replay")
+os.environ.setdefault("SECRET_KEY", "evaluation-secret")
+os.environ.setdefault("USAGE_LEDGER_ENABLED", "false")
+
+_WORD_PATTERN = re.compile(r"\w+", re.UNICODE)
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="HeadMed offline provider/model evaluation")
+    parser.add_argument("--corpus", type=Path, default=DEFAULT_CORPUS)
+    parser.add_argument("--cassette", type=Path, default=DEFAULT_CASSETTE)
+    parser.add_argument("--mode", choices=["replay", "record", "missing"], default="replay")
+    parser.add_argument("--upstream", choices=["live", "stub"], default="live",
+                        help="em record/missing: provedores reais ou benchmarks.stub_providers em processo")
+    parser.add_argument("--groq-models", nargs="*", help="padrão: GROQ_MODEL_ID")
+    parser.add_argument("--openrouter-models", nargs="*", help="padrão: OPENROUTER_MODEL_ID")
+    parser.add_argument("--whisper-models", nargs="*", help="padrão: GROQ_MODEL_TRANSCRIPTION_ID")
+    parser.add_argument("--skip-openrouter", action="store_true")
+    parser.add_argument("--min-agreement", type=float, default=None,
+                        help="falha (exit 1) se a concordância média de algum candidato ficar abaixo")
+    parser.add_argument("--output-dir", type=Path, default=RESULTS_DIR)
+    parser.add_argument("--label", default="")
+    return parser.parse_args(argv)
+
+
+def load_corpus(path: Path) -> List[Dict]:
+    cases = []
+    for line in path.read_text().splitlines():
+        if not line.strip():
+            continue
+        case = json.loads(line)
+        if case.get("audio"):
+            case["audio_path"] = path.parent / case["audio"]
+        cases.append(case)
+    return cases
+
+
+def _tokens(text: Optional[str]) -> List[str]:
+    return _WORD_PATTERN.findall(str(text or "").lower())
+
+
+def token_f1(predicted: Optional[str], expected: Optional[str]) -> float:
+    predicted_tokens, expected_tokens = _tokens(predicted), _tokens(expected)
+    if not predicted_tokens and not expected_tokens:
+        return 1.0
+    if not predicted_tokens or not expected_tokens:
+        return 0.0
+    common = sum((Counter(predicted_tokens) & Counter(expected_tokens)).values())
+    if not common:
+        return 0.0
+    precision = common / len(predicted_tokens)
+    recall = common / len(expected_tokens)
+    return 2 * precision * recall / (precision + recall)
+
+
+def word_error_rate(hypothesis: str, reference: str) -> float:
+    hypothesis_words, reference_words = _tokens(hypothesis), _tokens(reference)
+    if not reference_words:
+        return 0.0 if not hypothesis_words else 1.0
+    # Distância de edição por palavras, uma linha da matriz por vez
+    previous = list(range(len(hypothesis_words) + 1))
+    for i, reference_word in enumerate(reference_words, start=1):
+        current = [i]
+        for j, hypothesis_word in enumerate(hypothesis_words, start=1):
+            current.append(min(
+                previous[j] + 1,
+                current[j - 1] + 1,
+                previous[j - 1] + (reference_word != hypothesis_word),
+            ))
+        previous = current
+    return previous[-1] / len(reference_words)
+
+
+def _summarize_candidate(name: str, model: str, results: List[Dict], metric_fields: List[str]) -> Dict:
+    from benchmarks.stats import summarize
+
+    succeeded = [result for result in results if result["error"] is None]
+    wall = [result["wall_s"] for result in succeeded]
+    provider = [result["provider_ms"] / 1000 for result in succeeded]
+    summary = {
+        "strategy": name,
+        "model": model,
+        "cases": len(results),
+        "errors": len(results) - len(succeeded),
+        "latency": summarize(wall, sum(wall)),
+        "provider_latency": summarize(provider, sum(provider)),
+        "prompt_tokens": sum(result["prompt_tokens"] for result in succeeded),
+        "completion_tokens": sum(result["completion_tokens"] for result in succeeded),
+        "calls": sum(result["calls"] for result in succeeded),
+        "failures": [{"id": result["id"], "error": result["error"]} for result in results if result["error"]],
+    }
+    # Casos com erro contam como zero: um modelo que falha não pode parecer melhor
+    for field in metric_fields:
+        values = [result["scores"].get(field, 0.0) for result in results]
+        summary.setdefault("scores", {})[field] = round(sum(values) / len(values), 4) if values else 0.0
+    return summary
+
+
+async def _evaluate_extraction(name: str, model: str, cases: List[Dict], transport) -> Dict:
+    from app.config.base import global_config
+    from app.infrastructure.ai_workflow import AIWorkflow
+    from app.infrastructure.strategy import AIProvider
+    from app.prompts import MEDICAL_RECORD_FIELDS
+
+    provider = AIProvider(name)
+    setattr(global_config, "GROQ_MODEL_ID" if provider == AIProvider.GROQ else "OPENROUTER_MODEL_ID", model)
+    workflow = AIWorkflow()
+    workflow.provider = provider
+
+    results = []
+    for case in cases:
+        transport.drain()
+        infra = workflow.get_extraction_infra()
+        start = time.perf_counter()
+        error, fields = None, {}
+        try:
+            fields = await infra.extract_json_from_text(case["transcript"])
+        except Exception as exc:
+            error = f"{type(exc).__name__}: {exc}"
+        wall = time.perf_counter() - start
+        exchanges = transport.drain()
+
+        results.append({
+            "id": case["id"],
+            "error": error,
+            "wall_s": wall,
+            "provider_ms": sum(exchange["elapsed_ms"] for exchange in exchanges),
+            "calls": len(exchanges),
+            "prompt_tokens": sum(exchange.get("prompt_tokens", 0) for exchange in exchanges),
+            "completion_tokens": sum(exchange.get("completion_tokens", 0) for exchange in exchanges),
+            "scores": {
+                field: token_f1(fields.get(field), case["expected"].get(field))
+                for field in MEDICAL_RECORD_FIELDS
+            } if error is None else {},
+        })
+
+    return _summarize_candidate(name, model, results, MEDICAL_RECORD_FIELDS)
+
+
+async def _evaluate_transcription(model: str, cases: List[Dict], transport) -> Dict:
+    from fastapi import UploadFile
+    from app.config.base import global_config
+    from app.infrastructure.ai_workflow import AIWorkflow
+
+    global_config.GROQ_MODEL_TRANSCRIPTION_ID = model
+    results = []
+    for case in cases:
+        transport.drain()
+        audio = case["audio_path"].read_bytes()
+        upload = UploadFile(file=io.BytesIO(audio), filename=case["audio_path"].name, size=len(audio))
+        start = time.perf_counter()
+        error, text = None, ""
+        try:
+            text, _ = await AIWorkflow().get_transcription_infra().extract_transcription_from_audio(upload)
+        except Exception as exc:
+            error = f"{type(exc).__name__}: {exc}"
+        wall = time.perf_counter() - start
+        exchanges = transport.drain()
+
+        results.append({
+            "id": case["id"],
+            "error": error,
+            "wall_s": wall,
+            "provider_ms": sum(exchange["elapsed_ms"] for exchange in exchanges),
+            "calls": len(exchanges),
+            "prompt_tokens": 0,
+            "completion_tokens": 0,
+            # Acerto = 1 - WER, na mesma escala (maior é melhor) da extração
+            "scores": {"transcript": max(0.0, 1 - word_error_rate(text, case["transcript"]))} if error is None else {},
+        })
+
+    return _summarize_candidate("whisper", model, results, ["transcript"])
+
+
+def _overall(summary: Dict) -> float:
+    scores = summary.get("scores") or {}
+    return round(sum(scores.values()) / len(scores), 4) if scores else 0.0
+
+
+async def run(args) -> Dict:
+    import httpx
+    from app.config.base import global_config
+    from app.infrastructure.ai_workflow import close_provider_clients
+    from app.infrastructure.strategy import set_provider_transport
+    from benchmarks.provider_replay import RecordReplayTransport
+
+    upstream = None
+    if args.upstream == "stub":
+        from benchmarks.stub_providers import app as stub_app
+        upstream = httpx.ASGITransport(app=stub_app)
+
+    transport = RecordReplayTransport(args.cassette, args.mode, upstream)
+    set_provider_transport(transport)
+    # Clientes já criados não conhecem o transporte
+    await close_provider_clients()
+
+    cases = load_corpus(args.corpus)
+    audio_cases = [case for case in cases if case.get("audio_path")]
+    candidates = []
+    try:
+        for model in args.groq_models or [global_config.GROQ_MODEL_ID]:
+            candidates.append(await _evaluate_extraction("groq", model, cases, transport))
+        if not args.skip_openrouter:
+            for model in args.openrouter_models or [global_config.OPENROUTER_MODEL_ID]:
+                candidates.append(await _evaluate_extraction("openrouter", model, cases, transport))
+        if audio_cases:
+            for model in args.whisper_models or [global_config.GROQ_MODEL_TRANSCRIPTION_ID]:
+                candidates.append(await _evaluate_transcription(model, audio_cases, transport))
+    finally:
+        transport.save()
+        await close_provider_clients()
+        await transport.close_upstream()
+        set_provider_transport(None)
+
+    for summary in candidates:
+        summary["overall"] = _overall(summary)
+    return {"cases": len(cases), "audio_cases": len(audio_cases), "cassette_misses": len(transport.missed_keys),
+            "candidates": candidates}
+
+
+def print_report(results: Dict) -> None:
+    for summary in results["candidates"]:
+        print(f"\n{summary['strategy']:<10} {summary['model']}")
+        print(f"  cases={summary['cases']} errors={summary['errors']} calls={summary['calls']} "
+              f"overall={summary['overall']:.3f}")
+        print(f"  latency p50={summary['latency']['p50_ms']:.1f}ms p95={summary['latency']['p95_ms']:.1f}ms   "
+              f"provider (gravada) p50={summary['provider_latency']['p50_ms']:.1f}ms "
+              f"p95={summary['provider_latency']['p95_ms']:.1f}ms")
+        if summary["prompt_tokens"] or summary["completion_tokens"]:
+            print(f"  tokens prompt={summary['prompt_tokens']} completion={summary['completion_tokens']}")
+        for field, score in summary["scores"].items():
+            print(f"    {field:<24} {score:.3f}")
+        for failure in summary["failures"]:
+            print(f"  ! {failure['id']}: {failure['error']}")
+    if results["cassette_misses"]:
+        print(f"\n{results['cassette_misses']} requests had no recording; run with --mode missing to record them")
+
+
+def main(argv=None) -> int:
+    args = parse_args(argv)
+    results = asyncio.run(run(args))
+    print_report(results)
+
+    try:
+        commit = subprocess.check_output(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT_DIR, text=True).strip()
+    except (OSError, subprocess.CalledProcessError):
+        commit = "unknown"
+
+    args.output_dir.mkdir(parents=True, exist_ok=True)
+    report = {
+        "timestamp": datetime.now(timezone.utc).isoformat(),
+        "commit": commit,
+        "label": args.label,
+        "corpus": str(args.corpus),
+        "cassette": str(args.cassette),
+        "mode": args.mode,
+        **results,
+    }
+    output_path = args.output_dir / f"evaluation-{datetime.now():%Y%m%d-%H%M%S}-{commit}.json"
+    output_path.write_text(json.dumps(report, indent=2, ensure_ascii=False))
+    print(f"\nResults saved to {output_path}")
+
+    if results["cassette_misses"] and args.mode == "replay":
+        return 1
+    if args.min_agreement is not None and any(
+        summary["overall"] < args.min_agreement for summary in results["candidates"]
+    ):
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,152 @@
+"""
+Transporte httpx que grava e reproduz as chamadas aos provedores (Groq e
+OpenRouter) num cassete JSON, para avaliar modelos sem acessar serviços reais.
+
+Modos:
+    replay   só responde do cassete; requisição sem gravação é um erro
+    record   chama o provedor (ou o upstream informado) e grava/atualiza o cassete
+    missing  responde do cassete e só chama o provedor para o que falta
+
+A chave de cada interação é o hash do método, do caminho e do corpo da
+requisição (JSON canônico; no multipart, sem boundary e nome do arquivo
+temporário). Headers, incluindo Authorization, nunca são gravados.
+"""
+import hashlib
+import json
+import re
+import time
+from pathlib import Path
+from typing import Dict, List, Optional, Set
+
+import httpx
+
+MODES = ("replay", "record", "missing")
+CASSETTE_VERSION = 1
+
+_FILENAME_PATTERN = re.compile(rb'filename="[^"]*"')
+
+
+class CassetteMiss(Exception):
+    """Requisição sem gravação no cassete durante o replay."""
+
+
+def request_key(request: httpx.Request, body: bytes) -> str:
+    content_type = request.headers.get("content-type", "")
+    if content_type.startswith("application/json"):
+        try:
+            body = json.dumps(json.loads(body), sort_keys=True, ensure_ascii=False).encode()
+        except ValueError:
+            pass
+    elif content_type.startswith("multipart/form-data"):
+        boundary = content_type.partition("boundary=")[2].strip('"')
+        if boundary:
+            body = body.replace(boundary.encode(), b"BOUNDARY")
+        body = _FILENAME_PATTERN.sub(b'filename="audio"', body)
+
+    digest = hashlib.sha256()
+    digest.update(request.method.encode())
+    digest.update(request.url.path.encode())
+    digest.update(body)
+    return digest.hexdigest()
+
+
+def _usage(body: str) -> Dict[str, int]:
+    try:
+        usage = json.loads(body).get("usage") or {}
+    except (ValueError, AttributeError):
+        return {}
+    return {kind: usage[kind] for kind in ("prompt_tokens", "completion_tokens") if isinstance(usage.get(kind), int)}
+
+
+class RecordReplayTransport(httpx.AsyncBaseTransport):
+
+    def __init__(
+        self,
+        cassette_path: Path,
+        mode: str = "replay",
+        upstream: Optional[httpx.AsyncBaseTransport] = None,
+    ):
+        if mode not in MODES:
+            raise ValueError(f"Unknown mode {mode!r}, expected one of {MODES}")
+        self.cassette_path = cassette_path
+        self.mode = mode
+        self.upstream = upstream or httpx.AsyncHTTPTransport()
+        self.interactions: Dict[str, Dict] = {}
+        if cassette_path.exists():
+            cassette = json.loads(cassette_path.read_text())
+            self.interactions = cassette.get("interactions", {})
+        # Chamadas desde o último drain(): latência gravada, tokens e se veio do cassete
+        self.exchanges: List[Dict] = []
+        # Chaves sem gravação (o SDK da Groq repete a requisição, então conta cada chave uma vez)
+        self.missed_keys: Set[str] = set()
+        self._dirty = False
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        body = await request.aread()
+        key = request_key(request, body)
+        interaction = self.interactions.get(key) if self.mode != "record" else None
+
+        if interaction is None:
+            if self.mode == "replay":
+                self.missed_keys.add(key)
+                raise CassetteMiss(f"No recording for {request.method} {request.url.path} ({key[:12]})")
+            interaction = await self._record(request, key)
+            replayed = False
+        else:
+            replayed = True
+
+        self.exchanges.append({
+            "path": interaction["path"],
+            "status": interaction["status"],
+            "elapsed_ms": interaction["elapsed_ms"],
+            "replayed": replayed,
+            **_usage(interaction["body"]),
+        })
+        return httpx.Response(
+            status_code=interaction["status"],
+            headers={"content-type": interaction["content_type"]},
+            content=interaction["body"].encode(),
+            request=request,
+        )
+
+    async def _record(self, request: httpx.Request, key: str) -> Dict:
+        start = time.perf_counter()
+        response = await self.upstream.handle_async_request(request)
+        content = await response.aread()
+        elapsed_ms = round((time.perf_counter() - start) * 1000, 1)
+        await response.aclose()
+
+        interaction = {
+            "method": request.method,
+            "path": request.url.path,
+            "status": response.status_code,
+            "content_type": response.headers.get("content-type", "application/json"),
+            "body": content.decode("utf-8", errors="replace"),
+            "elapsed_ms": elapsed_ms,
+        }
+        # Erros transitórios (429/5xx) não viram gravação: o replay refaria a falha para sempre
+        if response.status_code < 500 and response.status_code != 429:
+            self.interactions[key] = interaction
+            self._dirty = True
+        return interaction
+
+    def drain(self) -> List[Dict]:
+        exchanges, self.exchanges = self.exchanges, []
+        return exchanges
+
+    def save(self) -> None:
+        if not self._dirty:
+            return
+        self.cassette_path.parent.mkdir(parents=True, exist_ok=True)
+        cassette = {"version": CASSETTE_VERSION, "interactions": dict(sorted(self.interactions.items()))}
+        temp_path = self.cassette_path.with_suffix(self.cassette_path.suffix + ".tmp")
+        temp_path.write_text(json.dumps(cassette, indent=2, ensure_ascii=False))
+        temp_path.replace(self.cassette_path)
+        self._dirty = False
+
+    async def aclose(self) -> None:
+        # Compartilhado entre os clientes da Groq e da OpenRouter: fechar um não fecha o upstream
+        pass
+
+    async def close_upstream(self) -> None:
+        await self.upstream.aclose()
@@ -0,0 +1,26 @@
+from typing import Dict, List
+
+
+def percentile(sorted_values: List[float], fraction: float) -> float:
+    if not sorted_values:
+        return 0.0
+    # Interpolação linear entre as posições vizinhas
+    position = (len(sorted_values) - 1) * fraction
+    lower = int(position)
+    upper = min(lower + 1, len(sorted_values) - 1)
+    return sorted_values[lower] + (sorted_values[upper] - sorted_values[lower]) * (position - lower)
+
+
+def summarize(latencies: List[float], elapsed_seconds: float) -> Dict[str, float]:
+    ordered = sorted(latencies)
+    count = len(ordered)
+    return {
+        "requests": count,
+        "elapsed_s": round(elapsed_seconds, 3),
+        "throughput_rps": round(count / elapsed_seconds, 2) if elapsed_seconds else 0.0,
+        "mean_ms": round(sum(ordered) / count * 1000, 2) if count else 0.0,
+        "p50_ms": round(percentile(ordered, 0.50) * 1000, 2),
+        "p95_ms": round(percentile(ordered, 0.95) * 1000, 2),
+        "p99_ms": round(percentile(ordered, 0.99) * 1000, 2),
+        "max_ms": round(ordered[-1] * 1000, 2) if count else 0.0,
+    }
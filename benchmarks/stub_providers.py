@@ -0,0 +1,129 @@
+"""
+Servidor local que imita as APIs da Groq e da OpenRouter para benchmarks.
+
+Configuração via variáveis de ambiente:
+    STUB_LATENCY_MS           latência base de cada chamada (padrão 200)
+    STUB_LATENCY_JITTER_MS    variação uniforme somada à latência (padrão 50)
+    STUB_TRANSCRIPTION_MS     latência extra da transcrição (padrão 800)
+    STUB_ERROR_RATE           fração de respostas 500 (padrão 0.0)
+    STUB_RATE_LIMIT_RATE      fração de respostas 429 com Retry-After (padrão 0.0)
+    STUB_SEED                 semente do gerador aleatório (padrão 42)
+
+Uso:
+    uvicorn benchmarks.stub_providers:app --port 9100
+"""
+import asyncio
+import json
+import os
+import random
+import time
+
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse
+
+LATENCY_MS = float(os.getenv("STUB_LATENCY_MS", "200"))
+LATENCY_JITTER_MS = float(os.getenv("STUB_LATENCY_JITTER_MS", "50"))
+TRANSCRIPTION_MS = float(os.getenv("STUB_TRANSCRIPTION_MS", "800"))
+ERROR_RATE = float(os.getenv("STUB_ERROR_RATE", "0.0"))
+RATE_LIMIT_RATE = float(os.getenv("STUB_RATE_LIMIT_RATE", "0.0"))
+
+_random = random.Random(int(os.getenv("STUB_SEED", "42")))
+
+TRANSCRIPTION_SEGMENTS = [
+    (0.0, 4.2, "Paciente relata dor de cabeça há três dias."),
+    (4.2, 9.8, "Nega febre, refere náuseas pela manhã."),
+    (9.8, 15.1, "Pressão arterial doze por oito, sem alterações no exame neurológico."),
+    (15.1, 21.0, "Hipótese de enxaqueca, prescrevo dipirona e retorno em quinze dias."),
+]
+
+MEDICAL_RECORD_JSON = {
+    "queixa_principal": "Cefaleia há três dias",
+    "historia_doenca_atual": "Dor de cabeça há três dias, náuseas matinais, sem febre.",
+    "antecedentes": "Nega comorbidades.",
+    "exame_fisico": "PA 120x80 mmHg, exame neurológico sem alterações.",
+    "hipotese_diagnostica": "Enxaqueca",
+    "conduta": "Analgesia e retorno em 15 dias.",
+    "prescricao": "Dipirona 500 mg de 6/6h se dor.",
+    "encaminhamentos": "",
+}
+
+app = FastAPI(title="HeadMed provider stubs")
+app.state.calls = {"transcription": 0, "completion": 0, "rate_limited": 0, "errors": 0}
+
+
+async def _simulate(extra_ms: float = 0.0):
+    delay_ms = LATENCY_MS + extra_ms + _random.uniform(0, LATENCY_JITTER_MS)
+    await asyncio.sleep(delay_ms / 1000)
+
+    roll = _random.random()
+    if roll < RATE_LIMIT_RATE:
+        app.state.calls["rate_limited"] += 1
+        return JSONResponse(
+            status_code=429,
+            headers={"Retry-After": "0.1"},
+            content={"error": {"message": "Rate limit reached", "type": "rate_limit_exceeded"}},
+        )
+    if roll < RATE_LIMIT_RATE + ERROR_RATE:
+        app.state.calls["errors"] += 1
+        return JSONResponse(
+            status_code=500,
+            content={"error": {"message": "Internal server error", "type": "server_error"}},
+        )
+    return None
+
+
+def _completion_payload(model: str) -> dict:
+    return {
+        "id": f"chatcmpl-stub-{time.time_ns()}",
+        "object": "chat.completion",
+        "created": int(time.time()),
+        "model": model,
+        "choices": [
+            {
+                "index": 0,
+                "finish_reason": "stop",
+                "message": {"role": "assistant", "content": json.dumps(MEDICAL_RECORD_JSON, ensure_ascii=False)},
+            }
+        ],
+        "usage": {"prompt_tokens": 420, "completion_tokens": 180, "total_tokens": 600},
+    }
+
+
+@app.post("/openai/v1/audio/transcriptions")
+async def groq_transcription(request: Request):
+    form = await request.form()
+    failure = await _simulate(TRANSCRIPTION_MS)
+    if failure:
+        return failure
+
+    app.state.calls["transcription"] += 1
+    return {
+        "text": " ".join(text for _, _, text in TRANSCRIPTION_SEGMENTS),
+        "language": form.get("language", "pt"),
+        "duration": TRANSCRIPTION_SEGMENTS[-1][1],
+        "segments": [
+            {"id": index, "start": start, "end": end, "text": f" {text}", "avg_logprob": -0.2, "no_speech_prob": 0.01}
+            for index, (start, end, text) in enumerate(TRANSCRIPTION_SEGMENTS)
+        ],
+    }
+
+
+@app.post("/openai/v1/chat/completions")
+async def groq_completion(request: Request):
+    body = await request.json()
+    failure = await _simulate()
+    if failure:
+        return failure
+
+    app.state.calls["completion"] += 1
+    return _completion_payload(body.get("model", "stub"))
+
+
+@app.post("/api/v1/chat/completions")
+async def openrouter_completion(request: Request):
+    return await groq_completion(request)
+
+
+@app.get("/stats")
+async def stats():
+    return app.state.calls
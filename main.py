@@ -1,23 +1,42 @@
 from contextlib import asynccontextmanager
-from fastapi import FastAPI
+from fastapi import FastAPI, Response
 from fastapi.middleware.cors import CORSMiddleware
 import logging
 
+from app.config.base import global_config
+from app.core.metrics import render_metrics
+from app.core.middleware import ServerTimingMiddleware
+from app.core.security import get_secret_key
+from app.core.usage_ledger import usage_ledger
+from app.database.db import warm_up_pools, dispose_engines
+from app.infrastructure.ai_workflow import close_provider_clients
+from app.services.idempotency_service import purge_expired_idempotency_keys
+from app.services.upload_service import purge_expired_upload_sessions
+
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
+    # O schema é gerenciado por `python -m app.database.migrate`, não pelo startup
     logger.info("Starting application...")
+    app.state.ready = False
+    get_secret_key()
+    await warm_up_pools(global_config.DATABASE_POOL_WARM_CONNECTIONS)
+    purged = await purge_expired_idempotency_keys()
+    logger.info(f"Purged {purged} expired idempotency keys")
+    purged = await purge_expired_upload_sessions()
+    logger.info(f"Purged {purged} expired upload sessions")
+    usage_ledger.start()
+    app.state.ready = True
+    logger.info("Database pools warmed up, application ready")
     try:
-        from app.database.db import create_tables
-        await create_tables()
-        logger.info("Database tables created successfully")
-        yield
-    except Exception as e:
-        logger.error(f"Error during startup: {e}")
         yield
     finally:
+        app.state.ready = False
+        await usage_ledger.stop()
+        await close_provider_clients()
+        await dispose_engines()
         logger.info("Application shutdown complete")
 
 app = FastAPI(
@@ -35,6 +54,13 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+app.add_middleware(ServerTimingMiddleware)
+
+@app.get("/metrics", include_in_schema=False)
+async def metrics():
+    content, content_type = render_metrics()
+    return Response(content=content, media_type=content_type)
+
 @app.get("/")
 async def root():
     return {
@@ -44,17 +70,5 @@ async def root():
         "health": "/api/v1/health"
     }
 
-try:
-    from app.api.v1.routes import router as api_router
-    app.include_router(api_router, prefix="/api/v1", tags=["API v1"])
-    logger.info("API routes loaded successfully")
-except Exception as e:
-    logger.error(f"Error loading API routes: {e}")
-    from fastapi import APIRouter
-    fallback_router = APIRouter()
-    
-    @fallback_router.get("/health")
-    async def health_check():
-        return {"status": "OK", "message": "Server is running (fallback mode)"}
-    
-    app.include_router(fallback_router, prefix="/api/v1")
\ No newline at end of file
+from app.api.v1.routes import router as api_router
+app.include_router(api_router, prefix="/api/v1", tags=["API v1"])
\ No newline at end of file
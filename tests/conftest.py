@@ -0,0 +1,13 @@
+import os
+import sys
+import tempfile
+from pathlib import Path
+
+# Banco SQLite descartável e configuração mínima antes de importar a aplicação
+_DB_DIR = tempfile.mkdtemp(prefix="headmed-tests-")
+os.environ.setdefault("DATABASE_URL", f"sqlite+aiosqlite:///{Path(_DB_DIR) / 'test.sqlite'}")
+os.environ.setdefault("SECRET_KEY", "test-secret")
+os.environ.setdefault("GROQ_API_KEY", "test")
+os.environ.setdefault("USAGE_LEDGER_ENABLED", "false")
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
@@ -0,0 +1,154 @@
+import asyncio
+import io
+from types import SimpleNamespace
+
+import pytest
+from fastapi import HTTPException, UploadFile
+from starlette.datastructures import Headers
+
+from app.config.base import global_config
+from app.infrastructure.ai_workflow import AIWorkflow
+from app.prompts import PROMPT_MEDICAL_SECTION
+
+
+class FakeTranscriptionInfra:
+    def __init__(self, failures):
+        # Quantas vezes cada pedaço falha antes de transcrever
+        self.failures = dict(failures)
+
+    async def invoke_model_transcription(self, file):
+        audio = (await file.read()).decode()
+        if self.failures.get(audio, 0) > 0:
+            self.failures[audio] -= 1
+            raise RuntimeError("provider unavailable")
+        return SimpleNamespace(text=audio, duration=1.0, segments=[])
+
+    async def extract_transcription_from_audio(self, file):
+        return "consulta completa", []
+
+
+class FakeExtractionInfra:
+    def __init__(self, failing_text=None):
+        self.failing_text = failing_text
+        self.section_texts = []
+        self.full_texts = []
+
+    async def extract_medical_record(self, transcription_text, prompt_template=None):
+        assert prompt_template is PROMPT_MEDICAL_SECTION
+        self.section_texts.append(transcription_text)
+        if transcription_text == self.failing_text:
+            raise ValueError("invalid JSON")
+        return {"queixa_principal": transcription_text, "conduta": "Não mencionado"}
+
+    async def extract_json_from_text(self, transcription_text):
+        self.full_texts.append(transcription_text)
+        return {"queixa_principal": "completa"}
+
+
+class FakeWorkflow(AIWorkflow):
+    def __init__(self, transcription, extraction):
+        super().__init__()
+        self.transcription = transcription
+        self.extraction = extraction
+
+    def get_transcription_infra(self):
+        return self.transcription
+
+    def get_extraction_infra(self):
+        return self.extraction
+
+    async def _split_audio(self, file):
+        return [b"a", b"b", b"c"]
+
+
+def _upload():
+    return UploadFile(
+        file=io.BytesIO(b"abc"), filename="consulta.mp3", size=3, headers=Headers({"content-type": "audio/mpeg"})
+    )
+
+
+async def sequential(file):
+    return "sequencial", {"queixa_principal": "sequencial"}, []
+
+
+def _run(workflow, monkeypatch):
+    monkeypatch.setattr(global_config, "AIFLOW_PIPELINED", True)
+    monkeypatch.setattr(global_config, "AIFLOW_CHUNK_RETRY_BACKOFF_SECONDS", 0)
+    monkeypatch.setattr(workflow, "_init_aiflow_sequential", sequential)
+    return asyncio.run(workflow.init_aiflow_completion(_upload()))
+
+
+def test_chunk_transcription_is_retried(monkeypatch):
+    workflow = FakeWorkflow(FakeTranscriptionInfra({"b": 1}), FakeExtractionInfra())
+
+    text, fields, _ = _run(workflow, monkeypatch)
+
+    assert text == "a b c"
+    assert fields["queixa_principal"] == "a\nb\nc"
+    assert fields["conduta"] == ""
+
+
+def test_chunk_transcription_failure_falls_back_to_sequential(monkeypatch):
+    workflow = FakeWorkflow(FakeTranscriptionInfra({"b": 5}), FakeExtractionInfra())
+
+    text, _, _ = _run(workflow, monkeypatch)
+
+    assert text == "sequencial"
+
+
+def test_chunk_extraction_failure_extracts_full_transcript(monkeypatch):
+    extraction = FakeExtractionInfra(failing_text="b")
+    workflow = FakeWorkflow(FakeTranscriptionInfra({}), extraction)
+
+    _, fields, _ = _run(workflow, monkeypatch)
+
+    assert extraction.full_texts == ["a b c"]
+    assert fields == {"queixa_principal": "completa"}
+
+
+class DeadlineTranscriptionInfra(FakeTranscriptionInfra):
+    def __init__(self):
+        super().__init__({})
+        self.calls = 0
+
+    async def invoke_model_transcription(self, file):
+        self.calls += 1
+        raise HTTPException(status_code=504, detail="Processing exceeded its time budget during transcription")
+
+
+def test_deadline_is_not_retried_nor_sent_to_sequential(monkeypatch):
+    transcription = DeadlineTranscriptionInfra()
+    workflow = FakeWorkflow(transcription, FakeExtractionInfra())
+    monkeypatch.setattr(global_config, "AIFLOW_CHUNK_MAX_ATTEMPTS", 3)
+
+    with pytest.raises(HTTPException) as error:
+        _run(workflow, monkeypatch)
+
+    assert error.value.status_code == 504
+    # No máximo uma tentativa por pedaço
+    assert transcription.calls <= 3
+
+
+class CountingExtractionInfra(FakeExtractionInfra):
+    def __init__(self):
+        super().__init__()
+        self.in_flight = 0
+        self.peak = 0
+
+    async def extract_medical_record(self, transcription_text, prompt_template=None):
+        self.in_flight += 1
+        self.peak = max(self.peak, self.in_flight)
+        await asyncio.sleep(0.01)
+        self.in_flight -= 1
+        return await super().extract_medical_record(transcription_text, prompt_template)
+
+
+def test_chunk_extractions_are_bounded(monkeypatch):
+    extraction = CountingExtractionInfra()
+    workflow = FakeWorkflow(FakeTranscriptionInfra({}), extraction)
+    monkeypatch.setattr(global_config, "AIFLOW_MAX_PARALLEL_CHUNKS", 1)
+
+    text, _, _ = _run(workflow, monkeypatch)
+
+    assert text == "a b c"
+    assert extraction.peak == 1
@@ -0,0 +1,58 @@
+import asyncio
+import io
+import os
+import time
+from datetime import date
+
+from fastapi import UploadFile
+
+from app.config.base import global_config
+from app.database import migrate
+from app.database.db import dispose_engines, get_session_maker
+from app.database.models import MedicalRecord, Patient
+from app.services.audio_archive_service import archive_audio, collect_unreferenced_audio, find_archived_audio
+
+
+def _upload(content):
+    return UploadFile(file=io.BytesIO(content), filename="consulta.mp3")
+
+
+def _age(sha256, seconds):
+    path = find_archived_audio(sha256)
+    past = time.time() - seconds
+    os.utime(path, (past, past))
+
+
+def test_gc_removes_only_old_unreferenced_audio(monkeypatch, tmp_path):
+    monkeypatch.setattr(global_config, "AUDIO_ARCHIVE_ENABLED", True)
+    monkeypatch.setattr(global_config, "AUDIO_ARCHIVE_DIR", str(tmp_path))
+
+    async def scenario():
+        await migrate.run_migrations()
+        referenced, _ = await archive_audio(_upload(b"referenced"))
+        orphan, _ = await archive_audio(_upload(b"orphan"))
+        recent, _ = await archive_audio(_upload(b"recent"))
+        deduplicated, _ = await archive_audio(_upload(b"deduplicated"))
+        for sha256 in (referenced, orphan, deduplicated):
+            _age(sha256, 7200)
+        # Outra requisição acabou de deduplicar contra o arquivo antigo
+        _, created = await archive_audio(_upload(b"deduplicated"))
+
+        async with get_session_maker()() as session:
+            patient = Patient(nome="Paciente Áudio", cpf="00000000392", data_nascimento=date(1970, 7, 7))
+            session.add(patient)
+            await session.flush()
+            session.add(MedicalRecord(patient_id=patient.id, audio_sha256=referenced))
+            await session.commit()
+
+            removed = await collect_unreferenced_audio(session, grace_seconds=3600)
+        await dispose_engines()
+        return removed, created, referenced, orphan, recent, deduplicated
+
+    removed, created, referenced, orphan, recent, deduplicated = asyncio.run(scenario())
+
+    assert removed == 1
+    assert created is False
+    assert find_archived_audio(orphan) is None
+    for sha256 in (referenced, recent, deduplicated):
+        assert find_archived_audio(sha256) is not None
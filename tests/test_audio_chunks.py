@@ -0,0 +1,41 @@
+from app.utils.audio_chunks import split_mp3_frames
+
+# MPEG-1 Layer III, 128 kbps, 44.1 kHz, sem padding: frames de 417 bytes
+HEADER = b"\xff\xfb\x90\x00"
+FRAME_LENGTH = 417
+
+
+def _frame(payload=b""):
+    body = payload + b"\x00" * (FRAME_LENGTH - len(HEADER) - len(payload))
+    return HEADER + body
+
+
+def _id3(payload):
+    size = len(payload)
+    syncsafe = bytes((size >> shift) & 0x7F for shift in (21, 14, 7, 0))
+    return b"ID3\x04\x00\x00" + syncsafe + payload
+
+
+def test_cuts_only_at_verified_frame_starts():
+    # Um cabeçalho falso no meio do áudio, logo depois do ponto de corte
+    frames = [_frame() for _ in range(6)]
+    frames[1] = _frame(b"\x00" * 60 + HEADER)
+    data = b"".join(frames)
+
+    chunks = split_mp3_frames(data, FRAME_LENGTH + 50)
+
+    assert b"".join(chunks) == data
+    assert all(len(chunk) % FRAME_LENGTH == 0 for chunk in chunks)
+    assert len(chunks) == 3
+
+
+def test_leading_id3_tag_is_never_cut():
+    tag = _id3(HEADER * 300)
+    data = tag + b"".join(_frame() for _ in range(4))
+
+    chunks = split_mp3_frames(data, FRAME_LENGTH)
+
+    assert b"".join(chunks) == data
+    assert chunks[0].startswith(tag)
+    assert len(chunks[0]) - len(tag) >= FRAME_LENGTH
+    assert all(chunk.startswith(HEADER) for chunk in chunks[1:])
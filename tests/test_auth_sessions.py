@@ -0,0 +1,75 @@
+import asyncio
+from datetime import timedelta
+
+import httpx
+from fastapi import FastAPI
+
+from app.api.v1.routes import router
+from app.core.security import create_access_token
+from app.database import db, migrate
+from app.database.db import dispose_engines, get_session_maker
+from app.database.models import User
+
+
+def _app():
+    app = FastAPI()
+    app.include_router(router, prefix="/api/v1")
+    return app
+
+
+def _counting(factory, opened):
+    def wrapper():
+        maker = factory()
+
+        def open_session():
+            opened.append(factory.__name__)
+            return maker()
+        return open_session
+    return wrapper
+
+
+def test_write_route_authenticates_on_the_route_session(monkeypatch):
+    async def scenario():
+        await migrate.run_migrations()
+        async with get_session_maker()() as session:
+            user = User(username="auth-single-session", hashed_password="x")
+            session.add(user)
+            await session.commit()
+            user_id = user.id
+
+        opened = []
+        monkeypatch.setattr(db, "get_session_maker", _counting(db.get_session_maker, opened))
+        monkeypatch.setattr(db, "get_read_session_maker", _counting(db.get_read_session_maker, opened))
+
+        token = create_access_token({"sub": "auth-single-session", "uid": user_id})
+        transport = httpx.ASGITransport(app=_app())
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+            response = await client.post(
+                "/api/v1/patients",
+                json={"nome": "Paciente Sessão", "cpf": "00000000271", "data_nascimento": "1990-01-01"},
+                headers={"Authorization": f"Bearer {token}"},
+            )
+
+        monkeypatch.undo()
+        await dispose_engines()
+        return response, opened
+
+    response, opened = asyncio.run(scenario())
+
+    assert response.status_code == 200
+    assert opened == ["get_session_maker"]
+
+
+def test_pin_survives_token_refresh():
+    first = create_access_token({"sub": "pin-user", "uid": 27})
+    refreshed = create_access_token({"sub": "pin-user", "uid": 27}, expires_delta=timedelta(minutes=5))
+    assert first != refreshed
+
+    def request(token):
+        scope = {"type": "http", "headers": [(b"authorization", f"Bearer {token}".encode())]}
+        return db.Request(scope)
+
+    db.pin_to_primary(db._get_pin_key(request(first)))
+
+    assert db.is_pinned_to_primary(db._get_pin_key(request(refreshed)))
+    assert not db.is_pinned_to_primary(db._get_pin_key(request("not-a-token")))
@@ -0,0 +1,61 @@
+import httpx
+import pytest
+
+from benchmarks.evaluation import token_f1, word_error_rate
+from benchmarks.provider_replay import request_key
+
+
+def test_token_f1():
+    assert token_f1("Cefaleia há três dias", "cefaleia HÁ três dias.") == 1.0
+    assert token_f1("", None) == 1.0
+    assert token_f1("dipirona", "") == 0.0
+    assert token_f1("dipirona", "paracetamol") == 0.0
+    # 2 tokens em comum: precisão 2/3, recall 2/4
+    assert token_f1("paracetamol 750 mg", "paracetamol 750 miligramas oral") == pytest.approx(4 / 7)
+
+
+def test_word_error_rate():
+    assert word_error_rate("paciente com febre", "Paciente com febre.") == 0.0
+    assert word_error_rate("paciente febre", "paciente com febre") == pytest.approx(1 / 3)
+    assert word_error_rate("paciente sem febre alta", "paciente com febre") == pytest.approx(2 / 3)
+    assert word_error_rate("", "") == 0.0
+    assert word_error_rate("ruído", "") == 1.0
+
+
+def _multipart(boundary, filename):
+    body = (
+        f"--{boundary}\r\n"
+        f'Content-Disposition: form-data; name="file"; filename="{filename}"\r\n'
+        "Content-Type: audio/mpeg\r\n\r\n"
+        "audio\r\n"
+        f"--{boundary}\r\n"
+        'Content-Disposition: form-data; name="model"\r\n\r\n'
+        "whisper-large-v3-turbo\r\n"
+        f"--{boundary}--\r\n"
+    ).encode()
+    request = httpx.Request(
+        "POST", "https://api.groq.com/openai/v1/audio/transcriptions",
+        headers={"content-type": f"multipart/form-data; boundary={boundary}"},
+    )
+    return request, body
+
+
+def test_request_key_ignores_multipart_boundary_and_filename():
+    first = request_key(*_multipart("a1b2c3", "/tmp/tmpk3j4.mp3"))
+    second = request_key(*_multipart("ffee99", "/tmp/tmpz9x8.mp3"))
+    other_audio_request, other_body = _multipart("a1b2c3", "/tmp/tmpk3j4.mp3")
+
+    assert first == second
+    assert request_key(other_audio_request, other_body.replace(b"audio\r\n", b"outro\r\n")) != first
+
+
+def test_request_key_canonicalizes_json():
+    url = "https://openrouter.ai/api/v1/chat/completions"
+    headers = {"content-type": "application/json"}
+    request = httpx.Request("POST", url, headers=headers)
+
+    compact = request_key(request, b'{"model":"m","messages":[{"role":"user","content":"oi"}]}')
+    spaced = request_key(request, b'{"messages": [{"content": "oi", "role": "user"}], "model": "m"}')
+
+    assert compact == spaced
+    assert request_key(request, b'{"model":"m2","messages":[]}') != compact
@@ -0,0 +1,54 @@
+import asyncio
+
+import httpx
+import pytest
+
+from benchmarks import stub_providers
+from benchmarks.stats import percentile, summarize
+
+
+def test_percentile_interpolates_between_neighbours():
+    values = [1.0, 2.0, 3.0, 4.0]
+
+    assert percentile(values, 0.0) == 1.0
+    assert percentile(values, 0.5) == 2.5
+    assert percentile(values, 1.0) == 4.0
+    assert percentile([], 0.95) == 0.0
+
+
+def test_summarize_reports_latency_in_ms_and_throughput():
+    summary = summarize([0.3, 0.1, 0.2, 0.4], elapsed_seconds=2.0)
+
+    assert summary["requests"] == 4
+    assert summary["throughput_rps"] == 2.0
+    assert summary["p50_ms"] == pytest.approx(250.0)
+    assert summary["p99_ms"] == pytest.approx(397.0)
+    assert summary["max_ms"] == 400.0
+    assert summarize([], 0.0)["throughput_rps"] == 0.0
+
+
+def test_stub_rate_limits_and_errors(monkeypatch):
+    monkeypatch.setattr(stub_providers, "LATENCY_MS", 0.0)
+    monkeypatch.setattr(stub_providers, "LATENCY_JITTER_MS", 0.0)
+
+    async def call():
+        transport = httpx.ASGITransport(app=stub_providers.app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://stub") as client:
+            return await client.post(
+                "/openai/v1/chat/completions",
+                json={"model": "llama", "messages": [{"role": "user", "content": "oi"}]},
+            )
+
+    monkeypatch.setattr(stub_providers, "RATE_LIMIT_RATE", 1.0)
+    limited = asyncio.run(call())
+    monkeypatch.setattr(stub_providers, "RATE_LIMIT_RATE", 0.0)
+    monkeypatch.setattr(stub_providers, "ERROR_RATE", 1.0)
+    failed = asyncio.run(call())
+    monkeypatch.setattr(stub_providers, "ERROR_RATE", 0.0)
+    succeeded = asyncio.run(call())
+
+    assert limited.status_code == 429
+    assert "Retry-After" in limited.headers
+    assert failed.status_code == 500
+    assert succeeded.status_code == 200
+    assert succeeded.json()["choices"][0]["message"]["content"]
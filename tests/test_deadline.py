@@ -0,0 +1,151 @@
+import asyncio
+import io
+from datetime import date
+
+import httpx
+import pytest
+from fastapi import FastAPI, HTTPException, UploadFile
+from prometheus_client import REGISTRY
+from sqlalchemy import func, select
+from starlette.datastructures import Headers
+
+from app.config.base import global_config
+from app.core.deadline import CLIENT_CLOSED_REQUEST, run_with_deadline, stage_timeout, within_budget
+from app.core.middleware import ServerTimingMiddleware
+from app.core.metrics import timed
+from app.database import migrate
+from app.database.db import dispose_engines, get_session_maker
+from app.database.models import IdempotencyKey, Patient, PatientReservation, User
+from app.services import idempotency_service, transcription_service
+
+
+class FakeRequest:
+    def __init__(self, disconnect_when=None):
+        self.disconnect_when = disconnect_when
+
+    async def is_disconnected(self):
+        return self.disconnect_when is not None and self.disconnect_when.is_set()
+
+
+def _cancelled(stage, reason):
+    return REGISTRY.get_sample_value(
+        "headmed_pipeline_cancelled_total", {"stage": stage, "reason": reason}
+    ) or 0.0
+
+
+def test_disconnect_cancels_pipeline_and_releases_reservation_and_key(monkeypatch):
+    started = asyncio.Event()
+
+    class HangingWorkflow:
+        class provider:
+            value = "groq"
+
+        async def init_aiflow_completion(self, file):
+            started.set()
+            await within_budget("transcription", asyncio.sleep(3600))
+
+    monkeypatch.setattr(transcription_service, "AIWorkflow", HangingWorkflow)
+    monkeypatch.setattr(global_config, "DISCONNECT_POLL_SECONDS", 0.01)
+
+    async def scenario():
+        await migrate.run_migrations()
+        async with get_session_maker()() as session:
+            user = User(username="deadline-disconnect", hashed_password="x")
+            patient = Patient(nome="Paciente Desconexão", cpf="00000000401", data_nascimento=date(1990, 4, 4))
+            session.add_all([user, patient])
+            await session.commit()
+            user_id, patient_id = user.id, patient.id
+
+        upload = UploadFile(
+            file=io.BytesIO(b"audio"), filename="consulta.mp3", headers=Headers({"content-type": "audio/mpeg"})
+        )
+        before = _cancelled("transcription", "client_disconnect")
+        async with get_session_maker()() as route_session:
+            with pytest.raises(HTTPException) as error:
+                await run_with_deadline(FakeRequest(started), idempotency_service.run_idempotent(
+                    "disconnect-key", user_id, "transcribe_patient", "hash",
+                    lambda: transcription_service.handle_transcription_with_patient(
+                        route_session, upload, patient_id, "tenant"
+                    ),
+                    session=route_session,
+                ))
+
+        async with get_session_maker()() as session:
+            reservations = await session.scalar(
+                select(func.count()).select_from(PatientReservation).filter(PatientReservation.patient_id == patient_id)
+            )
+            keys = await session.scalar(
+                select(func.count()).select_from(IdempotencyKey).filter(IdempotencyKey.user_id == user_id)
+            )
+        await dispose_engines()
+        return error.value, reservations, keys, _cancelled("transcription", "client_disconnect") - before, user_id
+
+    error, reservations, keys, cancelled, user_id = asyncio.run(scenario())
+
+    assert error.status_code == CLIENT_CLOSED_REQUEST
+    assert reservations == 0
+    assert keys == 0
+    assert (user_id, "disconnect-key") not in idempotency_service._in_flight
+    assert cancelled == 1
+
+
+def test_overall_deadline_returns_504_with_stage():
+    async def pipeline():
+        await within_budget("llm_completion", asyncio.sleep(3600))
+
+    async def scenario():
+        with pytest.raises(HTTPException) as error:
+            await run_with_deadline(FakeRequest(), pipeline(), seconds=0.05)
+        return error.value
+
+    error = asyncio.run(scenario())
+
+    assert error.status_code == 504
+    assert "llm_completion" in error.detail
+
+
+def test_stage_budget_is_capped_by_remaining_deadline(monkeypatch):
+    monkeypatch.setattr(global_config, "STAGE_TIMEOUT_SECONDS", {"transcription": 120.0})
+
+    async def budget():
+        return stage_timeout("transcription")
+
+    async def scenario():
+        short = await run_with_deadline(FakeRequest(), budget(), seconds=5)
+        long = await run_with_deadline(FakeRequest(), budget(), seconds=500)
+        return short, long
+
+    short, long = asyncio.run(scenario())
+
+    assert 0 < short <= 5
+    assert long == 120.0
+    assert stage_timeout("transcription") == 120.0
+
+
+def test_server_timing_middleware_sets_header_and_records_latency():
+    app = FastAPI()
+    app.add_middleware(ServerTimingMiddleware)
+
+    @app.get("/visits/{visit_id}")
+    async def visit(visit_id: int):
+        with timed("lookup"):
+            return {"id": visit_id}
+
+    def observed():
+        return REGISTRY.get_sample_value(
+            "headmed_http_request_duration_seconds_count",
+            {"method": "GET", "route": "/visits/{visit_id}", "status": "200"},
+        ) or 0.0
+
+    async def scenario():
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+            return await client.get("/visits/7")
+
+    before = observed()
+    response = asyncio.run(scenario())
+
+    assert response.status_code == 200
+    assert "lookup;dur=" in response.headers["Server-Timing"]
+    assert "total;dur=" in response.headers["Server-Timing"]
+    assert observed() - before == 1
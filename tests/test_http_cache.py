@@ -0,0 +1,51 @@
+import asyncio
+from datetime import date
+
+from app.database import migrate
+from app.database.db import dispose_engines, get_session_maker
+from app.database.models import MedicalRecord, Patient
+from app.models.schemas import MedicalRecordUpdate, PatientUpdate
+from app.services.patient_service import get_patient_version, update_patient
+from app.services.record_service import get_medical_record_version, update_medical_record
+from app.utils.http_cache import build_etag, etag_matches
+
+
+def test_etag_matches_weak_validators():
+    etag = build_etag("record", 1, "2024-01-01")
+
+    assert etag_matches(etag, etag)
+    assert etag_matches(f"W/{etag}", etag)
+    assert etag_matches(f'"other", W/{etag}', etag)
+    assert not etag_matches('W/"other"', etag)
+
+
+def test_versions_change_on_edits_within_the_same_second():
+    async def scenario():
+        await migrate.run_migrations()
+        async with get_session_maker()() as session:
+            patient = Patient(nome="Paciente Versão", cpf="00000000515", data_nascimento=date(1970, 7, 7))
+            session.add(patient)
+            await session.flush()
+            record = MedicalRecord(patient_id=patient.id, conduta="repouso")
+            session.add(record)
+            await session.commit()
+            patient_id, record_id = patient.id, record.id
+
+        versions = []
+        for conduta in ("hidratação", "retorno em 7 dias"):
+            async with get_session_maker()() as session:
+                await update_medical_record(session, record_id, MedicalRecordUpdate(conduta=conduta))
+                await update_patient(session, patient_id, PatientUpdate(nome=f"Paciente {conduta}"))
+                await session.commit()
+                versions.append((
+                    await get_patient_version(session, patient_id),
+                    await get_medical_record_version(session, record_id),
+                ))
+        await dispose_engines()
+        return versions
+
+    (patient_first, record_first), (patient_second, record_second) = asyncio.run(scenario())
+
+    assert record_second["version"] == record_first["version"] + 1
+    assert patient_second["patient_version"] == patient_first["patient_version"] + 1
+    assert patient_second["records_version"] == patient_first["records_version"] + 1
@@ -0,0 +1,61 @@
+import asyncio
+
+import pytest
+from sqlalchemy import select
+
+from app.database import migrate
+from app.database.db import dispose_engines, get_session_maker
+from app.database.models import IdempotencyKey, User
+from app.models.schemas import TranscriptionResponse
+from app.services.idempotency_service import STATUS_COMPLETED, run_idempotent
+
+
+async def _create_user(username):
+    await migrate.run_migrations()
+    async with get_session_maker()() as session:
+        user = User(username=username, hashed_password="x")
+        session.add(user)
+        await session.commit()
+        return user.id
+
+
+async def _key_status(user_id, key):
+    async with get_session_maker()() as session:
+        result = await session.execute(
+            select(IdempotencyKey.status).filter(IdempotencyKey.user_id == user_id, IdempotencyKey.key == key)
+        )
+        return result.scalar_one_or_none()
+
+
+async def _handler():
+    return TranscriptionResponse(original_text="ok", structured={})
+
+
+def test_completed_key_is_committed_before_waiters_wake():
+    async def scenario():
+        user_id = await _create_user("idempotency-commit")
+        async with get_session_maker()() as route_session:
+            await run_idempotent("key-1", user_id, "scope", "hash", _handler, session=route_session)
+            # Ainda dentro da requisição: outra conexão já enxerga a chave concluída
+            status = await _key_status(user_id, "key-1")
+        await dispose_engines()
+        return status
+
+    assert asyncio.run(scenario()) == STATUS_COMPLETED
+
+
+def test_key_is_released_when_the_commit_fails():
+    async def scenario():
+        user_id = await _create_user("idempotency-release")
+        async with get_session_maker()() as route_session:
+            async def failing_commit():
+                raise RuntimeError("commit failed")
+
+            route_session.commit = failing_commit
+            with pytest.raises(RuntimeError):
+                await run_idempotent("key-2", user_id, "scope", "hash", _handler, session=route_session)
+        status = await _key_status(user_id, "key-2")
+        await dispose_engines()
+        return status
+
+    assert asyncio.run(scenario()) is None
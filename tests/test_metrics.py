@@ -0,0 +1,40 @@
+import asyncio
+
+import httpx
+from fastapi import FastAPI
+from prometheus_client import REGISTRY
+
+from app.core.middleware import ServerTimingMiddleware
+
+
+def _observed(route, status):
+    return REGISTRY.get_sample_value(
+        "headmed_http_request_duration_seconds_count",
+        {"method": "GET", "route": route, "status": status},
+    ) or 0.0
+
+
+def test_requests_are_labeled_by_route_template():
+    app = FastAPI()
+    app.add_middleware(ServerTimingMiddleware)
+
+    @app.get("/charts/{chart_id}/entries/{entry_id}")
+    async def entry(chart_id: int, entry_id: int):
+        return {"chart": chart_id, "entry": entry_id}
+
+    template = "/charts/{chart_id}/entries/{entry_id}"
+    before = _observed(template, "200"), _observed("unmatched", "404")
+
+    async def scenario():
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+            for chart_id in range(3):
+                await client.get(f"/charts/{chart_id}/entries/{chart_id + 10}")
+            await client.get("/no-such-route/123")
+
+    asyncio.run(scenario())
+
+    assert _observed(template, "200") - before[0] == 3
+    assert _observed("unmatched", "404") - before[1] == 1
+    # Caminhos concretos não viram labels (cardinalidade limitada)
+    assert _observed("/charts/0/entries/10", "200") == 0.0
@@ -0,0 +1,56 @@
+from sqlalchemy import Column, DateTime, Integer, MetaData, String, Table, create_engine, inspect, text
+from sqlalchemy.sql import func
+
+from app.database.migrate import _add_column, _medical_records_extracted_version
+
+
+def _table(metadata, *columns):
+    return Table("visits", metadata, Column("id", Integer, primary_key=True), *columns)
+
+
+def test_added_columns_match_a_fresh_schema(tmp_path):
+    full = _table(
+        MetaData(),
+        Column("note", String(20)),
+        Column("version", Integer, nullable=False, server_default="1"),
+        Column("seen_at", DateTime(timezone=True), server_default=func.now()),
+    )
+    engine = create_engine(f"sqlite:///{tmp_path / 'migrate.sqlite'}")
+    with engine.begin() as conn:
+        _table(MetaData()).create(conn)
+        conn.execute(text("INSERT INTO visits (id) VALUES (1)"))
+        for name in ("note", "version", "seen_at"):
+            _add_column(full, name)(conn)
+        # Repetir é inofensivo: a coluna já existe
+        _add_column(full, "version")(conn)
+
+        columns = {column["name"]: column for column in inspect(conn).get_columns("visits")}
+        existing = conn.execute(text("SELECT version, seen_at FROM visits WHERE id = 1")).one()
+        conn.execute(text("INSERT INTO visits (id) VALUES (2)"))
+        inserted_version = conn.execute(text("SELECT version FROM visits WHERE id = 2")).scalar_one()
+
+    assert columns["version"]["nullable"] is False
+    assert "1" in columns["version"]["default"]
+    assert columns["note"]["nullable"] is True
+    assert existing.version == 1
+    assert existing.seen_at is not None
+    assert inserted_version == 1
+
+
+def test_extracted_version_backfill_keeps_edits_protected(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'extracted.sqlite'}")
+    with engine.begin() as conn:
+        conn.execute(text(
+            "CREATE TABLE medical_records (id INTEGER PRIMARY KEY, version INTEGER NOT NULL DEFAULT 1, "
+            "created_at DATETIME, updated_at DATETIME, extracted_at DATETIME)"
+        ))
+        conn.execute(text(
+            "INSERT INTO medical_records VALUES "
+            "(1, 3, '2024-01-01', '2024-01-05', '2024-01-05'), "  # reextraído, sem edição depois
+            "(2, 2, '2024-01-01', '2024-02-01', '2024-01-05'), "  # editado após a extração
+            "(3, 1, '2024-01-01', NULL, NULL)"
+        ))
+        _medical_records_extracted_version(conn)
+        rows = conn.execute(text("SELECT id, version, extracted_version FROM medical_records ORDER BY id")).all()
+
+    assert [tuple(row) for row in rows] == [(1, 3, 3), (2, 2, 1), (3, 1, 1)]
@@ -0,0 +1,42 @@
+import asyncio
+from datetime import date
+
+import pytest
+from fastapi import HTTPException
+
+from app.database import migrate
+from app.database.db import dispose_engines, get_session_maker
+from app.database.models import Patient
+from app.services.patient_service import delete_patient
+from app.services.reservation_service import release_patient_reservation, reserve_patient
+
+
+def test_reserved_patient_cannot_be_deleted():
+    async def scenario():
+        await migrate.run_migrations()
+        async with get_session_maker()() as session:
+            patient = Patient(nome="Paciente Reservado", cpf="00000000434", data_nascimento=date(1985, 3, 3))
+            session.add(patient)
+            await session.commit()
+            patient_id = patient.id
+
+        token = await reserve_patient(patient_id)
+        async with get_session_maker()() as session:
+            with pytest.raises(HTTPException) as error:
+                await delete_patient(session, patient_id)
+            await session.rollback()
+
+        await release_patient_reservation(token)
+        async with get_session_maker()() as session:
+            await delete_patient(session, patient_id)
+            await session.commit()
+
+        with pytest.raises(HTTPException) as missing:
+            await reserve_patient(patient_id)
+        await dispose_engines()
+        return error.value, missing.value
+
+    error, missing = asyncio.run(scenario())
+
+    assert error.status_code == 409
+    assert missing.status_code == 404
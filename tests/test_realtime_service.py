@@ -0,0 +1,152 @@
+import asyncio
+import json
+from datetime import date
+
+from sqlalchemy import select
+from sqlalchemy.orm import selectinload
+
+from app.config.base import global_config
+from app.database import migrate
+from app.database.db import dispose_engines, get_session_maker
+from app.database.models import MedicalRecord, Patient
+from app.infrastructure.strategy import AIProvider
+from app.services.realtime_service import handle_realtime_transcription
+
+FIELDS = {"queixa_principal": "cefaleia", "hipotese_diagnostica": "enxaqueca"}
+
+
+class FakeTranscriptionInfra:
+    async def extract_transcription_from_audio(self, file):
+        audio = await file.read()
+        if audio.startswith(b"fail"):
+            raise RuntimeError("provider unavailable")
+        text = audio.decode()
+        return text, [{"position": 0, "start_time": 0.0, "end_time": 1.0, "text": text, "confidence": 0.9}]
+
+
+class FakeExtractionInfra:
+    def __init__(self, fail=False):
+        self.transcripts = []
+        self.fail = fail
+
+    async def extract_json_from_text(self, transcription_text):
+        self.transcripts.append(transcription_text)
+        if self.fail:
+            raise ValueError("invalid JSON")
+        return dict(FIELDS)
+
+
+class FakeWorkflow:
+    provider = AIProvider.GROQ
+
+    def __init__(self, fail_extraction=False):
+        self.extraction = FakeExtractionInfra(fail_extraction)
+
+    def get_transcription_infra(self):
+        return FakeTranscriptionInfra()
+
+    def get_extraction_infra(self):
+        return self.extraction
+
+
+class FakeWebSocket:
+    def __init__(self, messages):
+        self._messages = list(messages)
+        self.sent = []
+        self.closed = False
+
+    async def receive(self):
+        return self._messages.pop(0)
+
+    async def send_json(self, data):
+        self.sent.append(data)
+
+    async def close(self, code=1000):
+        self.closed = True
+
+
+async def _run_session(cpf, messages, workflow=None):
+    await migrate.run_migrations()
+    async with get_session_maker()() as session:
+        patient = Patient(nome="Paciente Teste", cpf=cpf, data_nascimento=date(1980, 1, 1))
+        session.add(patient)
+        await session.commit()
+        patient_id = patient.id
+
+    workflow = workflow or FakeWorkflow()
+    websocket = FakeWebSocket(messages)
+    await handle_realtime_transcription(websocket, patient_id, workflow=workflow)
+
+    async with get_session_maker()() as session:
+        records = (await session.execute(
+            select(MedicalRecord)
+            .options(selectinload(MedicalRecord.segments))
+            .filter(MedicalRecord.patient_id == patient_id)
+        )).scalars().all()
+    await dispose_engines()
+    return websocket, workflow, records
+
+
+def _audio(data):
+    return {"type": "websocket.receive", "bytes": data}
+
+
+def _control(data):
+    return {"type": "websocket.receive", "text": json.dumps(data)}
+
+
+def test_failed_window_does_not_lose_the_consultation(monkeypatch):
+    monkeypatch.setattr(global_config, "REALTIME_WINDOW_MAX_ATTEMPTS", 2)
+    monkeypatch.setattr(global_config, "REALTIME_WINDOW_RETRY_BACKOFF_SECONDS", 0.0)
+
+    websocket, workflow, records = asyncio.run(_run_session("00000000191", [
+        _audio(b"dor de cabeca"),
+        _audio(b"fail window"),
+        _audio(b"ha dois dias"),
+        _control({"type": "stop"}),
+    ]))
+
+    assert len(records) == 1
+    assert records[0].original_transcription == "dor de cabeca ha dois dias"
+    assert records[0].hipotese_diagnostica == "enxaqueca"
+    assert workflow.extraction.transcripts == ["dor de cabeca ha dois dias"]
+
+    window_errors = [message for message in websocket.sent if message["type"] == "window_error"]
+    assert [message["window"] for message in window_errors] == [1]
+
+    final = websocket.sent[-1]
+    assert final["type"] == "final"
+    assert final["medical_record_id"] == records[0].id
+    assert final["failed_windows"] == [1]
+    assert websocket.closed
+
+
+def test_start_message_window_seconds_is_validated():
+    websocket, _, records = asyncio.run(_run_session("10000000001", [
+        _control({"type": "start", "window_seconds": "abc"}),
+        _control({"type": "start", "window_seconds": "10"}),
+        _audio(b"primeira janela"),
+        _audio(b"segunda janela"),
+        _control({"type": "stop"}),
+    ]))
+
+    assert websocket.sent[0]["type"] == "error"
+    assert len(records) == 1
+    assert [segment.start_time for segment in records[0].segments] == [0.0, 10.0]
+
+
+def test_final_extraction_failure_keeps_the_transcript():
+    websocket, _, records = asyncio.run(_run_session("10000000002", [
+        _audio(b"dor de cabeca"),
+        _control({"type": "stop"}),
+    ], FakeWorkflow(fail_extraction=True)))
+
+    assert len(records) == 1
+    assert records[0].original_transcription == "dor de cabeca"
+    assert records[0].hipotese_diagnostica is None
+    assert len(records[0].segments) == 1
+
+    final = websocket.sent[-1]
+    assert final["type"] == "final"
+    assert final["structured"] == {}
+    assert final["extraction_error"] == "invalid JSON"
@@ -0,0 +1,50 @@
+import asyncio
+from datetime import date, datetime, timedelta, timezone
+
+import pytest
+from fastapi import HTTPException
+
+from app.database import migrate
+from app.database.db import dispose_engines, get_session_maker
+from app.database.models import MedicalRecord, Patient
+from app.services.record_service import get_patient_records
+
+
+def test_cursor_pages_are_stable_and_invalid_cursor_is_rejected():
+    async def scenario():
+        await migrate.run_migrations()
+        visit = datetime(2024, 3, 3, 9, 0, tzinfo=timezone.utc)
+        async with get_session_maker()() as session:
+            patient = Patient(nome="Paciente Paginação", cpf="00000000381", data_nascimento=date(1955, 5, 5))
+            session.add(patient)
+            await session.flush()
+            # Fora de ordem cronológica e com empates de created_at
+            offsets = [2, 0, 2, 1, 2, 3, 0]
+            session.add_all([
+                MedicalRecord(patient_id=patient.id, created_at=visit + timedelta(days=offset))
+                for offset in offsets
+            ])
+            await session.commit()
+            patient_id = patient.id
+
+        async with get_session_maker()() as session:
+            everything, last_cursor = await get_patient_records(session, patient_id)
+            pages, cursor = [], None
+            while True:
+                page, cursor = await get_patient_records(session, patient_id, limit=3, cursor=cursor)
+                pages.append([record.id for record in page])
+                if cursor is None:
+                    break
+            with pytest.raises(HTTPException) as invalid:
+                await get_patient_records(session, patient_id, limit=3, cursor="não-é-um-cursor")
+        await dispose_engines()
+        return everything, last_cursor, pages, invalid.value
+
+    everything, last_cursor, pages, invalid = asyncio.run(scenario())
+
+    expected = sorted(everything, key=lambda record: (record.created_at, record.id), reverse=True)
+    assert [record.id for record in everything] == [record.id for record in expected]
+    assert last_cursor is None
+    assert [len(page) for page in pages] == [3, 3, 1]
+    assert [record_id for page in pages for record_id in page] == [record.id for record in expected]
+    assert invalid.status_code == 400
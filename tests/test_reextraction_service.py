@@ -0,0 +1,126 @@
+import asyncio
+from datetime import date
+
+from sqlalchemy import select
+
+from app.database import migrate
+from app.database.db import dispose_engines, get_session_maker
+from app.database.models import MedicalRecord, Patient
+from app.services import reextraction_service
+from app.services.reextraction_service import ReextractionFilters, run_reextraction
+
+
+class FakeExtractionInfra:
+    async def extract_json_from_text(self, transcription_text):
+        return {"hipotese_diagnostica": "reextraído"}
+
+
+class EditingExtractionInfra(FakeExtractionInfra):
+    """Simula o médico salvando o prontuário enquanto o LLM ainda extrai."""
+
+    async def extract_json_from_text(self, transcription_text):
+        async with get_session_maker()() as session:
+            records = (await session.execute(
+                select(MedicalRecord).filter(MedicalRecord.original_transcription == transcription_text)
+            )).scalars()
+            for record in records:
+                record.hipotese_diagnostica = "editado durante a extração"
+            await session.commit()
+        return await super().extract_json_from_text(transcription_text)
+
+
+class FakeWorkflow:
+    provider = None
+    infra = FakeExtractionInfra
+
+    def get_extraction_infra(self):
+        return self.infra()
+
+
+async def _create_records():
+    await migrate.run_migrations()
+    async with get_session_maker()() as session:
+        patient = Patient(nome="Paciente Reextração", cpf="00000000272", data_nascimento=date(1975, 5, 5))
+        session.add(patient)
+        await session.flush()
+        extracted = MedicalRecord(
+            patient_id=patient.id, hipotese_diagnostica="original", original_transcription="consulta"
+        )
+        edited = MedicalRecord(
+            patient_id=patient.id, hipotese_diagnostica="original", original_transcription="consulta"
+        )
+        session.add_all([extracted, edited])
+        await session.commit()
+
+        edited.hipotese_diagnostica = "editado pelo médico"
+        await session.commit()
+        return extracted.id, edited.id
+
+
+async def _diagnoses(record_ids):
+    async with get_session_maker()() as session:
+        result = await session.execute(
+            select(MedicalRecord.id, MedicalRecord.hipotese_diagnostica).filter(MedicalRecord.id.in_(record_ids))
+        )
+        return dict(result.all())
+
+
+async def _run(filters):
+    checkpoint = await run_reextraction(filters)
+    return checkpoint, await _diagnoses(filters.record_ids)
+
+
+def test_reextraction_skips_manually_edited_records(monkeypatch):
+    monkeypatch.setattr(reextraction_service, "AIWorkflow", FakeWorkflow)
+
+    async def scenario():
+        extracted_id, edited_id = await _create_records()
+        record_ids = [extracted_id, edited_id]
+
+        first, after_first = await _run(ReextractionFilters(record_ids=record_ids))
+        # Reextrair de novo não confunde a própria reextração com edição manual
+        second, after_second = await _run(ReextractionFilters(record_ids=record_ids))
+        forced, after_forced = await _run(ReextractionFilters(record_ids=record_ids, overwrite_edited=True))
+        await dispose_engines()
+        return extracted_id, edited_id, (first, after_first), (second, after_second), (forced, after_forced)
+
+    extracted_id, edited_id, first, second, forced = asyncio.run(scenario())
+
+    assert first[0].skipped_edited == [edited_id]
+    assert first[1] == {extracted_id: "reextraído", edited_id: "editado pelo médico"}
+    assert second[0].skipped_edited == [edited_id]
+    assert second[0].updated == 1
+    assert forced[0].skipped_edited == []
+    assert forced[1][edited_id] == "reextraído"
+
+
+def test_edit_during_extraction_is_not_overwritten(monkeypatch):
+    class EditingWorkflow(FakeWorkflow):
+        infra = EditingExtractionInfra
+
+    monkeypatch.setattr(reextraction_service, "AIWorkflow", EditingWorkflow)
+
+    async def scenario():
+        await migrate.run_migrations()
+        async with get_session_maker()() as session:
+            patient = Patient(nome="Paciente Edição", cpf="00000000391", data_nascimento=date(1980, 8, 8))
+            session.add(patient)
+            await session.flush()
+            record = MedicalRecord(
+                patient_id=patient.id, hipotese_diagnostica="original", original_transcription="consulta 391"
+            )
+            session.add(record)
+            await session.commit()
+            record_id = record.id
+
+        checkpoint, diagnoses = await _run(ReextractionFilters(record_ids=[record_id]))
+        # A edição conta como manual na próxima rodada
+        second, _ = await _run(ReextractionFilters(record_ids=[record_id]))
+        await dispose_engines()
+        return record_id, checkpoint, diagnoses, second
+
+    record_id, checkpoint, diagnoses, second = asyncio.run(scenario())
+
+    assert checkpoint.skipped_edited == []
+    assert diagnoses[record_id] == "editado durante a extração"
+    assert second.skipped_edited == [record_id]
@@ -0,0 +1,74 @@
+import asyncio
+
+import pytest
+from fastapi import HTTPException
+
+from app.core.scheduler import FairScheduler
+
+
+def _scheduler(**overrides):
+    options = dict(
+        workload="test", max_concurrency=1, tenant_max_concurrency=1, tenant_max_queue=1, queue_timeout=5.0
+    )
+    options.update(overrides)
+    return FairScheduler(**options)
+
+
+def test_rejected_requests_do_not_advance_the_tenant_tag():
+    async def scenario():
+        scheduler = _scheduler()
+        release = asyncio.Event()
+
+        async def hold(key):
+            async with scheduler.slot(key):
+                await release.wait()
+
+        running = asyncio.create_task(hold("a"))
+        await asyncio.sleep(0)
+        queued = asyncio.create_task(hold("a"))
+        await asyncio.sleep(0)
+        tag_before = scheduler._tenants["a"].last_tag
+
+        rejected = 0
+        for _ in range(5):
+            try:
+                async with scheduler.slot("a"):
+                    pass
+            except HTTPException as error:
+                assert error.status_code == 429
+                rejected += 1
+        tag_after = scheduler._tenants["a"].last_tag
+
+        release.set()
+        await asyncio.gather(running, queued)
+        return rejected, tag_before, tag_after
+
+    rejected, tag_before, tag_after = asyncio.run(scenario())
+
+    assert rejected == 5
+    assert tag_after == tag_before
+
+
+def test_timed_out_waiter_gives_back_its_tag():
+    async def scenario():
+        scheduler = _scheduler(queue_timeout=0.01)
+        release = asyncio.Event()
+
+        async def hold():
+            async with scheduler.slot("a"):
+                await release.wait()
+
+        running = asyncio.create_task(hold())
+        await asyncio.sleep(0)
+        tag_before = scheduler._tenants["a"].last_tag
+        with pytest.raises(HTTPException):
+            async with scheduler.slot("a"):
+                pass
+        tag_after = scheduler._tenants["a"].last_tag
+        release.set()
+        await running
+        return tag_before, tag_after
+
+    tag_before, tag_after = asyncio.run(scenario())
+
+    assert tag_after == tag_before
@@ -0,0 +1,36 @@
+import asyncio
+from datetime import date
+
+from app.database import migrate
+from app.database.db import dispose_engines, get_session_maker
+from app.database.models import MedicalRecord, Patient
+from app.services.segment_service import create_transcription_segments, get_record_segments
+
+
+def test_search_treats_wildcards_literally():
+    async def scenario():
+        await migrate.run_migrations()
+        async with get_session_maker()() as session:
+            patient = Patient(nome="Paciente Busca", cpf="00000000696", data_nascimento=date(1960, 6, 6))
+            session.add(patient)
+            await session.flush()
+            record = MedicalRecord(patient_id=patient.id)
+            session.add(record)
+            await session.flush()
+            await create_transcription_segments(session, record.id, [
+                {"position": 0, "start_time": 0.0, "end_time": 1.0, "text": "saturação 95% em ar ambiente"},
+                {"position": 1, "start_time": 1.0, "end_time": 2.0, "text": "pressão 12 por 8"},
+                {"position": 2, "start_time": 2.0, "end_time": 3.0, "text": "dose_extra não indicada"},
+            ])
+            await session.commit()
+
+            results = {
+                search: [segment.position for segment in await get_record_segments(session, record.id, search=search)]
+                for search in ("%", "95%", "_", "e_e")
+            }
+        await dispose_engines()
+        return results
+
+    results = asyncio.run(scenario())
+
+    assert results == {"%": [0], "95%": [0], "_": [2], "e_e": [2]}
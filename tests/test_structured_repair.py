@@ -0,0 +1,74 @@
+import asyncio
+import json
+
+from app.infrastructure.strategy import AIProvider, StrategyAIInfrastructure
+from app.prompts import MEDICAL_RECORD_FIELDS
+
+TRANSCRIPTION = "Paciente com cefaleia há três dias. Prescrito paracetamol 750 mg."
+
+
+class FakeProviderInfra(StrategyAIInfrastructure):
+    def __init__(self, responses):
+        self.responses = list(responses)
+        self.prompts = []
+
+    async def invoke_model_completion(self, prompt, response_format=None):
+        self.prompts.append(prompt)
+        return self.responses.pop(0)
+
+    async def invoke_model_transcription(self, file):
+        raise NotImplementedError
+
+    def get_provider_name(self):
+        return AIProvider.GROQ
+
+    async def extract_json_from_text(self, transcription_text):
+        return await self.extract_medical_record(transcription_text)
+
+    async def extract_text_from_audio(self, file):
+        raise NotImplementedError
+
+    async def extract_transcription_from_audio(self, file):
+        raise NotImplementedError
+
+
+def _first_response(**overrides):
+    fields = {field: "x" for field in MEDICAL_RECORD_FIELDS if field != "prescricao"}
+    fields.update(overrides)
+    return json.dumps(fields)
+
+
+def test_missing_field_is_repaired_from_transcription():
+    infra = FakeProviderInfra([_first_response(), json.dumps({"prescricao": "paracetamol 750 mg"})])
+
+    fields = asyncio.run(infra.extract_medical_record(TRANSCRIPTION))
+
+    assert fields["prescricao"] == "paracetamol 750 mg"
+    assert TRANSCRIPTION in infra.prompts[1]
+    assert '"queixa_principal": "x"' not in infra.prompts[1]
+
+
+def test_malformed_field_is_repaired_without_transcription():
+    infra = FakeProviderInfra([
+        _first_response(prescricao={"medicamento": "paracetamol"}),
+        json.dumps({"prescricao": "paracetamol"}),
+    ])
+
+    fields = asyncio.run(infra.extract_medical_record(TRANSCRIPTION))
+
+    assert fields["prescricao"] == "paracetamol"
+    assert TRANSCRIPTION not in infra.prompts[1]
+
+
+def test_unparseable_output_is_repaired_without_transcription():
+    broken = '{"queixa_principal": "cefaleia", "prescricao": "paracetamol"'
+    repaired = {field: "" for field in MEDICAL_RECORD_FIELDS}
+    repaired.update(queixa_principal="cefaleia", prescricao="paracetamol")
+    infra = FakeProviderInfra([broken, json.dumps(repaired)])
+
+    fields = asyncio.run(infra.extract_medical_record(TRANSCRIPTION))
+
+    assert fields["prescricao"] == "paracetamol"
+    assert len(infra.prompts) == 2
+    assert TRANSCRIPTION not in infra.prompts[1]
+    assert broken in infra.prompts[1]
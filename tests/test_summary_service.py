@@ -0,0 +1,79 @@
+import asyncio
+from datetime import date, datetime, timedelta, timezone
+
+from app.database import migrate
+from app.database.db import dispose_engines, get_session_maker
+from app.database.models import MedicalRecord, Patient, PatientSummary
+from app.models.schemas import MedicalRecordCreate
+from app.services.record_service import create_medical_record
+from app.services.summary_service import apply_record_created, rebuild_patient_summaries
+
+
+async def _summary(session, patient_id):
+    summary = await session.get(PatientSummary, patient_id, populate_existing=True)
+    return summary.record_count, summary.last_visit_at, summary.latest_record_id, summary.latest_hipotese_diagnostica
+
+
+async def _add_dated(session, patient_id, hipotese, created_at):
+    # Prontuário importado com a data original da consulta
+    record = MedicalRecord(patient_id=patient_id, hipotese_diagnostica=hipotese, created_at=created_at)
+    session.add(record)
+    await session.flush()
+    await session.refresh(record)
+    await apply_record_created(session, record)
+    return record.id
+
+
+def test_incremental_summary_matches_rebuild():
+    async def scenario():
+        await migrate.run_migrations()
+        async with get_session_maker()() as session:
+            patient = Patient(nome="Paciente Resumo", cpf="00000000371", data_nascimento=date(1960, 6, 6))
+            session.add(patient)
+            await session.flush()
+            patient_id = patient.id
+
+            await create_medical_record(session, MedicalRecordCreate(patient_id=patient_id, hipotese_diagnostica="atual"))
+            # id maior, consulta mais antiga: não é o prontuário mais recente
+            await _add_dated(session, patient_id, "retroativo", datetime.now(timezone.utc) - timedelta(days=30))
+            incremental = await _summary(session, patient_id)
+
+            await rebuild_patient_summaries(session)
+            rebuilt = await _summary(session, patient_id)
+            await session.commit()
+        await dispose_engines()
+        return incremental, rebuilt
+
+    incremental, rebuilt = asyncio.run(scenario())
+
+    assert incremental == rebuilt
+    assert incremental[0] == 2
+    assert incremental[3] == "atual"
+
+
+def test_same_timestamp_keeps_highest_id():
+    async def scenario():
+        await migrate.run_migrations()
+        visit = datetime(2024, 5, 5, 10, 0, tzinfo=timezone.utc)
+        async with get_session_maker()() as session:
+            patient = Patient(nome="Paciente Empate", cpf="00000000372", data_nascimento=date(1961, 6, 6))
+            session.add(patient)
+            await session.flush()
+            patient_id = patient.id
+
+            await _add_dated(session, patient_id, "primeiro", visit)
+            second_id = await _add_dated(session, patient_id, "segundo", visit)
+            await _add_dated(session, patient_id, "anterior", visit - timedelta(hours=1))
+            incremental = await _summary(session, patient_id)
+
+            await rebuild_patient_summaries(session)
+            rebuilt = await _summary(session, patient_id)
+            await session.commit()
+        await dispose_engines()
+        return second_id, incremental, rebuilt
+
+    second_id, incremental, rebuilt = asyncio.run(scenario())
+
+    assert incremental == rebuilt
+    assert incremental[2] == second_id
+    assert incremental[3] == "segundo"
@@ -0,0 +1,96 @@
+import asyncio
+import hashlib
+from datetime import date
+
+import pytest
+from fastapi import HTTPException
+from sqlalchemy import select, update
+
+from app.config.base import global_config
+from app.database import migrate
+from app.database.db import dispose_engines, get_session_maker
+from app.database.models import Patient, UploadSession, User
+from app.models.schemas import TranscriptionResponse, UploadSessionCreate
+from app.services import upload_service
+from app.services.upload_service import (
+    append_upload_chunk, create_upload_session, finalize_upload, get_upload_session
+)
+
+AUDIO = bytes(range(256)) * 12 * 1024
+
+
+async def _stream(data, size):
+    for start in range(0, len(data), size):
+        yield data[start:start + size]
+
+
+async def _create_user(username):
+    await migrate.run_migrations()
+    async with get_session_maker()() as session:
+        user = User(username=username, hashed_password="x")
+        session.add(user)
+        await session.commit()
+        return user.id
+
+
+@pytest.fixture
+def upload_dir(tmp_path, monkeypatch):
+    monkeypatch.setattr(global_config, "UPLOAD_SESSION_DIR", str(tmp_path))
+    monkeypatch.setattr(upload_service, "UPLOAD_WRITE_BUFFER_BYTES", 64 * 1024)
+    return tmp_path
+
+
+def test_append_writes_chunks_in_order(upload_dir):
+    async def scenario():
+        user_id = await _create_user("upload-append")
+        upload = await create_upload_session(
+            user_id, UploadSessionCreate(filename="consulta.mp3", total_size=len(AUDIO))
+        )
+        half = len(AUDIO) // 2
+        first_checksum = hashlib.sha256(AUDIO[:half]).digest()
+        await append_upload_chunk(upload.id, user_id, 0, _stream(AUDIO[:half], 10_000), first_checksum)
+        with pytest.raises(HTTPException) as error:
+            await append_upload_chunk(upload.id, user_id, half, _stream(AUDIO[half:], 10_000), b"wrong")
+        assert error.value.status_code == 400
+        await append_upload_chunk(upload.id, user_id, half, _stream(AUDIO[half:], 10_000))
+        current = await get_upload_session(upload.id, user_id)
+        await dispose_engines()
+        return upload.id, current
+
+    upload_id, current = asyncio.run(scenario())
+
+    assert current.offset == len(AUDIO)
+    assert (upload_dir / f"{upload_id}.part").read_bytes() == AUDIO
+
+
+def test_finalize_rolls_back_when_upload_was_taken_over(upload_dir):
+    async def scenario():
+        user_id = await _create_user("upload-takeover")
+        upload = await create_upload_session(user_id, UploadSessionCreate(filename="consulta.mp3", total_size=4))
+        await append_upload_chunk(upload.id, user_id, 0, _stream(b"abcd", 4))
+
+        async with get_session_maker()() as route_session:
+            async def pipeline(file, patient_id):
+                # Outro worker considerou o finalize abandonado e o retomou
+                async with get_session_maker()() as other:
+                    await other.execute(
+                        update(UploadSession).where(UploadSession.id == upload.id).values(status="uploading")
+                    )
+                    await other.commit()
+                route_session.add(Patient(nome="Não gravar", cpf="00000000353", data_nascimento=date(1990, 1, 1)))
+                return TranscriptionResponse(original_text="abcd", structured={})
+
+            with pytest.raises(HTTPException) as error:
+                await finalize_upload(upload.id, user_id, pipeline, route_session)
+
+        async with get_session_maker()() as session:
+            patient = (await session.execute(
+                select(Patient).filter(Patient.cpf == "00000000353")
+            )).scalar_one_or_none()
+        await dispose_engines()
+        return error.value, patient
+
+    error, patient = asyncio.run(scenario())
+
+    assert error.status_code == 409
+    assert patient is None
@@ -0,0 +1,188 @@
+import asyncio
+from datetime import datetime, timezone
+
+import pytest
+from fastapi import HTTPException
+from sqlalchemy import select
+
+from app.config.base import global_config
+from app.core import usage_ledger as usage_ledger_module
+from app.core.usage_ledger import UsageLedger
+from app.database import migrate
+from app.database.db import dispose_engines, get_session_maker
+from app.database.models import ProviderUsage, User
+from app.services.usage_service import get_usage_summary
+
+
+def _row(user_id, index, **overrides):
+    row = {
+        "user_id": user_id, "provider": "groq", "model": "llama", "operation": "completion",
+        "outcome": "success", "latency_ms": index,
+    }
+    row.update(overrides)
+    return row
+
+
+class FailingSessionMaker:
+    """Sessão que falha a partir do lote `fail_from` (contando do zero)."""
+
+    def __init__(self, fail_from):
+        self.fail_from = fail_from
+        self.batches = []
+
+    def __call__(self):
+        return self
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc_info):
+        return False
+
+    async def execute(self, statement, batch):
+        if len(self.batches) >= self.fail_from:
+            raise RuntimeError("database unavailable")
+        self.batches.append([row["latency_ms"] for row in batch])
+
+    async def commit(self):
+        pass
+
+
+def test_flush_writes_in_batches(monkeypatch):
+    opened = []
+    real_maker = usage_ledger_module.get_session_maker
+
+    def counting_maker():
+        opened.append(1)
+        return real_maker()
+
+    monkeypatch.setattr(usage_ledger_module, "get_session_maker", counting_maker)
+
+    async def scenario():
+        await migrate.run_migrations()
+        ledger = UsageLedger(flush_seconds=60, batch_size=2, max_buffer=100)
+        for index in range(5):
+            ledger.record(**_row(4201, index))
+        written = await ledger.flush()
+        async with get_session_maker()() as session:
+            result = await session.execute(
+                select(ProviderUsage.latency_ms).filter(ProviderUsage.user_id == 4201).order_by(ProviderUsage.id)
+            )
+            stored = list(result.scalars())
+        await dispose_engines()
+        return written, stored
+
+    written, stored = asyncio.run(scenario())
+
+    assert written == 5
+    assert stored == [0, 1, 2, 3, 4]
+    assert len(opened) == 3
+
+
+def test_failed_batch_is_requeued_in_order(monkeypatch):
+    maker = FailingSessionMaker(fail_from=1)
+    monkeypatch.setattr(usage_ledger_module, "get_session_maker", lambda: maker)
+
+    async def scenario():
+        ledger = UsageLedger(flush_seconds=60, batch_size=2, max_buffer=100)
+        for index in range(5):
+            ledger.record(**_row(4202, index))
+        written = await ledger.flush()
+        return ledger, written
+
+    ledger, written = asyncio.run(scenario())
+
+    assert written == 2
+    assert maker.batches == [[0, 1]]
+    assert [row["latency_ms"] for row in ledger._buffer] == [2, 3, 4]
+
+
+def test_buffer_is_trimmed_oldest_first(monkeypatch):
+    maker = FailingSessionMaker(fail_from=0)
+    monkeypatch.setattr(usage_ledger_module, "get_session_maker", lambda: maker)
+
+    async def scenario():
+        ledger = UsageLedger(flush_seconds=60, batch_size=10, max_buffer=3)
+        for index in range(5):
+            ledger.record(**_row(4203, index))
+        trimmed = [row["latency_ms"] for row in ledger._buffer]
+        await ledger.flush()
+        ledger.record(**_row(4203, 5))
+        return trimmed, [row["latency_ms"] for row in ledger._buffer]
+
+    trimmed, after_failure = asyncio.run(scenario())
+
+    assert trimmed == [2, 3, 4]
+    assert after_failure == [3, 4, 5]
+
+
+async def _usage_fixture(usernames):
+    await migrate.run_migrations()
+    async with get_session_maker()() as session:
+        users = [User(username=username, hashed_password="x") for username in usernames]
+        session.add_all(users)
+        await session.flush()
+        now = datetime.now(timezone.utc)
+        owner = users[0].id
+        session.add_all([
+            ProviderUsage(user_id=owner, provider="groq", model="whisper", operation="transcription",
+                          outcome="success", latency_ms=100, audio_seconds=1800.0, created_at=now),
+            ProviderUsage(user_id=owner, provider="groq", model="llama", operation="completion",
+                          outcome="success", latency_ms=300, prompt_tokens=1_000_000,
+                          completion_tokens=500_000, created_at=now),
+            ProviderUsage(user_id=owner, provider="groq", model="llama", operation="completion",
+                          outcome="error", latency_ms=200, created_at=now),
+            ProviderUsage(user_id=owner, provider="groq", model="llama", operation="completion",
+                          outcome="cancelled", latency_ms=400, created_at=now),
+        ])
+        await session.commit()
+        return users
+
+
+def test_usage_summary_rolls_up_calls_and_cost(monkeypatch):
+    monkeypatch.setattr(global_config, "PROVIDER_PRICING", {
+        "whisper": {"audio_hour": 0.04},
+        "llama": {"prompt_million": 0.1, "completion_million": 0.2},
+    })
+
+    async def scenario():
+        [user] = await _usage_fixture(["usage-rollup"])
+        async with get_session_maker()() as session:
+            by_user = await get_usage_summary(session, user, ["user"])
+            by_model = await get_usage_summary(session, user, ["model"])
+            monkeypatch.setattr(global_config, "PROVIDER_PRICING", {"llama": {"prompt_million": 0.1}})
+            unpriced = await get_usage_summary(session, user, ["user"])
+        await dispose_engines()
+        return user.id, by_user, by_model, unpriced
+
+    user_id, by_user, by_model, unpriced = asyncio.run(scenario())
+
+    [total] = by_user
+    assert total.user_id == user_id
+    assert total.model is None
+    assert (total.calls, total.errors, total.cancelled) == (4, 1, 1)
+    assert total.audio_seconds == 1800.0
+    assert total.avg_latency_ms == 250.0
+    assert total.max_latency_ms == 400
+    assert total.estimated_cost == pytest.approx(0.02 + 0.1 + 0.1)
+    assert {summary.model: summary.calls for summary in by_model} == {"llama": 3, "whisper": 1}
+    assert unpriced[0].estimated_cost is None
+
+
+def test_usage_summary_is_scoped_to_the_caller(monkeypatch):
+    async def scenario():
+        owner, other = await _usage_fixture(["usage-owner", "usage-other"])
+        async with get_session_maker()() as session:
+            own = await get_usage_summary(session, other, ["user"])
+            with pytest.raises(HTTPException) as forbidden:
+                await get_usage_summary(session, other, ["user"], user_id=owner.id)
+            monkeypatch.setattr(global_config, "USAGE_ADMIN_USERNAMES", ["usage-other"])
+            admin = await get_usage_summary(session, other, ["user"], user_id=owner.id)
+        await dispose_engines()
+        return own, forbidden.value, admin
+
+    own, forbidden, admin = asyncio.run(scenario())
+
+    assert own == []
+    assert forbidden.status_code == 403
+    assert admin[0].calls == 4